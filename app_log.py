@@ -0,0 +1,147 @@
+"""
+Logging backend for the app.
+
+The modules log through the standard logging module (logging.getLogger(__name__)); this module
+installs the handlers once at startup:
+
+- a bounded in-memory ring buffer that always keeps the last lines, read by the debug console
+  in batches on a timer instead of one Tk event per message (so the console shows recent history
+  when opened, and a chatty session can neither flood the event queue nor grow memory)
+- stdout, as the print() calls did before (skipped when there is none, e.g. under pythonw)
+- optionally a size-rotated log file ("log_file" in settings)
+"""
+
+import logging
+import os
+import sys
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+LOG_BUFFER_LINES = 2000
+LOG_FILE_MAX_BYTES = 1_000_000
+LOG_FILE_BACKUPS = 3
+CONSOLE_FORMAT = "%(asctime)s %(message)s"
+CONSOLE_DATE_FORMAT = "%H:%M:%S"
+FILE_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class LogRingBuffer:
+    """Thread-safe bounded buffer of text chunks, each numbered so a reader can ask for what it has not seen."""
+
+    def __init__(self, capacity: int = LOG_BUFFER_LINES):
+        self._lock = threading.Lock()
+        self._entries: Deque[str] = deque(maxlen=capacity)
+        self._next_sequence = 0
+
+    def resize(self, capacity: int):
+        with self._lock:
+            self._entries = deque(self._entries, maxlen=max(1, capacity))
+
+    def append(self, text: str):
+        with self._lock:
+            self._entries.append(text)
+            self._next_sequence += 1
+
+    def read_since(self, sequence: int) -> Tuple[List[str], int, int]:
+        """Returns (entries from `sequence` on, sequence to pass next time, entries already dropped)."""
+        with self._lock:
+            oldest = self._next_sequence - len(self._entries)
+            start = max(sequence, oldest)
+            entries = list(islice(self._entries, start - oldest, None))
+            return entries, self._next_sequence, start - sequence
+
+    @property
+    def next_sequence(self) -> int:
+        with self._lock:
+            return self._next_sequence
+
+
+class RingBufferWriter:
+    """A file-like object (for sys.stdout/sys.stderr) that appends what is written to a ring buffer."""
+
+    def __init__(self, buffer: LogRingBuffer):
+        self.buffer = buffer
+
+    def write(self, text: str) -> int:
+        if text:
+            self.buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, buffer: LogRingBuffer):
+        super().__init__()
+        self.buffer = buffer
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.buffer.append(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+class StdoutHandler(logging.Handler):
+    """Writes to whatever sys.stdout is at the time, so redirections (headless mode) keep working."""
+
+    def emit(self, record: logging.LogRecord):
+        stream = sys.stdout
+        # Under pythonw there is no stdout; while the debug console is open, it is the ring buffer already
+        if stream is None or isinstance(stream, RingBufferWriter):
+            return
+        try:
+            stream.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+ring_buffer = LogRingBuffer()
+_installed_handlers: List[logging.Handler] = []
+
+
+def get_log_file_path(settings_path: str) -> str:
+    """settings.json -> settings.log"""
+    return os.path.splitext(settings_path)[0] + ".log"
+
+
+def configure_logging(settings: Dict[str, Any], settings_path: str, stdout: bool = True,
+                      extra_handlers: Optional[List[logging.Handler]] = None):
+    """
+    Installs the app's handlers on the root logger, replacing those of a previous call.
+    "log_file" is a path, or true for settings.log next to the settings file.
+    """
+    root = logging.getLogger()
+    for handler in _installed_handlers:
+        root.removeHandler(handler)
+        handler.close()
+    _installed_handlers.clear()
+
+    ring_buffer.resize(int(settings.get('log_buffer_lines', LOG_BUFFER_LINES)))
+    console_formatter = logging.Formatter(CONSOLE_FORMAT, CONSOLE_DATE_FORMAT)
+    ring_handler = RingBufferHandler(ring_buffer)
+    ring_handler.setFormatter(console_formatter)
+    _installed_handlers.append(ring_handler)
+    if stdout:
+        _installed_handlers.append(StdoutHandler())
+    log_file, file_error = settings.get('log_file'), None
+    if log_file:
+        from logging.handlers import RotatingFileHandler
+        path = get_log_file_path(settings_path) if log_file is True else str(log_file)
+        try:
+            file_handler = RotatingFileHandler(path, maxBytes=int(settings.get('log_file_max_bytes', LOG_FILE_MAX_BYTES)),
+                                               backupCount=int(settings.get('log_file_backups', LOG_FILE_BACKUPS)),
+                                               encoding='utf-8')
+            file_handler.setFormatter(logging.Formatter(FILE_FORMAT))
+            _installed_handlers.append(file_handler)
+        except OSError as e:
+            file_error = f"Could not open log file {path}: {e}"
+    _installed_handlers.extend(extra_handlers or [])
+    for handler in _installed_handlers:
+        root.addHandler(handler)
+    root.setLevel(logging.DEBUG if settings.get('debug_logging') else logging.INFO)
+    if file_error:
+        logging.getLogger(__name__).warning(file_error)
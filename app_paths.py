@@ -0,0 +1,34 @@
+"""
+Locations of the settings file and bundled resources, shared by the GUI and the headless mode.
+Kept free of GUI imports so the headless mode never loads tkinter.
+"""
+
+import os
+import platform
+import sys
+
+
+def get_settings_path():
+    if getattr(sys, 'frozen', False):  # Eğer exe'den çalışıyorsa
+        if platform.system() == "Windows":
+            appdata = os.getenv("APPDATA")
+            if appdata:
+                settings_dir = os.path.join(appdata, "odiFinder")
+            else:
+                # Fallback: use user home directory if APPDATA is not set
+                settings_dir = os.path.join(os.path.expanduser("~"), "odiFinder")
+            os.makedirs(settings_dir, exist_ok=True)
+            return os.path.join(settings_dir, "settings.json")
+        else:
+            # Diğer platformlar için fallback
+            return os.path.join(os.path.expanduser("~"), ".odiFinder_settings.json")
+    else:  # py dosyasından çalışıyorsa
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json")
+
+# PyInstaller resource path helper
+def resource_path(relative_path):
+    base_path = getattr(sys, '_MEIPASS', None)
+    if base_path:
+        return os.path.join(base_path, relative_path)
+    return os.path.join(os.path.abspath("."), relative_path)
+
@@ -0,0 +1,105 @@
+"""
+Round trip of the fan-out event stream (fanout.py): how long after publish() a subscriber has the boxes.
+
+Usage:
+    python benchmarks/bench_fanout.py [--boxes 1 50 5000] [--repeat 5] [--limit-ms 1000]
+
+A real FanoutServer on a free local port and a FanoutSubscriber following it. For each page size
+the time to the first snapshot is measured, then the time until each published update (every
+update changes the counts of the boxes, and the last one takes every meal away) reaches the subscriber.
+Small events matter most: they are far below any read buffer, and a subscriber that waits for a
+buffer to fill would only see them with the next event or keep-alive. The script exits with status 1
+if any event took longer than --limit-ms.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import load_fixture
+from fanout import FanoutServer, FanoutSubscriber
+from parsing import parse_menu_boxes
+
+CITY_ID = "35"
+
+
+def with_count(menu_box, count: int):
+    return menu_box._replace(full_text=f"{menu_box.restaurant} {menu_box.title} {menu_box.details} Bu menüyü askıdan al {count}")
+
+
+def bench(menu_boxes, repeat: int, timeout: float):
+    """Returns the snapshot time and every update time in ms (None where an event did not arrive in time)."""
+    delivered = threading.Condition()
+    updates = []
+
+    def on_update(city_ids):
+        with delivered:
+            updates.append(time.perf_counter())
+            delivered.notify_all()
+
+    def wait_for(count: int):
+        with delivered:
+            delivered.wait_for(lambda: len(updates) >= count, timeout)
+            return updates[count - 1] if len(updates) >= count else None
+
+    pages = [[with_count(menu_box, 2 - (index + step) % 2) for index, menu_box in enumerate(menu_boxes)]
+             for step in range(repeat)]
+    pages.append([with_count(menu_box, 0) for menu_box in menu_boxes])
+    server = FanoutServer("127.0.0.1", 0).start()
+    subscriber = None
+    try:
+        server.publish({CITY_ID: [with_count(menu_box, 1) for menu_box in menu_boxes]})
+        started = time.perf_counter()
+        subscriber = FanoutSubscriber(server.url, [CITY_ID], on_update=on_update).start()
+        arrived = wait_for(1)
+        snapshot_ms = (arrived - started) * 1000 if arrived is not None else None
+        update_ms = []
+        for number, page in enumerate(pages, start=2):
+            started = time.perf_counter()
+            server.publish({CITY_ID: page})
+            arrived = wait_for(number)
+            update_ms.append((arrived - started) * 1000 if arrived is not None else None)
+            if arrived is None:
+                break
+        return snapshot_ms, update_ms, subscriber.menu_boxes(CITY_ID)
+    finally:
+        if subscriber is not None:
+            subscriber.stop()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[1, 50, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    all_boxes = parse_menu_boxes(load_fixture(max(args.boxes)).decode("utf-8"))
+    timeout = max(5.0, 5 * args.limit_ms / 1000)
+    failed = False
+    print(f"{'boxes':>6} {'snapshot ms':>12} {'update median ms':>17} {'update max ms':>14} {'all gone':>9}")
+    for box_count in args.boxes:
+        snapshot_ms, update_ms, final_boxes = bench(all_boxes[:box_count], args.repeat, timeout)
+        arrived = [ms for ms in update_ms if ms is not None]
+        late = (snapshot_ms is None or len(arrived) < len(update_ms) or len(update_ms) < args.repeat + 1
+                or max([snapshot_ms, *arrived]) > args.limit_ms)
+        # The last update takes every meal away; the subscriber must end with no boxes
+        emptied = final_boxes == []
+        failed |= late or not emptied
+        snapshot_text = f"{snapshot_ms:.2f}" if snapshot_ms is not None else "missing"
+        median_text = f"{statistics.median(arrived):.2f}" if arrived else "missing"
+        max_text = f"{max(arrived):.2f}" if len(arrived) == len(update_ms) else "missing"
+        print(f"{box_count:>6} {snapshot_text:>12} {median_text:>17} {max_text:>14} {str(emptied):>9}")
+    if failed:
+        print(f"FAIL: an event did not reach the subscriber within {args.limit_ms:g} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
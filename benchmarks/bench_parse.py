@@ -0,0 +1,51 @@
+"""
+Reports parse time of every installed HTML parsing backend on a synthetic student page.
+
+Usage:
+    python benchmarks/bench_parse.py [--boxes 10 500 5000] [--repeat 5]
+
+Each backend's records are compared with the reference bs4 backend, so the table also
+shows whether a backend is a safe drop-in replacement.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import build_student_page
+from parsing import available_backends, parse_menu_boxes
+
+
+def time_backend(backend: str, html: str, repeat: int):
+    timings = []
+    records = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = parse_menu_boxes(html, backend)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings), records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[10, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    backends = available_backends()
+    print(f"Available backends: {', '.join(backends)}")
+    print(f"{'boxes':>6}  {'backend':<13} {'best ms':>9} {'mean ms':>9}  identical")
+    for box_count in args.boxes:
+        html = build_student_page(box_count)
+        reference = parse_menu_boxes(html, 'bs4') if 'bs4' in backends else None
+        for backend in backends:
+            best, mean, records = time_backend(backend, html, args.repeat)
+            identical = "n/a" if reference is None else str(records == reference)
+            print(f"{box_count:>6}  {backend:<13} {best * 1000:>9.2f} {mean * 1000:>9.2f}  {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Shows what each extra polling profile costs (profiles.ProfilePoller) against the local getodi.com stub.
+
+Usage:
+    python benchmarks/bench_profiles.py [--profiles 1 5 20] [--cities 3] [--boxes 500] [--repeat 5]
+
+All profiles share one account and watch the same cities with different watch lists. Every cycle
+should request and parse each city page once however many profiles there are, so the time per
+cycle should grow only by the matching of the extra watch lists. The first cycle (cold caches) and
+the median of the following ones are reported, with the number of page requests per cycle.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import load_fixture, restaurant_name
+from stub_server import STUB_PASSWORD, STUB_USERNAME, StubOdiServer
+import network
+from profiles import Profile, ProfilePoller
+
+CITY_IDS = ("35", "34", "06", "07", "16", "01", "41", "42")
+
+
+def bench(profile_count: int, city_ids, repeat: int, directory: str):
+    profiles = [Profile(f"p{index}", STUB_USERNAME, [restaurant_name(index * 3 + offset) for offset in range(3)], list(city_ids))
+                for index in range(profile_count)]
+    poller = ProfilePoller(profiles, {profile.name: STUB_PASSWORD for profile in profiles},
+                           lambda username: os.path.join(directory, "bench.cookies.json"))
+    requests_made = []
+    original_fetch = network._fetch_meals_page
+
+    def counting_fetch(session, city_id, page_cache):
+        requests_made.append(city_id)
+        return original_fetch(session, city_id, page_cache)
+
+    network._fetch_meals_page = counting_fetch
+    try:
+        poller.login_all()
+        timings = []
+        for _ in range(repeat + 1):
+            started = time.perf_counter()
+            poller.poll()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        network._fetch_meals_page = original_fetch
+        poller.close()
+    return timings[0], statistics.median(timings[1:]), len(requests_made) / (repeat + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--cities", type=int, default=3)
+    parser.add_argument("--boxes", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    network.configure_request_limits({'max_requests_per_second': 1e6, 'request_burst': 10 ** 6})
+    city_ids = CITY_IDS[:args.cities]
+    print(f"{'profiles':>8} {'requests/cycle':>15} {'first ms':>9} {'median ms':>10}")
+    with tempfile.TemporaryDirectory() as directory, StubOdiServer(load_fixture(args.boxes)) as server, server.patch_network():
+        for profile_count in args.profiles:
+            first_ms, median_ms, requests_per_cycle = bench(profile_count, city_ids, args.repeat, directory)
+            print(f"{profile_count:>8} {requests_per_cycle:>15.1f} {first_ms:>9.2f} {median_ms:>10.2f}")
+    network.shutdown_parse_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compares the memory that retained scan results take as dicts (the old check_meals() records),
+MealRecord tuples and MealBatch columns.
+
+Usage:
+    python benchmarks/bench_records.py [--boxes 500 5000] [--scans 20]
+
+Every scan parses the fixture page again, as a real poll does, so each one brings fresh string
+objects; the records of all scans are kept, as the snapshot differ, the history and a long-running
+poller keep them. Sizes are measured with tracemalloc after the parsed pages are dropped.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import load_fixture
+from matcher import AVAILABLE_COUNT_PATTERN
+from meal_record import MealBatch, make_meal_record, scan_timestamp
+from parsing import parse_menu_boxes
+
+
+def available_boxes(html: str):
+    boxes = []
+    for menu_box in parse_menu_boxes(html):
+        match = AVAILABLE_COUNT_PATTERN.search(menu_box.full_text)
+        if match and int(match.group(1)) > 0:
+            boxes.append((menu_box, int(match.group(1))))
+    return boxes
+
+
+def as_dicts(boxes):
+    return [{'restaurant_name': box.title, 'meal_name': box.restaurant, 'location': box.details, 'available_count': count,
+             'available': True, 'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")} for box, count in boxes]
+
+
+def as_records(boxes):
+    scanned_at = scan_timestamp()
+    return [make_meal_record(box.title, box.restaurant, box.details, count, scanned_at) for box, count in boxes]
+
+
+def as_batch(boxes):
+    return MealBatch.of(as_records(boxes))
+
+
+def retained_bytes(build, html: str, scans: int):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = []
+    for _ in range(scans):
+        boxes = available_boxes(html)
+        kept.append(build(boxes))
+        del boxes
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    meals = sum(len(result) for result in kept)
+    return size, meals
+
+
+def build_ms(build, html: str, repeat: int = 5):
+    boxes = available_boxes(html)
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        build(boxes)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[500, 5000])
+    parser.add_argument("--scans", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'boxes':>6}  {'model':<12} {'meals kept':>10} {'bytes/meal':>11} {'total KiB':>10} {'build ms':>9}")
+    for box_count in args.boxes:
+        html = load_fixture(box_count).decode('utf-8')
+        for name, build in (("dict", as_dicts), ("MealRecord", as_records), ("MealBatch", as_batch)):
+            size, meals = retained_bytes(build, html, args.scans)
+            print(f"{box_count:>6}  {name:<12} {meals:>10} {size / max(meals, 1):>11.0f} {size / 1024:>10.0f} "
+                  f"{build_ms(build, html):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
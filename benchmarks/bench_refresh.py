@@ -0,0 +1,197 @@
+"""
+Times every stage of a meal refresh against a local getodi.com stub, fully offline.
+
+Usage:
+    python benchmarks/bench_refresh.py [--boxes 10 500 5000] [--repeat 7] [--backend NAME]
+                                       [--save-baseline] [--baseline PATH] [--tolerance 0.5] [--noise-ms 5]
+
+Stages, per fixture size:
+    login        credential POST and redirect on a fresh session
+    fetch        download of the city page
+    parse        menu boxes out of the page (parsing.parse_menu_boxes)
+    match        watch list against the menu boxes with a cold match cache
+    e2e          check_meals() with empty caches, as on the first refresh
+    e2e_cached   check_meals() when the page has not changed (304 answer)
+    e2e_stream   check_meals(stream=True), stopping once every restaurant is found
+
+The best time of each stage is compared with the stored baseline (default benchmarks/baseline.json):
+the best of a few runs moves far less with machine load than the median, which is only shown. The
+script exits with status 1 if a stage got slower than baseline * (1 + --tolerance) + --noise-ms, so
+it can gate website-structure fixes; the fixed --noise-ms part keeps stages of a few milliseconds,
+where a scheduler hiccup doubles the time, from failing on noise. A size with a stage over its
+limit is measured again up to --confirm-runs times, keeping the best time of all runs: a real
+slowdown shows in every run, a busy moment of the machine does not. --save-baseline stores the
+current run as the new baseline.
+
+The committed baseline.json was recorded on a Linux x86_64 machine with the default backend;
+timings from another machine are not comparable, so run --save-baseline there once before a change
+and compare after it.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from fixtures import FIXTURE_SIZES, load_fixture, restaurant_name
+from stub_server import STUB_PASSWORD, STUB_USERNAME, StubOdiServer
+
+import network
+from matcher import TargetMatcher
+from page_cache import PageCache
+from parsing import get_default_backend, parse_menu_boxes
+
+DEFAULT_BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+STAGES = ("login", "fetch", "parse", "match", "e2e", "e2e_cached", "e2e_stream")
+CITY_ID = "35"
+
+
+def watch_list(box_count: int):
+    """A few restaurants spread over the page (the last box included) and one that is not on it."""
+    indices = sorted({0, box_count // 3, box_count // 2, box_count - 1})
+    return [restaurant_name(index) for index in indices] + ["Olmayan Restoran"]
+
+
+def _timed(function, repeat: int):
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, result
+
+
+def _without_timestamps(meals):
+    return [meal._replace(scanned_at=0) for meal in meals or []]
+
+
+def bench_size(box_count: int, repeat: int, backend: str):
+    page = load_fixture(box_count)
+    html = page.decode('utf-8')
+    matcher = TargetMatcher(watch_list(box_count))
+    timings = {}
+    # The request governor protects getodi.com; against the local stub it would only time its own waits
+    network.configure_request_limits({'max_requests_per_second': 1e6, 'request_burst': 10 ** 6})
+    with StubOdiServer(page) as server, server.patch_network():
+        def login():
+            session = network.login_to_odi(STUB_USERNAME, STUB_PASSWORD, session=network.create_session())
+            session.close()
+            return session
+
+        timings['login'], _ = _timed(login, repeat)
+        session = network.login_to_odi(STUB_USERNAME, STUB_PASSWORD)
+        meals_url = network.MEALS_URL_TEMPLATE.format(city_id=CITY_ID)
+        timings['fetch'], _ = _timed(lambda: session.get(meals_url, timeout=network.REQUEST_TIMEOUT).content, repeat)
+        timings['parse'], menu_boxes = _timed(lambda: parse_menu_boxes(html, backend), repeat)
+        timings['match'], _ = _timed(lambda: network.match_menu_boxes(menu_boxes, matcher, PageCache()), repeat)
+        timings['e2e'], meals = _timed(lambda: network.check_meals(session, matcher, CITY_ID, backend, page_cache=PageCache()), repeat)
+        warm_cache = PageCache()
+        network.check_meals(session, matcher, CITY_ID, backend, page_cache=warm_cache)
+        timings['e2e_cached'], cached_meals = _timed(lambda: network.check_meals(session, matcher, CITY_ID, backend, page_cache=warm_cache), repeat)
+        timings['e2e_stream'], streamed_meals = _timed(lambda: network.check_meals(session, matcher, CITY_ID, backend, page_cache=PageCache(), stream=True), repeat)
+        session.close()
+    consistent = _without_timestamps(meals) == _without_timestamps(cached_meals) == _without_timestamps(streamed_meals)
+    return timings, len(meals or []), consistent
+
+
+def _limit_ms(previous_ms: float, tolerance: float, noise_ms: float) -> float:
+    return previous_ms * (1 + tolerance) + noise_ms
+
+
+def over_limit(results, baseline, tolerance: float, noise_ms: float):
+    """The stage keys whose best time is above the baseline's limit."""
+    return [key for key, best_ms in results.items()
+            if key in baseline and best_ms > _limit_ms(baseline[key], tolerance, noise_ms)]
+
+
+def compare_with_baseline(results, baseline, tolerance: float, noise_ms: float):
+    """results and baseline map stage keys to best times in ms; returns the keys that regressed."""
+    regressions = []
+    print(f"\n{'stage':<18} {'baseline best ms':>17} {'now ms':>9} {'change':>8} {'limit ms':>9}")
+    for key, best_ms in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        change = (best_ms - previous) / previous if previous else 0.0
+        limit_ms = _limit_ms(previous, tolerance, noise_ms)
+        regressed = best_ms > limit_ms
+        print(f"{key:<18} {previous:>17.2f} {best_ms:>9.2f} {change:>+7.0%} {limit_ms:>9.2f}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=list(FIXTURE_SIZES))
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--backend", default=None, help="parser backend (default: the fastest installed)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown as a fraction (0.5 = 50%%)")
+    parser.add_argument("--noise-ms", type=float, default=5.0, help="allowed slowdown in ms on top of --tolerance")
+    parser.add_argument("--confirm-runs", type=int, default=2, help="extra runs of a size that looks slower before failing")
+    args = parser.parse_args()
+    # Login and fetch errors are logged as warnings, which Python prints to stderr when no handler is
+    # configured; the stub answers what the benchmark expects, so keep the table readable
+    logging.disable(logging.WARNING)
+
+    backend = args.backend or get_default_backend()
+    print(f"Parser backend: {backend}")
+    print(f"{'boxes':>6}  {'stage':<11} {'best ms':>9} {'median ms':>10}")
+    results, best = {}, {}
+    all_consistent = True
+    for box_count in args.boxes:
+        timings, found, consistent = bench_size(box_count, args.repeat, backend)
+        all_consistent &= consistent
+        for stage in STAGES:
+            median_ms = statistics.median(timings[stage])
+            results[f"{box_count}/{stage}"] = round(median_ms, 3)
+            best[f"{box_count}/{stage}"] = round(min(timings[stage]), 3)
+            print(f"{box_count:>6}  {stage:<11} {min(timings[stage]):>9.2f} {median_ms:>10.2f}")
+        print(f"{box_count:>6}  meals found: {found}, identical across e2e modes: {consistent}")
+
+    failed = not all_consistent
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'backend': backend,
+                       'results': results, 'best': best}, f, indent=4)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('backend') != backend:
+            print(f"\nNote: baseline was recorded with the {baseline.get('backend')} backend.")
+        if (baseline.get('python'), baseline.get('machine')) != (platform.python_version(), platform.machine()):
+            print(f"\nNote: baseline was recorded with Python {baseline.get('python')} on {baseline.get('machine')}; "
+                  f"run with --save-baseline to compare on this machine.")
+        # Baselines saved before best times were stored only have the medians
+        baseline_best = baseline.get('best') or baseline.get('results', {})
+        for _ in range(args.confirm_runs):
+            suspects = over_limit(best, baseline_best, args.tolerance, args.noise_ms)
+            if not suspects:
+                break
+            box_counts = sorted({int(key.split("/")[0]) for key in suspects})
+            print(f"\nMeasuring {', '.join(map(str, box_counts))} boxes again: {', '.join(suspects)} above the limit")
+            for box_count in box_counts:
+                timings, _, consistent = bench_size(box_count, args.repeat, backend)
+                failed |= not consistent
+                for stage in STAGES:
+                    key = f"{box_count}/{stage}"
+                    best[key] = min(best[key], round(min(timings[stage]), 3))
+        regressions = compare_with_baseline(best, baseline_best, args.tolerance, args.noise_ms)
+        failed |= bool(regressions)
+    else:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to store one.")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Times the filter box's search index (search_index.MenuSearchIndex) on the saved pages.
+
+Usage:
+    python benchmarks/bench_search.py [--boxes 500 5000] [--cities 1] [--repeat 20]
+
+For each page size: building the index from scratch, rebuilding it after a refresh in which 1% of
+the boxes changed (the usual case: a few counts went up or down), and typing a few queries one
+keystroke at a time, as the main window searches at every key press. Every query is reported with
+its slowest keystroke; all of them should stay well below a frame (16 ms).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import load_fixture, restaurant_name
+from parsing import parse_menu_boxes
+from search_index import MenuSearchIndex
+
+CITY_IDS = ("35", "34", "06", "07", "16", "01", "41", "42")
+QUERIES = ("k", "kıraathane", "KIRAATHANE 4", "köfte bornova", "zzz")
+
+
+def median_ms(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def changed_page(menu_boxes, every: int):
+    """The same page with the count of every `every`th box changed, as new box objects."""
+    return [menu_box._replace(full_text=menu_box.full_text + "0") if index % every == 0 else menu_box
+            for index, menu_box in enumerate(menu_boxes)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[500, 5000])
+    parser.add_argument("--cities", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    queries = QUERIES + (restaurant_name(7),)
+    for box_count in args.boxes:
+        menu_boxes = parse_menu_boxes(load_fixture(box_count).decode("utf-8"))
+        pages = {city_id: menu_boxes for city_id in CITY_IDS[:args.cities]}
+        changed = {city_id: changed_page(menu_boxes, 100) for city_id in pages}
+        index = MenuSearchIndex(pages)
+        build_ms = median_ms(lambda: MenuSearchIndex(pages), max(1, args.repeat // 4))
+        rebuild_ms = median_ms(lambda: MenuSearchIndex(changed, previous=index), max(1, args.repeat // 4))
+        print(f"{box_count} boxes x {len(pages)} cities: {len(index)} menus, {index.get_stats()['words']} words; "
+              f"build {build_ms:.2f} ms, rebuild after 1% changed {rebuild_ms:.2f} ms")
+        print(f"  {'query':<16} {'matches':>8} {'slowest keystroke ms':>21}")
+        for query in queries:
+            slowest = max(median_ms(lambda: index.search(query[:length]), args.repeat) for length in range(1, len(query) + 1))
+            print(f"  {query!r:<16} {len(index.search(query)):>8} {slowest:>21.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Measures what importing odiFinder costs before the login window can be shown.
+
+Usage:
+    python benchmarks/bench_startup.py [--budget-ms 150] [--top 15]
+
+The app module is imported in a fresh interpreter with `python -X importtime` (without running
+the app), and the slowest imports are listed by cumulative time. The script exits with status 1
+if a module that should only be imported lazily shows up, or if the total exceeds the budget,
+so it can be used as a regression check.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use (login, refresh, notification, tray), never at startup
+LAZY_MODULES = ("requests", "urllib3", "bs4", "lxml", "selectolax", "pystray", "PIL", "winotify", "plyer")
+
+IMPORT_APP = (
+    "import sys; sys.path.insert(0, {root!r});"
+    "import importlib.machinery, importlib.util;"
+    "spec = importlib.util.spec_from_file_location('odiFinder', {path!r},"
+    " loader=importlib.machinery.SourceFileLoader('odiFinder', {path!r}));"
+    "spec.loader.exec_module(importlib.util.module_from_spec(spec))"
+)
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_imports(code: str):
+    """Returns [(module, self_us, cumulative_us, depth)] in import order."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, encoding="utf-8", errors="replace")
+    if result.returncode != 0:
+        traceback_start = result.stderr.find("Traceback")
+        raise SystemExit(f"Importing odiFinder failed:\n{result.stderr[traceback_start:]}")
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # Whatever the bare interpreter imports on its own (site, .pth hooks) is not the app's cost
+    interpreter_modules = {module for module, _, _, _ in measure_imports("pass")}
+    app_code = IMPORT_APP.format(root=ROOT, path=os.path.join(ROOT, "odiFinder.pyw"))
+    imports = [item for item in measure_imports(app_code) if item[0] not in interpreter_modules]
+    total_ms = sum(self_us for _, self_us, _, _ in imports) / 1000
+    print(f"{'cumulative ms':>13}  module")
+    for module, _, cumulative_us, _ in sorted(imports, key=lambda item: item[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>13.2f}  {module}")
+    print(f"Total import time: {total_ms:.2f} ms (budget {args.budget_ms:.0f} ms)")
+
+    eager = sorted({module.split(".")[0] for module, _, _, _ in imports} & set(LAZY_MODULES))
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: startup imports exceed the budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
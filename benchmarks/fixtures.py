@@ -0,0 +1,132 @@
+"""
+Student-page HTML fixtures for the benchmarks.
+
+The saved fixtures (fixtures/student_<boxes>.html.gz) mimic the getodi.com student page: navigation
+and scripts around a grid of menu boxes in the 1.4.3 layout, with Turkish restaurant names and a mix
+of available and sold-out meals. They are generated from a fixed seed, so regenerating them gives
+byte-identical files:
+
+    python benchmarks/fixtures.py [--boxes 10 500 5000]
+"""
+
+import argparse
+import gzip
+import os
+import random
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_SIZES = (10, 500, 5000)
+FIXTURE_SEED = 1443
+
+MENU_BOX_TEMPLATE = (
+    '<div class="col-md-4"><div class="card menu-box">'
+    '<div class="menu-restaurant">Menü {index}</div>'
+    '<div class="menu-title">Restoran {index}</div>'
+    '<div class="menu-details">İzmir / Bornova {index}</div>'
+    '<div class="menu-price">120 TL</div>'
+    '<a class="btn">Bu menüyü askıdan al {count}</a>'
+    '</div></div>'
+)
+
+REALISTIC_MENU_BOX_TEMPLATE = (
+    '<div class="col-lg-4 col-md-6 mb-4">\n'
+    '  <div class="card menu-box h-100" data-id="{index}">\n'
+    '    <img class="card-img-top" src="/media/menus/{index}.jpg" alt="{meal}" loading="lazy">\n'
+    '    <div class="card-body">\n'
+    '      <div class="menu-restaurant">{meal}</div>\n'
+    '      <div class="menu-title">{restaurant}</div>\n'
+    '      <div class="menu-details"><i class="fa fa-map-marker"></i> {location}</div>\n'
+    '      <div class="menu-price">{price} TL</div>\n'
+    '    </div>\n'
+    '    <div class="card-footer">\n'
+    '      <a class="btn btn-success" href="/student/claim/{index}/">Bu menüyü askıdan al {count}</a>\n'
+    '    </div>\n'
+    '  </div>\n'
+    '</div>\n'
+)
+
+RESTAURANT_WORDS = ("Kıraathane", "Burger King", "Dürüm Evi", "Çiğ Köfteci", "Simitçi", "Pideci", "Lokanta",
+                    "Köfteci İsmail", "Börekçi", "Mantı Evi", "Tavuk Dünyası", "Kahve Dünyası", "Iğdır Sofrası")
+MEAL_WORDS = ("Günün Menüsü", "Öğrenci Menüsü", "Tavuk Dürüm", "Köfte Ekmek", "Mercimek Çorbası", "Lahmacun",
+              "Izgara Köfte", "Pilav Üstü Tavuk", "Çay + Simit", "Kumpir")
+DISTRICTS = ("Bornova", "Karşıyaka", "Buca", "Konak", "Bayraklı", "Çiğli", "Kadıköy", "Beşiktaş", "Üsküdar", "Şişli")
+
+PAGE_HEAD = (
+    '<!DOCTYPE html>\n<html lang="tr">\n<head>\n<meta charset="utf-8">\n<title>Öğrenci | Askıda Yemek</title>\n'
+    '<link rel="stylesheet" href="/static/css/bootstrap.min.css">\n'
+    '<style>.menu-box{{min-height:320px}} .menu-title{{font-weight:700}}</style>\n'
+    '<script>window.dataLayer=window.dataLayer||[];function gtag(){{dataLayer.push(arguments);}}</script>\n'
+    '</head>\n<body>\n<nav class="navbar navbar-expand-lg">{nav}</nav>\n'
+    '<div class="container"><h1>Askıdaki Menüler</h1><div class="row">\n'
+)
+PAGE_TAIL = (
+    '</div></div>\n<footer class="footer">{footer}</footer>\n'
+    '<script src="/static/js/jquery.min.js"></script>\n'
+    '<script>$(".menu-box").on("click", function () {{ var box = "<div class=\\"menu-box\\">"; }});</script>\n'
+    '</body>\n</html>\n'
+)
+
+
+def restaurant_name(index: int) -> str:
+    """Restaurant names are unique per box, so any of them can be used as a watch-list entry."""
+    return f"{RESTAURANT_WORDS[index % len(RESTAURANT_WORDS)]} {index}"
+
+
+def build_student_page(box_count: int) -> str:
+    """The compact synthetic page used by bench_parse.py."""
+    filler = "<nav>" + "<a href='#'>link</a>" * 50 + "</nav><script>var config = {};</script>"
+    boxes = "".join(MENU_BOX_TEMPLATE.format(index=index, count=index % 4) for index in range(box_count))
+    return f"<html><head><title>Öğrenci</title></head><body>{filler}<div class='row'>{boxes}</div></body></html>"
+
+
+def build_realistic_student_page(box_count: int, seed: int = FIXTURE_SEED) -> str:
+    rng = random.Random(seed)
+    nav = "".join(f'<a class="nav-link" href="/page/{index}/">Bağlantı {index}</a>' for index in range(40))
+    footer = "".join(f'<a href="/info/{index}/">Bilgi {index}</a> ' for index in range(30))
+    boxes = []
+    for index in range(box_count):
+        boxes.append(REALISTIC_MENU_BOX_TEMPLATE.format(
+            index=index,
+            restaurant=restaurant_name(index),
+            meal=rng.choice(MEAL_WORDS),
+            location=f"{rng.choice(DISTRICTS)} Mah. {rng.randint(1, 400)}. Sk. No:{rng.randint(1, 90)}",
+            price=rng.choice((85, 110, 120, 145, 160)),
+            # Roughly a third of the menus are sold out
+            count=0 if rng.random() < 0.33 else rng.randint(1, 12),
+        ))
+    return PAGE_HEAD.format(nav=nav) + "".join(boxes) + PAGE_TAIL.format(footer=footer)
+
+
+def fixture_path(box_count: int) -> str:
+    return os.path.join(FIXTURE_DIR, f"student_{box_count}.html.gz")
+
+
+def write_fixture(box_count: int) -> str:
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = fixture_path(box_count)
+    # mtime=0 keeps the gzip header, and so the file, reproducible
+    with open(path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+        f.write(build_realistic_student_page(box_count).encode('utf-8'))
+    return path
+
+
+def load_fixture(box_count: int) -> bytes:
+    """Returns the saved fixture as UTF-8 bytes, generating it first if it is missing."""
+    path = fixture_path(box_count)
+    if not os.path.exists(path):
+        write_fixture(box_count)
+    with gzip.open(path, 'rb') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=list(FIXTURE_SIZES))
+    args = parser.parse_args()
+    for box_count in args.boxes:
+        path = write_fixture(box_count)
+        print(f"Wrote {path} ({os.path.getsize(path)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
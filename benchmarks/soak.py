@@ -0,0 +1,262 @@
+"""
+Long-run soak test: drives thousands of refresh, re-login and (with a display) minimize cycles
+against the local getodi.com stub and checks that the process does not grow.
+
+Usage:
+    python benchmarks/soak.py [--mode headless|gui] [--cycles 2000] [--sample-every 100]
+                              [--max-rss-growth-mb 16] [--max-thread-growth 0] [--max-socket-growth 2]
+                              [--max-widget-growth 0] [--jsonl soak.jsonl]
+
+Every cycle refreshes once; the stub alternates between two pages, so the snapshot differ, the
+history and the notification dispatcher see changes on every refresh. Every --relogin-every cycles
+the session cookies are dropped, so the next refresh hits a signed-out page and logs in again.
+
+--mode headless (the default without a display) runs headless.HeadlessPoller. --mode gui builds the
+real window (logged in against the stub, without the login window) and also minimizes to the tray
+and back, and hovers over the tooltip, in every cycle; without pystray and Pillow the window is only
+withdrawn and shown again.
+
+RSS, thread count, open sockets and Tk widget count are sampled every --sample-every cycles. The
+first sample is taken after --warmup cycles, once caches, the parse pool and the connection pool are
+filled; the script exits with status 1 if the last sample grew past a threshold. RSS comes from
+/proc/self/statm, or psutil where installed; open sockets from /proc/self/fd or psutil. A metric
+that cannot be read here is reported as n/a and not checked.
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from importlib.util import find_spec
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fixtures import load_fixture
+from stub_server import STUB_PASSWORD, STUB_USERNAME, StubOdiServer
+
+PSUTIL_AVAILABLE = find_spec("psutil") is not None
+CITY_ID = "35"
+METRICS = ("rss_mb", "threads", "sockets", "widgets")
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if PSUTIL_AVAILABLE:
+        import psutil
+        return psutil.Process().memory_info().rss
+    return None
+
+
+def open_socket_count() -> Optional[int]:
+    try:
+        fd_dir = "/proc/self/fd"
+        count = 0
+        for fd in os.listdir(fd_dir):
+            try:
+                if os.readlink(os.path.join(fd_dir, fd)).startswith("socket:"):
+                    count += 1
+            except OSError:
+                pass  # closed while listing
+        return count
+    except OSError:
+        pass
+    if PSUTIL_AVAILABLE:
+        import psutil
+        return len(psutil.Process().net_connections(kind="all"))
+    return None
+
+
+def widget_count(root) -> Optional[int]:
+    """All widgets under root, Toplevels included."""
+    if root is None or not root.winfo_exists():
+        return None
+    count, pending = 0, [root]
+    while pending:
+        widget = pending.pop()
+        count += 1
+        pending.extend(widget.winfo_children())
+    return count
+
+
+def sample(cycle: int, started: float, root=None) -> Dict[str, Any]:
+    gc.collect()
+    rss = rss_bytes()
+    return {'cycle': cycle, 'elapsed_s': round(time.monotonic() - started, 1),
+            'rss_mb': round(rss / 2 ** 20, 2) if rss is not None else None, 'threads': threading.active_count(),
+            'sockets': open_socket_count(), 'widgets': widget_count(root)}
+
+
+def soak_settings(directory: str) -> str:
+    settings_path = os.path.join(directory, "settings.json")
+    with open(settings_path, 'w', encoding='utf-8') as f:
+        json.dump({'username': STUB_USERNAME, 'restaurants': ["Restoran 1", "Restoran 2", "Restoran 3"], 'city_ids': [CITY_ID],
+                   'refresh_city_names': False, 'notification_sinks': [], 'headless_notification_sinks': [],
+                   'notification_merge_seconds': 0, 'max_requests_per_second': 1e6, 'request_burst': 10 ** 6}, f)
+    return settings_path
+
+
+def run_cycles(cycles: int, sample_every: int, warmup: int, cycle: Callable[[int], None], measure: Callable[[int], Dict[str, Any]],
+               on_sample: Callable[[Dict[str, Any]], None]) -> List[Dict[str, Any]]:
+    samples = []
+    for index in range(1, warmup + cycles + 1):
+        cycle(index)
+        if index >= warmup and (index - warmup) % sample_every == 0:
+            samples.append(measure(index))
+            on_sample(samples[-1])
+    return samples
+
+
+def soak_headless(args, server: StubOdiServer, pages: List[bytes], settings_path: str, on_sample) -> List[Dict[str, Any]]:
+    # headless.py writes its JSON events to the stdout it finds when it is first imported
+    devnull = open(os.devnull, 'w', encoding='utf-8')
+    with contextlib.redirect_stdout(devnull):
+        import headless
+    from notifier import NotificationDispatcher
+    from settings_store import SettingsStore
+    settings = SettingsStore(settings_path, watch=False)
+    poller = headless.HeadlessPoller(settings, settings_path, STUB_PASSWORD, NotificationDispatcher([], merge_seconds=0), 1)
+    started = time.monotonic()
+
+    def cycle(index: int):
+        server.set_page(pages[index % len(pages)])
+        if index % args.relogin_every == 0:
+            poller.session_manager.session.cookies.clear()
+        poller.refresh()
+
+    try:
+        poller.login()
+        return run_cycles(args.cycles, args.sample_every, args.warmup, cycle, lambda index: sample(index, started), on_sample)
+    finally:
+        poller.close()
+        settings.close()
+
+
+def _load_app_module():
+    import importlib.machinery
+    import importlib.util
+    path = os.path.join(ROOT, "odiFinder.pyw")
+    spec = importlib.util.spec_from_file_location("odiFinder", path, loader=importlib.machinery.SourceFileLoader("odiFinder", path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def soak_gui(args, server: StubOdiServer, pages: List[bytes], settings_path: str, on_sample) -> List[Dict[str, Any]]:
+    app_module = _load_app_module()
+    app = app_module.OdiFinderApp(settings_path=settings_path)
+    app._wait_for_warmup()
+    app.session = app.session_manager.login(STUB_USERNAME, STUB_PASSWORD)
+    if app.session is None:
+        raise SystemExit("Could not log in to the stub server.")
+    app.ui.initialize_main_window(app._get_initial_ui_settings())
+    app.refresh_worker.start()
+    root = app.ui.app_root
+    tray_available = app_module.PYSTRAY_AVAILABLE and app_module.PILLOW_AVAILABLE and os.path.exists(app.icon_path)
+    if not tray_available:
+        print("pystray, Pillow or the icon is missing: minimize cycles only withdraw and show the window.")
+    started = time.monotonic()
+
+    def pump(until: Callable[[], bool] = lambda: True, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            root.update()
+            if until() or time.monotonic() > deadline:
+                return
+            time.sleep(0.005)
+
+    def cycle(index: int):
+        server.set_page(pages[index % len(pages)])
+        if index % args.relogin_every == 0:
+            app.session_manager.session.cookies.clear()
+        app.handle_meal_refresh()
+        pump(lambda: not app.refresh_worker.is_busy() and app.ui._ui_queue.empty())
+        button = app.ui.reset_settings_button
+        button.event_generate('<Enter>')
+        pump()
+        if tray_available:
+            app.handle_minimize_to_tray()
+            pump()
+            app.handle_show_window_from_tray()
+        else:
+            app.ui.withdraw_main_window()
+            pump()
+            app.ui.deiconify_and_focus_main_window()
+        pump()
+        button.event_generate('<Leave>')
+        pump()
+
+    try:
+        return run_cycles(args.cycles, args.sample_every, args.warmup, cycle, lambda index: sample(index, started, root), on_sample)
+    finally:
+        app._cleanup()
+
+
+def check_growth(samples: List[Dict[str, Any]], limits: Dict[str, float]) -> List[str]:
+    failures = []
+    first, last = samples[0], samples[-1]
+    for metric in METRICS:
+        if first[metric] is None or last[metric] is None:
+            continue
+        growth = last[metric] - first[metric]
+        if growth > limits[metric]:
+            failures.append(f"{metric} grew by {growth:g} (from {first[metric]:g} to {last[metric]:g}, limit {limits[metric]:g})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    has_display = sys.platform.startswith("win") or sys.platform == "darwin" or bool(os.environ.get("DISPLAY"))
+    parser.add_argument("--mode", choices=("headless", "gui"), default="gui" if has_display else "headless")
+    parser.add_argument("--cycles", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50, help="cycles before the baseline sample")
+    parser.add_argument("--sample-every", type=int, default=100)
+    parser.add_argument("--relogin-every", type=int, default=10)
+    parser.add_argument("--boxes", type=int, default=500, help="menu boxes on the stub pages")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=16.0)
+    parser.add_argument("--max-thread-growth", type=int, default=0)
+    parser.add_argument("--max-socket-growth", type=int, default=2)
+    parser.add_argument("--max-widget-growth", type=int, default=0)
+    parser.add_argument("--jsonl", default=None, help="also append every sample to this file")
+    args = parser.parse_args()
+
+    limits = {'rss_mb': args.max_rss_growth_mb, 'threads': args.max_thread_growth, 'sockets': args.max_socket_growth,
+              'widgets': args.max_widget_growth}
+    pages = [load_fixture(args.boxes), load_fixture(10)]
+    jsonl = open(args.jsonl, 'a', encoding='utf-8') if args.jsonl else None
+    print(f"{'cycle':>7} {'elapsed s':>10} {'RSS MiB':>9} {'threads':>8} {'sockets':>8} {'widgets':>8}")
+
+    def on_sample(row: Dict[str, Any]):
+        cells = [row[metric] if row[metric] is not None else "n/a" for metric in METRICS]
+        print(f"{row['cycle']:>7} {row['elapsed_s']:>10} " + " ".join(f"{cell:>{9 if i == 0 else 8}}" for i, cell in enumerate(cells)), flush=True)
+        if jsonl is not None:
+            jsonl.write(json.dumps({'mode': args.mode, **row}) + "\n")
+            jsonl.flush()
+
+    with tempfile.TemporaryDirectory() as directory, StubOdiServer(pages[0]) as server, server.patch_network():
+        settings_path = soak_settings(directory)
+        soak = soak_gui if args.mode == "gui" else soak_headless
+        samples = soak(args, server, pages, settings_path, on_sample)
+    if jsonl is not None:
+        jsonl.close()
+
+    failures = check_growth(samples, limits) if len(samples) > 1 else []
+    for failure in failures:
+        print(f"LEAK: {failure}")
+    if not failures:
+        print(f"No growth past the limits over {args.cycles} {args.mode} cycles.")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
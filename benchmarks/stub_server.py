@@ -0,0 +1,147 @@
+"""
+A local stand-in for getodi.com, so network code can be benchmarked offline.
+
+Emulates what odiFinder uses:
+- POST /sign-in/ with the right password sets a session cookie and redirects to /student/,
+  a wrong password redirects to /sign-in/?wrong_credentials
+- GET /student/ without the cookie redirects to /sign-in/ (what is_session_valid checks)
+- GET /student/?city=<id> serves the fixture page, with an ETag and 304 answers to If-None-Match
+- HEAD on any path (the startup connection warm-up)
+- POST /webhook records the JSON body in server.webhook_requests (a local target for the webhook
+  notification sink: "notification_webhook_url": server.webhook_url)
+
+Usage:
+    with StubOdiServer(load_fixture(500)) as server, server.patch_network():
+        session = login_to_odi(STUB_USERNAME, STUB_PASSWORD)
+"""
+
+import contextlib
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+STUB_USERNAME = "student@example.com"
+STUB_PASSWORD = "benchmark"
+SESSION_COOKIE = "sessionid=stub-session"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real site
+    # Headers and body go out as separate writes; with Nagle on, small pages would wait for a delayed ACK
+    disable_nagle_algorithm = True
+    server: "_StubHTTPServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _logged_in(self) -> bool:
+        return SESSION_COOKIE in (self.headers.get("Cookie") or "")
+
+    def do_HEAD(self):
+        self._send(200)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+        if urlsplit(self.path).path == "/webhook":
+            self.server.webhook_requests.append(json.loads(body))
+            self._send(204)
+            return
+        form = parse_qs(body)
+        if urlsplit(self.path).path != "/sign-in/":
+            self._send(404)
+        elif form.get("username") == [STUB_USERNAME] and form.get("password") == [STUB_PASSWORD]:
+            self._send(302, headers={"Location": "/student/", "Set-Cookie": f"{SESSION_COOKIE}; Path=/; HttpOnly"})
+        else:
+            self._send(302, headers={"Location": "/sign-in/?wrong_credentials"})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/sign-in/":
+            self._send(200, b"<html><body><form method='post'></form></body></html>", {"Content-Type": "text/html; charset=utf-8"})
+        elif url.path != "/student/":
+            self._send(404)
+        elif not self._logged_in():
+            self._send(302, headers={"Location": "/sign-in/"})
+        elif "city" not in parse_qs(url.query):
+            self._send(200, b"<html><body>student</body></html>", {"Content-Type": "text/html; charset=utf-8"})
+        elif self.server.etag and self.headers.get("If-None-Match") == self.server.etag:
+            self._send(304, headers={"ETag": self.server.etag})
+        else:
+            headers = {"Content-Type": "text/html; charset=utf-8"}
+            if self.server.etag:
+                headers["ETag"] = self.server.etag
+            self._send(200, self.server.page, headers)
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    page: bytes = b""
+    etag: Optional[str] = None
+    webhook_requests: List[Any]
+
+
+class StubOdiServer:
+    def __init__(self, page: bytes, send_etag: bool = True):
+        self._server = _StubHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._server.webhook_requests = []
+        self._thread: Optional[threading.Thread] = None
+        self.set_page(page, send_etag)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def webhook_url(self) -> str:
+        return f"{self.base_url}/webhook"
+
+    @property
+    def webhook_requests(self) -> List[Any]:
+        return self._server.webhook_requests
+
+    def set_page(self, page: bytes, send_etag: bool = True):
+        self._server.page = page
+        self._server.etag = f'"{hashlib.md5(page).hexdigest()}"' if send_etag else None
+
+    def start(self) -> "StubOdiServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="odiStubServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubOdiServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextlib.contextmanager
+    def patch_network(self):
+        """Points the URLs in network.py at this server for the duration of the block."""
+        import network
+        names = ("LOGIN_URL", "STUDENT_URL", "MEALS_URL_TEMPLATE")
+        saved = {name: getattr(network, name) for name in names}
+        network.LOGIN_URL = f"{self.base_url}/sign-in/"
+        network.STUDENT_URL = f"{self.base_url}/student/"
+        network.MEALS_URL_TEMPLATE = f"{self.base_url}/student/?city={{city_id}}"
+        try:
+            yield self
+        finally:
+            for name, value in saved.items():
+                setattr(network, name, value)
@@ -0,0 +1,110 @@
+"""
+City (province) names by plate code.
+
+The 81 provinces ship with the app, so labelling cities never needs the network. An optional
+background refresh downloads the list into a cache file at most once per CITY_CACHE_TTL_SECONDS.
+"""
+
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from io import StringIO
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CITY_CSV_URL = "https://gist.githubusercontent.com/mebaysan/7a4ba8531187fa8703ff1f22692d5fa6/raw/df4e85262ba2a4f6d6045f06f417b853fb67e78c/il.csv"
+CITY_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+CITY_DOWNLOAD_TIMEOUT = (5, 10)
+
+CITY_NAMES: Dict[str, str] = {
+    "01": "Adana", "02": "Adıyaman", "03": "Afyonkarahisar", "04": "Ağrı", "05": "Amasya",
+    "06": "Ankara", "07": "Antalya", "08": "Artvin", "09": "Aydın", "10": "Balıkesir",
+    "11": "Bilecik", "12": "Bingöl", "13": "Bitlis", "14": "Bolu", "15": "Burdur",
+    "16": "Bursa", "17": "Çanakkale", "18": "Çankırı", "19": "Çorum", "20": "Denizli",
+    "21": "Diyarbakır", "22": "Edirne", "23": "Elazığ", "24": "Erzincan", "25": "Erzurum",
+    "26": "Eskişehir", "27": "Gaziantep", "28": "Giresun", "29": "Gümüşhane", "30": "Hakkari",
+    "31": "Hatay", "32": "Isparta", "33": "Mersin", "34": "İstanbul", "35": "İzmir",
+    "36": "Kars", "37": "Kastamonu", "38": "Kayseri", "39": "Kırklareli", "40": "Kırşehir",
+    "41": "Kocaeli", "42": "Konya", "43": "Kütahya", "44": "Malatya", "45": "Manisa",
+    "46": "Kahramanmaraş", "47": "Mardin", "48": "Muğla", "49": "Muş", "50": "Nevşehir",
+    "51": "Niğde", "52": "Ordu", "53": "Rize", "54": "Sakarya", "55": "Samsun",
+    "56": "Siirt", "57": "Sinop", "58": "Sivas", "59": "Tekirdağ", "60": "Tokat",
+    "61": "Trabzon", "62": "Tunceli", "63": "Şanlıurfa", "64": "Uşak", "65": "Van",
+    "66": "Yozgat", "67": "Zonguldak", "68": "Aksaray", "69": "Bayburt", "70": "Karaman",
+    "71": "Kırıkkale", "72": "Batman", "73": "Şırnak", "74": "Bartın", "75": "Ardahan",
+    "76": "Iğdır", "77": "Yalova", "78": "Karabük", "79": "Kilis", "80": "Osmaniye",
+    "81": "Düzce",
+}
+
+
+def get_city_cache_path(settings_path: str) -> str:
+    """The city cache lives next to the settings file: settings.json -> settings.cities.json."""
+    return os.path.splitext(settings_path)[0] + ".cities.json"
+
+
+def load_city_names(cache_path: Optional[str] = None) -> Dict[str, str]:
+    """Returns the bundled city names, updated with the cache file if one exists. Never touches the network."""
+    city_names = dict(CITY_NAMES)
+    if cache_path:
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            city_names.update({str(code).zfill(2): str(name) for code, name in cached.items() if name})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"City cache invalid, using bundled city names: {e}")
+    return city_names
+
+
+def is_city_cache_stale(cache_path: str, ttl_seconds: float = CITY_CACHE_TTL_SECONDS) -> bool:
+    try:
+        return time.time() - os.path.getmtime(cache_path) > ttl_seconds
+    except OSError:
+        return True
+
+
+def _download_city_names() -> Dict[str, str]:
+    import requests
+    response = requests.get(CITY_CSV_URL, timeout=CITY_DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
+    csv_reader = csv.reader(StringIO(response.text))
+    next(csv_reader, None)
+    return {row[0].zfill(2): row[1] for row in csv_reader if len(row) >= 2 and row[0].strip().isdigit()}
+
+
+def refresh_city_names_in_background(cache_path: str, on_update: Optional[Callable[[Dict[str, str]], None]] = None,
+                                     ttl_seconds: float = CITY_CACHE_TTL_SECONDS) -> Optional[threading.Thread]:
+    """
+    Downloads the city list into cache_path on a daemon thread if the cache is older than ttl_seconds.
+    on_update receives the merged city names (called from the background thread).
+    Returns the started thread, or None if the cache is still fresh.
+    """
+    if not is_city_cache_stale(cache_path, ttl_seconds):
+        return None
+
+    def _refresh():
+        try:
+            downloaded = _download_city_names()
+        except Exception as e:
+            logger.warning(f"Could not refresh city names, keeping the bundled list: {e}")
+            return
+        if not downloaded:
+            return
+        try:
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(downloaded, f, ensure_ascii=False, indent=4)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write city cache: {e}")
+        if on_update:
+            on_update({**CITY_NAMES, **downloaded})
+
+    thread = threading.Thread(target=_refresh, name="odiCityRefresh", daemon=True)
+    thread.start()
+    return thread
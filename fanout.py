@@ -0,0 +1,469 @@
+"""
+Lets several odiFinder instances share one poller.
+
+One instance serves ("fanout_serve" in settings, or headless.py --serve): it polls getodi.com as
+usual and keeps the latest available menu boxes of every city it polled. Other instances subscribe
+("fanout_subscribe", or --subscribe) and never scrape getodi.com. Each one matches the shared menu
+boxes against its own restaurant list, so every subscriber gets the same results check_meals() would
+give it.
+
+The server speaks plain HTTP (standard library only):
+
+- GET /v1/events?cities=35,34  Server-Sent Events: a "snapshot" event with the current boxes of the
+  cities, then an "update" event with the changed cities whenever a poll changed them. Comment lines
+  keep the connection alive. Cities nobody polls yet are added to the server's next polls.
+- GET /v1/snapshot?cities=35   the same data once, as JSON
+- GET /v1/health               server statistics
+
+Event data: {"sequence": n, "cities": {"35": {"version": v, "updated": "...", "menu_boxes": [[restaurant,
+title, details, full_text], ...]}}}. Only boxes with an available count above zero are shared, in page
+order, since the others can never produce a meal. With "fanout_token" set, requests need an
+"Authorization: Bearer <token>" header.
+"""
+
+import hmac
+import json
+import logging
+import queue
+import socket
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+import urllib3
+
+import network
+from matcher import AVAILABLE_COUNT_PATTERN, TargetMatcher
+from meal_record import MealRecord, scan_timestamp
+from page_cache import PageCache
+from parsing import MenuBox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+KEEPALIVE_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 100
+MAX_CITIES_PER_SUBSCRIPTION = 81
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 60
+STREAM_READ_SIZE = 64 * 1024
+
+
+def parse_address(address: Union[str, bool, None]) -> Tuple[str, int]:
+    """"host:port", ":port" or true (DEFAULT_HOST:DEFAULT_PORT) -> (host, port)."""
+    if address is True or not address:
+        return DEFAULT_HOST, DEFAULT_PORT
+    host, _, port = str(address).rpartition(":")
+    if not host and not port.isdigit():
+        return port, DEFAULT_PORT
+    return host or DEFAULT_HOST, int(port) if port else DEFAULT_PORT
+
+
+def iter_stream_lines(raw) -> Iterator[str]:
+    """
+    The lines of an event stream (a urllib3 response read with stream=True) as soon as each one
+    arrives. Response.iter_lines() waits until 512 bytes are in, which can hold back a small event for
+    minutes when only keep-alive comments follow it.
+    """
+    if hasattr(raw, 'read1'):
+        # Returns what one read of the socket gives, up to STREAM_READ_SIZE, instead of waiting for all of it
+        read = lambda: raw.read1(STREAM_READ_SIZE, decode_content=True)
+    else:
+        read = lambda: raw.read(1, decode_content=True)  # urllib3 1.x has no read1
+    pending: List[bytes] = []
+    while True:
+        chunk = read()
+        if not chunk:
+            break
+        *lines, rest = chunk.split(b"\n")
+        for line in lines:
+            if pending:
+                pending.append(line)
+                line = b"".join(pending)
+                pending = []
+            yield line.rstrip(b"\r").decode('utf-8')
+        if rest:
+            pending.append(rest)
+    if pending:
+        yield b"".join(pending).rstrip(b"\r").decode('utf-8')
+
+
+def available_menu_boxes(menu_boxes: Iterable[MenuBox]) -> List[MenuBox]:
+    """The boxes whose "Bu menüyü askıdan al <N>" count is above zero, in page order."""
+    available = []
+    for menu_box in menu_boxes:
+        match = AVAILABLE_COUNT_PATTERN.search(menu_box.full_text)
+        if match and int(match.group(1)) > 0:
+            available.append(menu_box)
+    return available
+
+
+def _parse_city_ids(query: str) -> List[str]:
+    values = parse_qs(query).get('cities', []) + parse_qs(query).get('city', [])
+    city_ids = [city_id.strip() for value in values for city_id in value.split(',') if city_id.strip()]
+    return list(dict.fromkeys(city_ids))[:MAX_CITIES_PER_SUBSCRIPTION]
+
+
+class _Subscription:
+    def __init__(self, city_ids: List[str]):
+        self.city_ids = set(city_ids)
+        self.ended = False
+        self.events: "queue.Queue[Optional[Tuple[str, str]]]" = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+
+class _FanoutHandler(BaseHTTPRequestHandler):
+    server: "_FanoutHTTPServer"
+
+    def log_message(self, format, *args):
+        logger.debug(f"Fan-out request from {self.address_string()}: {format % args}")
+
+    def _send_json(self, status: int, payload: Any):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        token = self.server.fanout.token
+        if not token:
+            return True
+        supplied = self.headers.get("Authorization") or ""
+        return hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8'))
+
+    def do_GET(self):
+        fanout = self.server.fanout
+        url = urlsplit(self.path)
+        if not self._authorized():
+            self._send_json(401, {'error': "missing or wrong token"})
+        elif url.path == "/v1/health":
+            self._send_json(200, fanout.get_stats())
+        elif url.path == "/v1/snapshot":
+            self._send_json(200, fanout.snapshot(_parse_city_ids(url.query)))
+        elif url.path == "/v1/events":
+            city_ids = _parse_city_ids(url.query)
+            if city_ids:
+                self._stream_events(city_ids)
+            else:
+                self._send_json(400, {'error': "no cities given, use ?cities=35,34"})
+        else:
+            self._send_json(404, {'error': "not found"})
+
+    def _write_event(self, event: str, data: str):
+        self.wfile.write(f"event: {event}\ndata: {data}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _stream_events(self, city_ids: List[str]):
+        fanout = self.server.fanout
+        subscription, snapshot = fanout.subscribe(city_ids)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self._write_event("snapshot", json.dumps(snapshot, ensure_ascii=False))
+            while not subscription.ended:
+                try:
+                    item = subscription.events.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+                    continue
+                if item is None:
+                    break
+                self._write_event(*item)
+        except OSError:
+            pass  # The subscriber went away
+        finally:
+            fanout.unsubscribe(subscription)
+
+
+class _FanoutHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    fanout: "FanoutServer"
+
+
+class FanoutServer:
+    """
+    Holds the latest available menu boxes per city and pushes changes to the subscribers.
+    publish() is called by the polling side after every refresh; on_new_cities is called (from a
+    request thread) with cities a subscriber asked for that nobody polled yet, so the poller can
+    fetch them right away instead of at its next scheduled refresh.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, token: Optional[str] = None,
+                 on_new_cities: Optional[Callable[[Set[str]], None]] = None):
+        self.token = token
+        self._on_new_cities = on_new_cities
+        self._lock = threading.Lock()
+        self._cities: Dict[str, Dict[str, Any]] = {}  # city id -> {'version', 'updated', 'menu_boxes'}
+        self._sequence = 0
+        self._subscriptions: List[_Subscription] = []
+        self._stats = {'publishes': 0, 'updates_sent': 0, 'subscribers_dropped': 0}
+        self._httpd = _FanoutHTTPServer((host, port), _FanoutHandler)
+        self._httpd.fanout = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._httpd.server_address[:2]
+
+    @property
+    def url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FanoutServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="odiFanoutServer", daemon=True)
+        self._thread.start()
+        logger.info(f"Sharing meal updates at {self.url}.")
+        return self
+
+    def stop(self):
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, []
+        for subscription in subscriptions:
+            self._end(subscription)
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    @staticmethod
+    def _end(subscription: _Subscription):
+        """Makes the subscription's handler close its stream once it has written what is queued."""
+        subscription.ended = True
+        try:
+            subscription.events.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def subscribed_city_ids(self) -> Set[str]:
+        """Every city a connected subscriber asked for; the poller adds them to its polls."""
+        with self._lock:
+            return set().union(*(subscription.city_ids for subscription in self._subscriptions))
+
+    def subscribe(self, city_ids: List[str]) -> Tuple[_Subscription, Dict[str, Any]]:
+        subscription = _Subscription(city_ids)
+        with self._lock:
+            known = set(self._cities).union(*(other.city_ids for other in self._subscriptions))
+            self._subscriptions.append(subscription)
+            snapshot = self._snapshot_locked(city_ids)
+        new_cities = set(city_ids) - known
+        if new_cities and self._on_new_cities is not None:
+            self._on_new_cities(new_cities)
+        return subscription, snapshot
+
+    def unsubscribe(self, subscription: _Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def snapshot(self, city_ids: List[str]) -> Dict[str, Any]:
+        with self._lock:
+            return self._snapshot_locked(city_ids or list(self._cities))
+
+    def _snapshot_locked(self, city_ids: Iterable[str]) -> Dict[str, Any]:
+        return {'sequence': self._sequence, 'cities': {city_id: self._cities[city_id] for city_id in city_ids if city_id in self._cities}}
+
+    def publish(self, menu_boxes_by_city: Dict[str, Optional[List[MenuBox]]]):
+        """Stores the boxes of every city with a result (None = failed fetch, kept as it was) and pushes the changed ones."""
+        updated = datetime.now().isoformat(timespec='seconds')
+        changed: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            self._stats['publishes'] += 1
+            for city_id, menu_boxes in menu_boxes_by_city.items():
+                if menu_boxes is None:
+                    continue
+                boxes = [list(menu_box) for menu_box in available_menu_boxes(menu_boxes)]
+                previous = self._cities.get(city_id)
+                if previous is not None and previous['menu_boxes'] == boxes:
+                    continue
+                changed[city_id] = {'version': (previous['version'] + 1) if previous else 1, 'updated': updated, 'menu_boxes': boxes}
+            if not changed:
+                return
+            self._cities.update(changed)
+            self._sequence += 1
+            sequence = self._sequence
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            cities = {city_id: changed[city_id] for city_id in subscription.city_ids if city_id in changed}
+            if not cities:
+                continue
+            try:
+                subscription.events.put_nowait(("update", json.dumps({'sequence': sequence, 'cities': cities}, ensure_ascii=False)))
+                with self._lock:
+                    self._stats['updates_sent'] += 1
+            except queue.Full:
+                # A subscriber that stopped reading is dropped; it gets a fresh snapshot when it reconnects
+                self.unsubscribe(subscription)
+                self._end(subscription)
+                with self._lock:
+                    self._stats['subscribers_dropped'] += 1
+                logger.warning("Dropped a fan-out subscriber that fell behind.")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, 'url': self.url, 'sequence': self._sequence, 'subscribers': len(self._subscriptions),
+                    'cities': sorted(self._cities), 'subscribed_cities': sorted(set().union(*(s.city_ids for s in self._subscriptions)))}
+
+
+def poll_and_publish(server: FanoutServer, session: requests.Session, target_texts: TargetMatcher, city_ids: List[str],
+                     parser_backend: Optional[str] = None) -> Dict[str, Optional[List[MealRecord]]]:
+    """
+    check_meals_many() for the instance's own cities plus every city a subscriber asked for. The menu
+    boxes the fetch left in the page cache are published; only the results of city_ids are returned.
+    """
+    polled_city_ids = list(dict.fromkeys([*city_ids, *sorted(server.subscribed_city_ids())]))
+    results = network.check_meals_many(session, target_texts, polled_city_ids, parser_backend=parser_backend)
+    server.publish({city_id: network.get_cached_menu_boxes(city_id) if results.get(city_id) is not None else None
+                    for city_id in polled_city_ids})
+    return {city_id: results.get(city_id) for city_id in city_ids}
+
+
+class FanoutSubscriber:
+    """
+    Follows a FanoutServer's event stream on a daemon thread and reconnects with exponential backoff.
+    on_update is called (from that thread) with the ids of the cities that changed, so the app can
+    refresh right away instead of waiting for its next scheduled refresh.
+    """
+
+    def __init__(self, url: str, city_ids: List[str], token: Optional[str] = None,
+                 on_update: Optional[Callable[[Set[str]], None]] = None):
+        self.url = url.rstrip('/')
+        self.token = token
+        self._on_update = on_update
+        self._lock = threading.Lock()
+        self._city_ids = list(city_ids)
+        self._menu_boxes: Dict[str, List[MenuBox]] = {}
+        self._page_cache = PageCache()
+        self._connected = False
+        self._response: Optional[requests.Response] = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="odiFanoutSubscriber", daemon=True)
+        self._stats = {'connects': 0, 'events': 0, 'last_sequence': None, 'last_error': None}
+
+    def start(self) -> "FanoutSubscriber":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        self._disconnect()
+
+    def set_city_ids(self, city_ids: List[str]):
+        """Follows other cities from now on; reconnects if they changed."""
+        with self._lock:
+            if list(city_ids) == self._city_ids:
+                return
+            self._city_ids = list(city_ids)
+        self._disconnect()
+
+    def _disconnect(self):
+        with self._lock:
+            response = self._response
+        if response is None:
+            return
+        # Shutting the socket down ends the blocking read in _run, which then reconnects. close() would
+        # first wait for that read to return, i.e. for the next event or keep-alive.
+        try:
+            sock = socket.socket(fileno=response.raw.fileno())
+        except (OSError, ValueError):
+            return  # the stream is closed already
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        finally:
+            sock.detach()  # the socket still belongs to the response, which _follow closes
+
+    def check_meals_many(self, target_texts: TargetMatcher, city_ids: List[str]) -> Dict[str, Optional[List[MealRecord]]]:
+        """
+        Results in the form of network.check_meals_many(), matched against the latest shared boxes.
+        While disconnected, or before the server has data for a city, that city's result is None
+        (a failed fetch), so the app keeps showing what it had.
+        """
+        with self._lock:
+            menu_boxes_by_city = {city_id: self._menu_boxes.get(city_id) if self._connected else None for city_id in city_ids}
+        scanned_at = scan_timestamp()
+        return {city_id: network.match_menu_boxes(menu_boxes, target_texts, self._page_cache, scanned_at) if menu_boxes is not None else None
+                for city_id, menu_boxes in menu_boxes_by_city.items()}
+
+    def menu_boxes(self, city_id: str) -> Optional[List[MenuBox]]:
+        """The latest shared boxes of a city (only the available ones; see FanoutServer.publish), or None."""
+        with self._lock:
+            return self._menu_boxes.get(city_id)
+
+    def _run(self):
+        delay = RECONNECT_MIN_SECONDS
+        while not self._stop_event.is_set():
+            try:
+                if self._follow():
+                    delay = RECONNECT_MIN_SECONDS
+            except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, OSError, ValueError, KeyError, TypeError) as e:
+                if not self._stop_event.is_set():
+                    logger.warning(f"Fan-out subscription to {self.url} failed: {e}")
+                    with self._lock:
+                        self._stats['last_error'] = str(e)
+            finally:
+                with self._lock:
+                    self._connected = False
+                    self._response = None
+            if self._stop_event.wait(delay):
+                break
+            delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+    def _follow(self) -> bool:
+        """Reads one event stream until it ends. Returns True if it delivered at least the snapshot."""
+        with self._lock:
+            city_ids = list(self._city_ids)
+        headers = {'Accept': "text/event-stream"}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        response = requests.get(f"{self.url}/v1/events", params={'cities': ",".join(city_ids)}, headers=headers,
+                                stream=True, timeout=(network.REQUEST_TIMEOUT[0], 2 * KEEPALIVE_SECONDS + 5))
+        with self._lock:
+            self._response = response
+        if self._stop_event.is_set():
+            response.close()
+            return False
+        response.raise_for_status()
+        delivered = False
+        event, data_lines = None, []
+        with response:
+            for line in iter_stream_lines(response.raw):
+                if line.startswith(':'):
+                    continue
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data_lines.append(line[len("data:"):].strip())
+                elif not line and data_lines:
+                    self._handle_event(event, json.loads("\n".join(data_lines)), city_ids)
+                    delivered = True
+                    event, data_lines = None, []
+        return delivered
+
+    def _handle_event(self, event: Optional[str], payload: Dict[str, Any], city_ids: List[str]):
+        cities = {city_id: [MenuBox(*box) for box in city['menu_boxes']] for city_id, city in payload['cities'].items()}
+        with self._lock:
+            if event == "snapshot":
+                self._connected = True
+                self._stats['connects'] += 1
+                # A city the server had nothing for yet stays None until its first update
+                self._menu_boxes = {city_id: boxes for city_id, boxes in self._menu_boxes.items() if city_id in cities}
+                logger.info(f"Subscribed to meal updates at {self.url} for cities {', '.join(city_ids)}.")
+            self._menu_boxes.update(cities)
+            self._stats['events'] += 1
+            self._stats['last_sequence'] = payload.get('sequence')
+        if self._on_update is not None and cities:
+            self._on_update(set(cities))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, 'url': self.url, 'connected': self._connected, 'cities': list(self._city_ids),
+                    'cities_with_data': sorted(self._menu_boxes)}
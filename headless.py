@@ -0,0 +1,469 @@
+"""
+odiFinder without a window: polls getodi.com on a server or in a container.
+
+Usage:
+    python headless.py [--settings PATH] [--interval MINUTES] [--once] [--sink stdout] [--sink webhook]
+                       [--serve [HOST:PORT]] [--subscribe URL]
+
+Reads the same settings file as the GUI (username, restaurants, city_ids, refresh_interval,
+parser_backend, streaming_fetch). The password comes from the ODIFINDER_PASSWORD environment
+variable, or is asked on the terminal. Every event is written to stdout as one JSON line.
+Notifications go to the sinks named with --sink, or in "headless_notification_sinks" in the
+settings (default: stdout); see notifier.py. Changes to the watch list and cities in the settings
+file are picked up while running, without a restart.
+With --serve, the latest menu boxes are shared with other instances, which follow them with
+--subscribe instead of scraping getodi.com themselves (no password needed then); see fanout.py.
+With "profiles" in the settings, several accounts and watch lists are polled together, each city
+page fetched once for all of them; passwords come from ODIFINDER_PASSWORD_<NAME>, see profiles.py.
+
+Never imports tkinter, pystray or PIL.
+"""
+
+import argparse
+import getpass
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Union
+
+from app_log import configure_logging
+from app_paths import get_settings_path, resource_path
+from cities import get_city_cache_path, load_city_names
+from history import MAX_SCAN_GAP_FACTOR, open_history_store
+import metrics
+from matcher import TargetMatcher
+from meal_record import MealRecord
+from notifier import NotificationDispatcher, create_dispatcher
+from poll_scheduler import OUTCOME_CHANGED, OUTCOME_ERROR, OUTCOME_UNCHANGED, AdaptivePollScheduler
+from settings_store import SettingsStore
+from snapshot_diff import SnapshotDiff, SnapshotDiffer
+
+if TYPE_CHECKING:
+    from fanout import FanoutServer, FanoutSubscriber
+    from profiles import ProfilePoller
+    from session_manager import SessionManager
+
+PASSWORD_ENV_VAR = "ODIFINDER_PASSWORD"
+
+_json_stdout = sys.stdout
+
+
+def log_event(event: str, **fields):
+    """Writes one JSON line: {"ts": ..., "event": ..., **fields}."""
+    record = {'ts': datetime.now().isoformat(timespec='seconds'), 'event': event, **fields}
+    _json_stdout.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    _json_stdout.flush()
+
+
+class JsonLogHandler(logging.Handler):
+    """Writes the log records of the shared modules as {"event": "log", "level": ..., "message": ...} lines."""
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            fields = {'level': record.levelname.lower(), 'logger': record.name, 'message': record.getMessage()}
+            if record.exc_info:
+                fields['traceback'] = logging.Formatter().formatException(record.exc_info)
+            log_event("log", **fields)
+        except Exception:
+            self.handleError(record)
+
+
+class _PrintToJsonLines:
+    """
+    Stands in for sys.stdout so stray print() output also comes out as {"event": "log", "message": ...}
+    lines and stdout stays valid JSON lines.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._buffer += text
+            *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self._emit(line)
+        return len(text)
+
+    @staticmethod
+    def _emit(line: str):
+        if not line.strip():
+            return
+        if line.startswith("{"):
+            # Already a JSON line (e.g. from the stdout notification sink)
+            _json_stdout.write(line + "\n")
+            _json_stdout.flush()
+            return
+        log_event("log", message=line)
+
+    def flush(self):
+        with self._lock:
+            line, self._buffer = self._buffer, ""
+        self._emit(line)
+
+
+class HeadlessPoller:
+    def __init__(self, settings: Dict[str, Any], settings_path: str, password: str, dispatcher: NotificationDispatcher,
+                 interval_minutes: float, serve: Union[str, bool, None] = None, subscribe: Optional[str] = None,
+                 profile_poller: Optional["ProfilePoller"] = None):
+        self.settings = settings
+        self.username: str = settings.get('username', '')
+        self.password = password
+        self.target_matcher = TargetMatcher(settings.get('restaurants') or [""])
+        city_id = settings.get('city_id', "35")
+        self.city_ids: List[str] = settings.get('city_ids', [city_id]) or [city_id]
+        # With profiles, their accounts, cities and watch lists are polled instead of the ones above
+        self.profile_poller = profile_poller
+        if profile_poller is not None:
+            self.city_ids = list(dict.fromkeys(city_id for profile in profile_poller.profiles for city_id in profile.city_ids))
+        self.city_names = load_city_names(get_city_cache_path(settings_path))
+        self.notifications_enabled: bool = settings.get('notifications_enabled', True)
+        self.dispatcher = dispatcher
+        self.dispatcher.city_names = self.city_names
+        for profile in profile_poller.profiles if profile_poller is not None else ():
+            if profile.dispatcher is not None:
+                profile.dispatcher.city_names = self.city_names
+        self.scheduler = AdaptivePollScheduler.from_settings(settings, interval_minutes)
+        self.snapshot_differ = SnapshotDiffer()
+        self.session = None
+        self.history_store = open_history_store(settings, settings_path)
+        from network import configure_request_limits
+        configure_request_limits(settings)
+        # Profiles keep a session manager per account; the settings' own account is not used then
+        self.session_manager: Optional["SessionManager"] = None
+        if profile_poller is None:
+            from session_manager import SessionManager as _SessionManager, get_cookie_path
+            self.session_manager = _SessionManager(get_cookie_path(settings_path))
+        self.credentials_rejected = False
+        self._stop_event = threading.Event()
+        # Set by stop() and by the fan-out side when a refresh should happen right away
+        self._wake_event = threading.Event()
+        self.fanout_server: Optional["FanoutServer"] = None
+        self.fanout_subscriber: Optional["FanoutSubscriber"] = None
+        if serve:
+            from fanout import FanoutServer as _FanoutServer, parse_address
+            host, port = parse_address(serve)
+            self.fanout_server = _FanoutServer(host, port, settings.get('fanout_token'), on_new_cities=self._on_fanout_cities).start()
+        if subscribe:
+            from fanout import FanoutSubscriber as _FanoutSubscriber
+            self.fanout_subscriber = _FanoutSubscriber(subscribe, self.city_ids, settings.get('fanout_token'),
+                                                      on_update=self._on_fanout_cities).start()
+
+    def apply_settings_change(self, changed_keys: Set[str]):
+        """The settings file was edited while running (called from the settings store thread); watch list changes refresh at once."""
+        log_event("settings_reloaded", keys=sorted(changed_keys))
+        if 'profiles' in changed_keys:
+            log_event("log", level="warning", message="Changes to profiles take effect after a restart.")
+        if 'notifications_enabled' in changed_keys:
+            self.notifications_enabled = self.settings.get('notifications_enabled', True)
+        if not changed_keys & {'restaurants', 'city_ids', 'city_id'}:
+            return
+        if self.profile_poller is not None:
+            # The profiles' own watch lists and cities are polled, not the top-level ones
+            log_event("log", level="warning", message="Profiles are polled: restaurants, city_ids and city_id apply after a restart without profiles.")
+            return
+        self.target_matcher = TargetMatcher(self.settings.get('restaurants') or [""])
+        city_id = self.settings.get('city_id', "35")
+        self.city_ids = self.settings.get('city_ids', [city_id]) or [city_id]
+        if self.fanout_subscriber is not None:
+            self.fanout_subscriber.set_city_ids(self.city_ids)
+        self._wake_event.set()
+
+    def _on_fanout_cities(self, city_ids: Set[str]):
+        log_event("fanout", cities=sorted(city_ids))
+        self._wake_event.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def login(self, reuse_cookies: bool = True) -> bool:
+        """Rejected credentials stop the poller: sending the same password again cannot succeed."""
+        from network import AuthenticationError
+        if self.profile_poller is not None:
+            return self._login_profiles()
+        self.session = self.session_manager.login(self.username, self.password, reuse_cookies=reuse_cookies)
+        error = self.session_manager.last_error
+        fields = {'error': type(error).__name__, 'message': str(error)} if error else {}
+        log_event("login", username=self.username, success=self.session is not None, **fields)
+        if isinstance(error, AuthenticationError):
+            self.credentials_rejected = True
+            self.stop()
+        return self.session is not None
+
+    def _login_profiles(self) -> bool:
+        errors = self.profile_poller.login_all()
+        for username, error in errors.items():
+            fields = {'error': type(error).__name__, 'message': str(error)} if error else {}
+            log_event("login", username=username, profiles=self.profile_poller.profile_names(username), success=error is None, **fields)
+        if self.profile_poller.all_rejected:
+            self.credentials_rejected = True
+            self.stop()
+        return any(error is None for error in errors.values())
+
+    def run_forever(self):
+        """Refreshes until stop() is called, waiting as long as the poll scheduler says. Refreshes never overlap."""
+        log_event("started", cities=self.city_ids, restaurants=list(self.target_matcher.target_texts),
+                  interval_seconds=self.scheduler.interval_seconds, adaptive=self.scheduler.adaptive)
+        while not self._stop_event.is_set():
+            self.refresh()
+            delay_seconds = self.scheduler.next_delay()
+            log_event("scheduled", delay_seconds=round(delay_seconds, 1), reason=self.scheduler.last_reason)
+            self._wake_event.wait(delay_seconds)
+            self._wake_event.clear()
+        log_event("stopped")
+
+    def refresh(self):
+        """Same flow as the GUI's refresh job: re-login once if the session expired, otherwise leave errors to the scheduler's backoff."""
+        timings = metrics.recorder.begin_refresh()
+        try:
+            if not self._refresh_with_relogin():
+                self.scheduler.record(OUTCOME_ERROR)
+        finally:
+            metrics.recorder.end_refresh(timings)
+
+    def _refresh_with_relogin(self) -> bool:
+        from requests.exceptions import RequestException
+        from network import SessionExpiredError
+        relogin_attempted = False
+        # Profiles log their accounts in (again) themselves
+        if self.session is None and self.fanout_subscriber is None and self.profile_poller is None:
+            relogin_attempted = True
+            if not self.login(reuse_cookies=False):
+                return False
+        while True:
+            try:
+                self._refresh_meals()
+                return True
+            except SessionExpiredError as e:
+                log_event("error", kind="session_expired", message=str(e))
+                if relogin_attempted or not self.login(reuse_cookies=False):
+                    return False
+                relogin_attempted = True
+            except RequestException as e:
+                log_event("error", kind="connection", message=str(e))
+                return False
+            except Exception as e:
+                log_event("error", kind="refresh", message=str(e))
+                return False
+
+    def _refresh_meals(self):
+        from network import check_meals, check_meals_many
+        parser_backend = self.settings.get('parser_backend')
+        started = time.perf_counter()
+        if self.profile_poller is not None:
+            self._refresh_profiles(parser_backend, started)
+            return
+        if self.fanout_subscriber is not None:
+            meals_by_city = self.fanout_subscriber.check_meals_many(self.target_matcher, self.city_ids)
+        elif self.fanout_server is not None:
+            from fanout import poll_and_publish
+            meals_by_city = poll_and_publish(self.fanout_server, self.session, self.target_matcher, self.city_ids, parser_backend)
+        elif len(self.city_ids) > 1:
+            meals_by_city = check_meals_many(self.session, self.target_matcher, self.city_ids, parser_backend=parser_backend)
+        else:
+            meals_by_city = {self.city_ids[0]: check_meals(self.session, self.target_matcher, self.city_ids[0], parser_backend,
+                                                           stream=self.settings.get('streaming_fetch', False))}
+        diff_started = time.perf_counter()
+        meal_diff = self.snapshot_differ.update(meals_by_city)
+        metrics.add('diff', time.perf_counter() - diff_started)
+        self._record_history(meals_by_city, meal_diff.changed_cities)
+        if len(meal_diff.failed_cities) == len(meals_by_city):
+            self.scheduler.record(OUTCOME_ERROR)
+        else:
+            self.scheduler.record(OUTCOME_CHANGED if meal_diff.has_changes else OUTCOME_UNCHANGED)
+        self._log_refresh(started, meals_by_city, meal_diff)
+        if meal_diff.added and self.notifications_enabled:
+            with metrics.span('notify'):
+                self.dispatcher.submit(meal_diff.added)
+
+    def _refresh_profiles(self, parser_backend: Optional[str], started: float):
+        """Every city page is fetched and parsed once; each profile gets its own diff, log event and notifications."""
+        results = self.profile_poller.poll(parser_backend)
+        changed_cities: Set[str] = set()
+        all_failed = True
+        for profile in self.profile_poller.profiles:
+            meals_by_city = results[profile.name]
+            diff_started = time.perf_counter()
+            meal_diff = profile.snapshot_differ.update(meals_by_city)
+            metrics.add('diff', time.perf_counter() - diff_started)
+            changed_cities |= meal_diff.changed_cities
+            all_failed &= len(meal_diff.failed_cities) == len(meals_by_city)
+            self._log_refresh(started, meals_by_city, meal_diff, profile=profile.name)
+            if meal_diff.added and self.notifications_enabled and profile.notifications_enabled:
+                with metrics.span('notify'):
+                    (profile.dispatcher or self.dispatcher).submit(meal_diff.added)
+        # The history holds what any profile was watching for
+        meals_by_city: Dict[str, Optional[List[MealRecord]]] = {city_id: None for city_id in self.city_ids}
+        for city_results in results.values():
+            for city_id, meals in city_results.items():
+                if meals is not None:
+                    meals_by_city[city_id] = list({(meal.restaurant_name, meal.meal_name, meal.location): meal
+                                                   for meal in (meals_by_city.get(city_id) or []) + meals}.values())
+        self._record_history(meals_by_city, changed_cities)
+        self.scheduler.record(OUTCOME_ERROR if all_failed else OUTCOME_CHANGED if changed_cities else OUTCOME_UNCHANGED)
+
+    def _record_history(self, meals_by_city: Dict[str, Optional[List[MealRecord]]], changed_cities: Set[str]):
+        if self.history_store is None:
+            return
+        with metrics.span('history'):
+            self.history_store.max_scan_gap_seconds = MAX_SCAN_GAP_FACTOR * self.scheduler.ceiling_seconds
+            for city_id, current_meals in meals_by_city.items():
+                if current_meals is None:
+                    continue
+                if city_id in changed_cities or not self.history_store.extend_last_observation(city_id):
+                    self.history_store.record_scan(city_id, current_meals)
+            self.history_store.prune_if_due()
+            if self.scheduler.slot_activity_is_stale():
+                self.scheduler.set_slot_activity(self.history_store.slot_activity(self.city_ids))
+
+    def _log_refresh(self, started: float, meals_by_city: Dict[str, Optional[List[MealRecord]]], meal_diff: SnapshotDiff, **fields):
+        log_event("refresh", **fields, duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                  failed_cities=sorted(meal_diff.failed_cities),
+                  found=sum(len(meals) for meals in meals_by_city.values() if meals),
+                  added=[self._with_city(meal) for meal in meal_diff.added],
+                  removed=[self._with_city(meal) for meal in meal_diff.removed],
+                  count_changed=[{**self._with_city(change.meal), 'previous_count': change.previous_count}
+                                 for change in meal_diff.count_changed])
+
+    def _with_city(self, meal: MealRecord) -> Dict[str, Any]:
+        return meal.to_dict(self.city_names)
+
+    def close(self):
+        # Whatever is still in the dispatcher's merge window is sent now, e.g. after --once
+        self.dispatcher.close()
+        if self.fanout_subscriber is not None:
+            self.fanout_subscriber.stop()
+        if self.fanout_server is not None:
+            self.fanout_server.stop()
+        if self.session_manager is not None:
+            self.session_manager.close()
+        if self.profile_poller is not None:
+            for profile in self.profile_poller.profiles:
+                if profile.dispatcher is not None:
+                    profile.dispatcher.close()
+            self.profile_poller.close()
+        if self.history_store is not None:
+            self.history_store.close()
+        if 'network' in sys.modules:
+            sys.modules['network'].shutdown_parse_pool()
+
+
+def _read_password() -> Optional[str]:
+    password = os.environ.get(PASSWORD_ENV_VAR)
+    if password:
+        return password
+    if sys.stdin.isatty():
+        return getpass.getpass("getodi.com password: ", stream=sys.stderr)
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    global _json_stdout
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--settings", default=None, help="settings file (default: the GUI's settings.json)")
+    parser.add_argument("--interval", type=float, default=None, help="minutes between refreshes (default: refresh_interval from settings)")
+    parser.add_argument("--once", action="store_true", help="refresh once and exit")
+    parser.add_argument("--sink", action="append", default=None, help="notification sink: stdout, webhook or desktop (repeatable)")
+    parser.add_argument("--serve", nargs="?", const=True, default=None, metavar="HOST:PORT",
+                        help="share the polled menu boxes with other instances (default: fanout_serve from settings)")
+    parser.add_argument("--subscribe", default=None, metavar="URL",
+                        help="follow a serving instance instead of polling getodi.com (default: fanout_subscribe from settings)")
+    args = parser.parse_args(argv)
+
+    _json_stdout = sys.stdout
+    sys.stdout = _PrintToJsonLines()
+    try:
+        return _run(args)
+    finally:
+        sys.stdout.flush()
+        sys.stdout = _json_stdout
+
+
+def _create_profile_poller(settings: Dict[str, Any], settings_path: str, sink_names: List[str], icon_path: str) -> "ProfilePoller":
+    """The profiles of the settings whose password is set; each notifies through its own sinks if it names any."""
+    from profiles import ProfilePoller, load_profiles
+    from session_manager import get_cookie_path
+    profiles = load_profiles(settings)
+    passwords = {}
+    for profile in profiles:
+        passwords[profile.name] = os.environ.get(profile.password_env)
+        if not passwords[profile.name]:
+            log_event("error", kind="config", message=f"No password for profile {profile.name}: set {profile.password_env}.")
+        elif profile.notification_settings:
+            profile.dispatcher = create_dispatcher(profile.notification_settings.get('notification_sinks', sink_names),
+                                                   {**settings, **profile.notification_settings}, icon_path)
+    return ProfilePoller(profiles, passwords, lambda username: get_cookie_path(settings_path, username))
+
+
+def _run(args: argparse.Namespace) -> int:
+    settings_path = args.settings or get_settings_path()
+    # A long-running poller follows edits to the file; it never writes it
+    settings = SettingsStore(settings_path, watch=not args.once)
+    configure_logging(settings, settings_path, stdout=False, extra_handlers=[JsonLogHandler()])
+    metrics.recorder.configure(settings.get('metrics_prometheus_textfile'), settings.get('metrics_jsonl'))
+    serve = args.serve if args.serve is not None else settings.get('fanout_serve')
+    subscribe = args.subscribe or settings.get('fanout_subscribe')
+    if subscribe and serve:
+        log_event("error", kind="config", message="--serve and --subscribe cannot be combined.")
+        return 2
+    icon_path = resource_path('odiFinderlogo.ico')
+    sink_names = args.sink or settings.get('headless_notification_sinks', ['stdout'])
+    profile_poller = None
+    if settings.get('profiles'):
+        if subscribe or serve:
+            log_event("error", kind="config", message="Profiles cannot be combined with --serve or --subscribe.")
+            return 2
+        profile_poller = _create_profile_poller(settings, settings_path, sink_names, icon_path)
+        if not profile_poller.profiles:
+            log_event("error", kind="config", message=f"No profile in {settings_path} has a password set.")
+            return 2
+        password = ""
+    else:
+        if not settings.get('username') and not subscribe:
+            log_event("error", kind="config", message=f"No username in {settings_path}.")
+            return 2
+        # A subscriber never logs in to getodi.com
+        password = _read_password() if not subscribe else ""
+        if not password and not subscribe:
+            log_event("error", kind="config", message=f"No password: set {PASSWORD_ENV_VAR} or run on a terminal.")
+            return 2
+
+    dispatcher = create_dispatcher(sink_names, settings, icon_path)
+    interval_minutes = args.interval if args.interval is not None else settings.get('refresh_interval', 3)
+    poller = HeadlessPoller(settings, settings_path, password, dispatcher, max(interval_minutes, 0.1), serve, subscribe,
+                            profile_poller)
+    settings.on_change = poller.apply_settings_change
+
+    def _handle_signal(signum, frame):
+        log_event("signal", signal=signal.Signals(signum).name)
+        poller.stop()
+
+    signal.signal(signal.SIGINT, _handle_signal)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, _handle_signal)
+
+    try:
+        # Without getodi.com the loop keeps trying (the login circuit breaker paces it); a wrong password ends it
+        if not subscribe and not poller.login() and (args.once or poller.credentials_rejected):
+            return 1
+        if args.once:
+            poller.refresh()
+        else:
+            poller.run_forever()
+    finally:
+        poller.close()
+        settings.close()
+    return 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
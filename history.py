@@ -0,0 +1,298 @@
+"""
+Availability history in SQLite.
+
+Each scan's found meals for a city form a snapshot. Identical snapshots are stored once (keyed by a
+digest of their meals), and a scan that finds the same snapshot as the previous scan of that city
+only extends the previous observation's last_seen instead of adding a row. The database therefore
+grows with changes on the site, not with the number of polls. A scan that comes more than
+max_scan_gap_seconds after the previous one (the app was closed, or could not scan) starts a new
+observation even if it saw the same meals, so an observation never covers time nobody looked:
+
+    snapshots(id, digest, meal_count)                   one row per distinct set of meals
+    snapshot_meals(snapshot_id, restaurant_key, ...)    the meals of a snapshot
+    observations(id, city_id, snapshot_id, first_seen, last_seen, scans)
+                                                        consecutive scans of a city that saw one snapshot
+
+Restaurants are looked up by their fold_for_matching() key, so queries are case and Turkish-i insensitive.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from matcher import fold_for_matching
+from meal_record import MealBatch, MealRecord, MealRow
+
+logger = logging.getLogger(__name__)
+
+WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+HISTORY_RETENTION_DAYS = 365
+# A poller left running for weeks drops old observations this often (see HistoryStore.prune_if_due)
+PRUNE_INTERVAL_SECONDS = 24 * 3600
+# Observations are only extended across gaps up to this many times the longest poll interval
+# (the poll scheduler's ceiling; callers keep HistoryStore.max_scan_gap_seconds in step with it)
+MAX_SCAN_GAP_FACTOR = 2
+DEFAULT_MAX_SCAN_GAP_SECONDS = MAX_SCAN_GAP_FACTOR * 15 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    digest BLOB NOT NULL UNIQUE,
+    meal_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshot_meals (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id) ON DELETE CASCADE,
+    restaurant_key TEXT NOT NULL,
+    restaurant TEXT NOT NULL,
+    meal TEXT NOT NULL,
+    location TEXT NOT NULL,
+    available_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    city_id TEXT NOT NULL,
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    scans INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS snapshot_meals_by_restaurant ON snapshot_meals(restaurant_key, snapshot_id);
+CREATE INDEX IF NOT EXISTS snapshot_meals_by_snapshot ON snapshot_meals(snapshot_id);
+CREATE INDEX IF NOT EXISTS observations_by_snapshot ON observations(snapshot_id, first_seen);
+CREATE INDEX IF NOT EXISTS observations_by_city_time ON observations(city_id, first_seen);
+"""
+
+
+def get_history_path(settings_path: str) -> str:
+    """The history database lives next to the settings file: settings.json -> settings.history.sqlite3."""
+    return os.path.splitext(settings_path)[0] + ".history.sqlite3"
+
+
+def _meal_rows(batch: MealBatch) -> List[MealRow]:
+    return sorted(set(batch.rows()))
+
+
+def _snapshot_digest(rows: List[MealRow]) -> bytes:
+    hasher = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        hasher.update("\x1f".join(map(str, row)).encode('utf-8'))
+        hasher.update(b"\x1e")
+    return hasher.digest()
+
+
+def _slot_days(periods: Iterable[Tuple[float, float]]) -> Dict[Tuple[int, int], set]:
+    """The dates on which each local (weekday, hour) slot was covered by one of the (start, end) periods."""
+    seen_days: Dict[Tuple[int, int], set] = defaultdict(set)
+    for start, end in periods:
+        slot_start = datetime.fromtimestamp(start).replace(minute=0, second=0, microsecond=0)
+        last_seen = datetime.fromtimestamp(end)
+        while slot_start <= last_seen:
+            seen_days[(slot_start.weekday(), slot_start.hour)].add(slot_start.date())
+            slot_start += timedelta(hours=1)
+    return seen_days
+
+
+def _scanned_periods(observations: Iterable[Tuple[int, int, int]], max_scan_gap_seconds: float,
+                     since: float = 0) -> Iterable[Tuple[float, float]]:
+    """
+    The (start, end) periods that the (first_seen, last_seen, scans) observations actually scanned, from
+    since on. Observations recorded before they were split at gaps can span hours in which the app was
+    not running; when their scans are on average further apart than max_scan_gap_seconds, only their
+    first and last scan count.
+    """
+    for first_seen, last_seen, scans in observations:
+        if scans > 1 and (last_seen - first_seen) / (scans - 1) > max_scan_gap_seconds:
+            points = [(first_seen, first_seen), (last_seen, last_seen)]
+        else:
+            points = [(first_seen, last_seen)]
+        for start, end in points:
+            if end >= since:
+                yield max(start, since), end
+
+
+class HistoryStore:
+    """Thread-safe: scans are recorded from the refresh worker while the debug console may query."""
+
+    def __init__(self, path: str, max_scan_gap_seconds: float = DEFAULT_MAX_SCAN_GAP_SECONDS,
+                 retention_days: float = HISTORY_RETENTION_DAYS):
+        self.path = path
+        self.max_scan_gap_seconds = max_scan_gap_seconds
+        self.retention_days = retention_days
+        self._next_prune = 0.0  # time.monotonic() after which prune_if_due() prunes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        self._connection.executescript(SCHEMA)
+        # city_id -> (observation id, snapshot id, last_seen) of the latest observation, to extend it without a query
+        self._last_observation: Dict[str, Tuple[int, int, int]] = {}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def record_scan(self, city_id: str, meals: Union[MealBatch, Iterable[MealRecord]], scanned_at: Optional[float] = None) -> bool:
+        """
+        Records the meals one scan of a city found (an empty list is a valid snapshot; pass nothing
+        for failed scans), by default at the scan time of the records. The latest observation of the
+        city is extended if it saw the same meals and its last scan is at most max_scan_gap_seconds old.
+        Returns True if the scan started a new observation, False if it extended one.
+        """
+        batch = MealBatch.of(meals, None if scanned_at is None else int(scanned_at), city_id)
+        scanned_at = batch.scanned_at
+        rows = _meal_rows(batch)
+        digest = _snapshot_digest(rows)
+        with self._lock, self._connection:
+            snapshot_id = self._snapshot_id(digest, rows)
+            last = self._last_observation.get(city_id)
+            if last is None:
+                last = self._connection.execute(
+                    "SELECT id, snapshot_id, last_seen FROM observations WHERE city_id = ? ORDER BY first_seen DESC, id DESC LIMIT 1",
+                    (city_id,)).fetchone()
+            if last is not None and last[1] == snapshot_id and self._within_gap(last[2], scanned_at):
+                self._connection.execute("UPDATE observations SET last_seen = ?, scans = scans + 1 WHERE id = ?",
+                                         (scanned_at, last[0]))
+                self._last_observation[city_id] = (last[0], snapshot_id, scanned_at)
+                return False
+            cursor = self._connection.execute(
+                "INSERT INTO observations (city_id, snapshot_id, first_seen, last_seen) VALUES (?, ?, ?, ?)",
+                (city_id, snapshot_id, scanned_at, scanned_at))
+            self._last_observation[city_id] = (cursor.lastrowid, snapshot_id, scanned_at)
+            return True
+
+    def _within_gap(self, last_seen: int, scanned_at: int) -> bool:
+        return scanned_at - last_seen <= self.max_scan_gap_seconds
+
+    def extend_last_observation(self, city_id: str, scanned_at: Optional[float] = None) -> bool:
+        """
+        Records a scan that found exactly what the previous scan of the city (in this session) found,
+        without hashing the meals again. Returns False if there is no such observation, or its last scan
+        is more than max_scan_gap_seconds old; use record_scan() then.
+        """
+        scanned_at = int(scanned_at if scanned_at is not None else time.time())
+        with self._lock, self._connection:
+            last = self._last_observation.get(city_id)
+            if last is None or not self._within_gap(last[2], scanned_at):
+                return False
+            self._connection.execute("UPDATE observations SET last_seen = ?, scans = scans + 1 WHERE id = ?",
+                                     (scanned_at, last[0]))
+            self._last_observation[city_id] = (last[0], last[1], scanned_at)
+        return True
+
+    def _snapshot_id(self, digest: bytes, rows: List[MealRow]) -> int:
+        found = self._connection.execute("SELECT id FROM snapshots WHERE digest = ?", (digest,)).fetchone()
+        if found is not None:
+            return found[0]
+        snapshot_id = self._connection.execute("INSERT INTO snapshots (digest, meal_count) VALUES (?, ?)",
+                                               (digest, len(rows))).lastrowid
+        self._connection.executemany(
+            "INSERT INTO snapshot_meals (snapshot_id, restaurant_key, restaurant, meal, location, available_count) VALUES (?, ?, ?, ?, ?, ?)",
+            [(snapshot_id, fold_for_matching(restaurant), restaurant, meal, location, count) for restaurant, meal, location, count in rows])
+        return snapshot_id
+
+    def restaurant_timeline(self, restaurant: str, city_id: Optional[str] = None, since: Optional[float] = None,
+                            until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Every period in which the restaurant had meals, oldest first."""
+        query = ("SELECT o.city_id, o.first_seen, o.last_seen, o.scans, m.restaurant, m.meal, m.location, m.available_count"
+                 " FROM snapshot_meals m JOIN observations o ON o.snapshot_id = m.snapshot_id"
+                 " WHERE m.restaurant_key = ?")
+        parameters: List[Any] = [fold_for_matching(restaurant)]
+        if city_id is not None:
+            query += " AND o.city_id = ?"
+            parameters.append(city_id)
+        if since is not None:
+            query += " AND o.last_seen >= ?"
+            parameters.append(int(since))
+        if until is not None:
+            query += " AND o.first_seen <= ?"
+            parameters.append(int(until))
+        query += " ORDER BY o.first_seen"
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+        return [{'city_id': row[0], 'first_seen': row[1], 'last_seen': row[2], 'scans': row[3], 'restaurant_name': row[4],
+                 'meal_name': row[5], 'location': row[6], 'available_count': row[7]} for row in rows]
+
+    def usual_availability(self, restaurant: str, city_id: Optional[str] = None, days: int = 90,
+                           top: int = 10) -> List[Dict[str, Any]]:
+        """
+        Answers "when does this restaurant usually have meals": the local weekday/hour slots in which
+        it was seen with meals on the most distinct days over the last `days` days.
+        """
+        since = time.time() - days * 86400
+        periods = self.restaurant_timeline(restaurant, city_id, since=since)
+        seen_days = _slot_days(_scanned_periods(((period['first_seen'], period['last_seen'], period['scans']) for period in periods),
+                                                self.max_scan_gap_seconds, since))
+        slots = sorted(seen_days.items(), key=lambda item: (-len(item[1]), item[0]))[:top]
+        return [{'weekday': WEEKDAY_NAMES[weekday], 'hour': hour, 'days_seen': len(dates)} for (weekday, hour), dates in slots]
+
+    def slot_activity(self, city_ids: Optional[Iterable[str]] = None, days: int = 28) -> Dict[Tuple[int, int], Tuple[int, int]]:
+        """
+        For each local (weekday, hour) slot of the last `days` days: on how many days any watched meal
+        was seen in it, and on how many days it was scanned at all. Used to poll faster when meals
+        usually appear and slower when they never do. Hours in which the app was not running count
+        as neither.
+        """
+        since = int(time.time() - days * 86400)
+        query = ("SELECT o.first_seen, o.last_seen, o.scans, s.meal_count > 0 FROM observations o JOIN snapshots s ON s.id = o.snapshot_id"
+                 " WHERE o.last_seen >= ?")
+        parameters: List[Any] = [since]
+        city_ids = list(city_ids or [])
+        if city_ids:
+            query += f" AND o.city_id IN ({', '.join('?' * len(city_ids))})"
+            parameters.extend(city_ids)
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+        scanned = _slot_days(_scanned_periods((row[:3] for row in rows), self.max_scan_gap_seconds, since))
+        with_meals = _slot_days(_scanned_periods((row[:3] for row in rows if row[3]), self.max_scan_gap_seconds, since))
+        return {slot: (len(with_meals.get(slot, ())), len(dates)) for slot, dates in scanned.items()}
+
+    def prune(self, older_than_days: float = HISTORY_RETENTION_DAYS) -> int:
+        """Deletes observations that ended before the cutoff and the snapshots no longer used. Returns the number deleted."""
+        cutoff = int(time.time() - older_than_days * 86400)
+        with self._lock, self._connection:
+            self._next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+            deleted = self._connection.execute("DELETE FROM observations WHERE last_seen < ?", (cutoff,)).rowcount
+            if deleted:
+                self._connection.execute("DELETE FROM snapshots WHERE id NOT IN (SELECT snapshot_id FROM observations)")
+                self._last_observation.clear()
+        return deleted
+
+    def prune_if_due(self) -> int:
+        """prune() with retention_days if the last prune was PRUNE_INTERVAL_SECONDS ago or more; called after every refresh."""
+        with self._lock:
+            if time.monotonic() < self._next_prune:
+                return 0
+        deleted = self.prune(self.retention_days)
+        if deleted:
+            logger.info(f"Dropped {deleted} history observations older than {self.retention_days:g} days.")
+        return deleted
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshots, observations, scans = self._connection.execute(
+                "SELECT (SELECT COUNT(*) FROM snapshots), COUNT(*), COALESCE(SUM(scans), 0) FROM observations").fetchone()
+        return {'path': self.path, 'snapshots': snapshots, 'observations': observations, 'scans': scans}
+
+
+def open_history_store(settings: Dict[str, Any], settings_path: str) -> Optional[HistoryStore]:
+    """
+    Opens the history database unless "history_enabled" is false, and drops observations older than
+    "history_retention_days" right away and then once a day (prune_if_due). Returns None if history is disabled or the database cannot be opened.
+    """
+    if not settings.get('history_enabled', True):
+        return None
+    try:
+        store = HistoryStore(settings.get('history_path') or get_history_path(settings_path),
+                             retention_days=settings.get('history_retention_days', HISTORY_RETENTION_DAYS))
+        store.prune(store.retention_days)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not open the history database, history is disabled: {e}")
+        return None
+    return store
@@ -0,0 +1,116 @@
+"""
+Compiled matcher for the restaurant watch list.
+
+The watch list is folded with Turkish casing rules (I -> ı, İ -> i) and compiled once into an
+Aho-Corasick automaton, so every menu box is scanned a single time no matter how many
+restaurants are watched. For matching, dotted and dotless i are then treated as the same
+letter, so "KIRAATHANE", "Kıraathane", "BURGER KING" and "Burger King" all match as typed.
+"""
+
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple, Union
+
+# "Bu menüyü askıdan al <N>": N > 0 suspended meals are available
+AVAILABLE_COUNT_PATTERN = re.compile(r"bu menüyü askıdan al\s*(\d+)", re.IGNORECASE)
+
+
+def _nfc(text: str) -> str:
+    return text if unicodedata.is_normalized('NFC', text) else unicodedata.normalize('NFC', text)
+
+
+def fold_for_matching(text: str) -> str:
+    """
+    Lowercases text the Turkish way (I -> ı, İ -> i) and then merges ı and i, the form TargetMatcher
+    compares: "KIRAATHANE", "Kıraathane" and "kiraathane" all fold to "kiraathane".
+    """
+    # str.replace chains are several times faster than str.translate here, and this runs once per menu box
+    return _nfc(text).replace('İ', 'i').replace('I', 'i').lower().replace('ı', 'i')
+
+
+class TargetMatcher:
+    """
+    Aho-Corasick automaton over the folded target texts.
+    find() returns the indices of every target contained in a text, including overlapping ones
+    ("burger" and "burger king"), in one pass over the text.
+    """
+
+    def __init__(self, target_texts: Iterable[str]):
+        self.target_texts: Tuple[str, ...] = tuple(target_texts)
+        self.unique_target_count = len(set(self.target_texts))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[FrozenSet[int]] = [frozenset()]
+        # An empty target is contained in every text, as with the plain `in` check
+        self._always: FrozenSet[int] = frozenset(index for index, target in enumerate(self.target_texts) if not target)
+        patterns = {}
+        for index, target in enumerate(self.target_texts):
+            if target:
+                patterns.setdefault(fold_for_matching(target), []).append(index)
+        self._build(patterns)
+        # A combined regex rejects boxes that contain no target at C speed before the automaton runs
+        self._prefilter = re.compile("|".join(re.escape(pattern) for pattern in sorted(patterns, key=len, reverse=True))) if patterns else None
+
+    def _build(self, patterns: Dict[str, List[int]]):
+        outputs: List[set] = [set()]
+        for pattern, indices in patterns.items():
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append(set())
+                state = next_state
+            outputs[state].update(indices)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                outputs[next_state] |= outputs[self._fail[next_state]]
+        self._output = [frozenset(output) for output in outputs]
+
+    def find(self, folded_text: str) -> FrozenSet[int]:
+        """Returns the indices of the targets found in a text already passed through fold_for_matching()."""
+        if self._prefilter is None or self._prefilter.search(folded_text) is None:
+            return self._always
+        found = set(self._always)
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in folded_text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return frozenset(found)
+
+    def first_unresolved(self, found_indices: FrozenSet[int], resolved: set) -> Optional[str]:
+        """Returns the first target (in watch list order) among found_indices that is not resolved yet."""
+        for index in sorted(found_indices):
+            target = self.target_texts[index]
+            if target not in resolved:
+                return target
+        return None
+
+
+@lru_cache(maxsize=8)
+def _cached_matcher(target_texts: Tuple[str, ...]) -> TargetMatcher:
+    return TargetMatcher(target_texts)
+
+
+def as_matcher(targets: Union[TargetMatcher, Sequence[str]]) -> TargetMatcher:
+    """Accepts a prebuilt TargetMatcher or a plain list of target texts (compiled once and cached)."""
+    if isinstance(targets, TargetMatcher):
+        return targets
+    return _cached_matcher(tuple(targets))
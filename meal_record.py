@@ -0,0 +1,104 @@
+"""
+Typed meal records.
+
+check_meals() returns MealRecord tuples instead of dicts: no per-record dict, the restaurant, meal
+and location strings are interned so the names that come back on every poll are stored once, and
+the scan time is one epoch integer shared by every record of a scan instead of a formatted string
+per record. to_dict() gives the old dict form for JSON output (headless events, notification sinks).
+
+MealBatch holds the meals of one scan column by column, for consumers that handle them in bulk
+(the history database).
+"""
+
+import sys
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def scan_timestamp() -> int:
+    """The epoch second a scan starts at; every record of the scan shares it."""
+    return int(time.time())
+
+
+class MealRecord(NamedTuple):
+    restaurant_name: str
+    meal_name: str
+    location: str
+    available_count: int
+    scanned_at: int  # epoch seconds of the scan that found the meal
+    city_id: str = ''  # set by the snapshot differ
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.scanned_at).strftime(TIMESTAMP_FORMAT)
+
+    def to_dict(self, city_names: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """The dict check_meals() used to return, plus city_id (and the city's name, if known) when set."""
+        record: Dict[str, Any] = {
+            'restaurant_name': self.restaurant_name,
+            'meal_name': self.meal_name,
+            'location': self.location,
+            'available_count': self.available_count,
+            'available': True,
+            'timestamp': self.timestamp
+        }
+        if self.city_id:
+            record['city_id'] = self.city_id
+            if city_names is not None:
+                record['city'] = city_names.get(self.city_id, self.city_id)
+        return record
+
+
+def make_meal_record(restaurant_name: str, meal_name: str, location: str, available_count: int, scanned_at: int,
+                     city_id: str = '') -> MealRecord:
+    return MealRecord(sys.intern(restaurant_name), sys.intern(meal_name), sys.intern(location), available_count,
+                      scanned_at, sys.intern(city_id))
+
+
+MealRow = Tuple[str, str, str, int]
+
+
+class MealBatch:
+    """The meals one scan of a city found, stored as one list (or array) per field."""
+    __slots__ = ('scanned_at', 'city_id', 'restaurant_names', 'meal_names', 'locations', 'available_counts')
+
+    def __init__(self, scanned_at: int, city_id: str = ''):
+        self.scanned_at = scanned_at
+        self.city_id = city_id
+        self.restaurant_names: List[str] = []
+        self.meal_names: List[str] = []
+        self.locations: List[str] = []
+        self.available_counts = array('l')
+
+    @classmethod
+    def of(cls, meals: Union["MealBatch", Iterable[MealRecord]], scanned_at: Optional[int] = None, city_id: str = '') -> "MealBatch":
+        """Returns meals as a batch; records take the scan time of the first one unless scanned_at is given."""
+        if isinstance(meals, MealBatch):
+            return meals
+        batch = None
+        for meal in meals:
+            if batch is None:
+                batch = cls(scanned_at if scanned_at is not None else meal.scanned_at, city_id or meal.city_id)
+            batch.append(meal)
+        return batch if batch is not None else cls(scanned_at if scanned_at is not None else scan_timestamp(), city_id)
+
+    def append(self, meal: MealRecord):
+        self.restaurant_names.append(meal.restaurant_name)
+        self.meal_names.append(meal.meal_name)
+        self.locations.append(meal.location)
+        self.available_counts.append(meal.available_count)
+
+    def __len__(self) -> int:
+        return len(self.available_counts)
+
+    def __iter__(self) -> Iterator[MealRecord]:
+        for row in self.rows():
+            yield MealRecord(*row, self.scanned_at, self.city_id)
+
+    def rows(self) -> Iterator[MealRow]:
+        """(restaurant, meal, location, available count) per meal, e.g. for executemany()."""
+        return zip(self.restaurant_names, self.meal_names, self.locations, self.available_counts)
@@ -0,0 +1,227 @@
+"""
+Timing spans for meal refreshes.
+
+Every stage of a refresh (login, fetch, parse, match, diff, ui_render, notify) adds its duration to
+the refresh that is in progress, together with values such as bytes_received. When a refresh
+completes, its totals go into a rolling window of the last METRICS_WINDOW refreshes, from which
+summary() reports percentiles, and are optionally exported:
+
+- as a Prometheus textfile (for node_exporter's textfile collector), rewritten after every refresh
+- as one JSON line per refresh appended to a log file
+
+Spans recorded while no refresh is in progress (e.g. the first login) count as a sample of their own.
+Stages that run concurrently (several cities) are summed, so a stage can add up to more than the
+refresh's wall-clock time.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+METRICS_WINDOW = 200
+PERCENTILES = (50, 90, 99)
+REFRESH_STAGE = 'refresh'
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class RefreshTimings:
+    """The stage durations (seconds) and values of one refresh."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.values: Dict[str, float] = {}
+        self._open_holds = 1
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    def count(self, name: str, value: float):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + value
+
+    @contextlib.contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def keep_open(self):
+        """Makes the refresh wait for one more end_refresh() call, e.g. from a UI update posted to another thread."""
+        with self._lock:
+            self._open_holds += 1
+
+    def _release(self) -> bool:
+        with self._lock:
+            self._open_holds -= 1
+            if self._open_holds:
+                return False
+            self.durations[REFRESH_STAGE] = time.perf_counter() - self._started
+            return True
+
+
+class MetricsRecorder:
+    def __init__(self, window: int = METRICS_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._current: Optional[RefreshTimings] = None
+        self._durations: Dict[str, Deque[float]] = {}
+        self._values: Dict[str, Deque[float]] = {}
+        self._totals: Dict[str, List[float]] = {}  # stage -> [count, sum of seconds] since start
+        self._value_totals: Dict[str, float] = {}
+        self._completed_refreshes = 0
+        self._last_refresh_at: Optional[float] = None
+        self.prometheus_textfile: Optional[str] = None
+        self.jsonl_path: Optional[str] = None
+
+    def configure(self, prometheus_textfile: Optional[str] = None, jsonl_path: Optional[str] = None):
+        self.prometheus_textfile = prometheus_textfile or None
+        self.jsonl_path = jsonl_path or None
+
+    def begin_refresh(self) -> RefreshTimings:
+        timings = RefreshTimings()
+        with self._lock:
+            self._current = timings
+        return timings
+
+    def end_refresh(self, timings: RefreshTimings):
+        """Completes the refresh once every holder (see RefreshTimings.keep_open) has called this."""
+        with self._lock:
+            if self._current is timings:
+                self._current = None
+        if not timings._release():
+            return
+        with self._lock:
+            for stage, seconds in timings.durations.items():
+                self._record_duration(stage, seconds)
+            for name, value in timings.values.items():
+                self._values.setdefault(name, deque(maxlen=self._window)).append(value)
+                self._value_totals[name] = self._value_totals.get(name, 0) + value
+            self._completed_refreshes += 1
+            self._last_refresh_at = timings.started_at
+        self._export(timings)
+
+    def _record_duration(self, stage: str, seconds: float):
+        self._durations.setdefault(stage, deque(maxlen=self._window)).append(seconds)
+        total = self._totals.setdefault(stage, [0, 0.0])
+        total[0] += 1
+        total[1] += seconds
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            current = self._current
+            if current is None:
+                self._record_duration(stage, seconds)
+                return
+        current.add(stage, seconds)
+
+    def count(self, name: str, value: float):
+        with self._lock:
+            current = self._current
+        if current is not None:
+            current.count(name, value)
+
+    @contextlib.contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, Any]:
+        """Rolling percentiles per stage in milliseconds, and of the counted values, over the last refreshes."""
+        with self._lock:
+            durations = {stage: sorted(samples) for stage, samples in self._durations.items() if samples}
+            values = {name: sorted(samples) for name, samples in self._values.items() if samples}
+            completed = self._completed_refreshes
+        summary: Dict[str, Any] = {'refreshes': completed, 'stages_ms': {}, 'values': {}}
+        for stage, samples in sorted(durations.items()):
+            stats = {f'p{percent}': round(percentile(samples, percent) * 1000, 2) for percent in PERCENTILES}
+            stats['max'] = round(samples[-1] * 1000, 2)
+            stats['count'] = len(samples)
+            summary['stages_ms'][stage] = stats
+        for name, samples in sorted(values.items()):
+            stats = {f'p{percent}': percentile(samples, percent) for percent in PERCENTILES}
+            stats['max'] = samples[-1]
+            summary['values'][name] = stats
+        return summary
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            durations = {stage: sorted(samples) for stage, samples in self._durations.items() if samples}
+            totals = {stage: tuple(total) for stage, total in self._totals.items()}
+            value_totals = dict(self._value_totals)
+            completed, last_refresh_at = self._completed_refreshes, self._last_refresh_at
+        lines = [
+            "# HELP odifinder_refresh_stage_seconds Duration of meal refresh stages (quantiles over the last refreshes).",
+            "# TYPE odifinder_refresh_stage_seconds summary",
+        ]
+        for stage, samples in sorted(durations.items()):
+            for percent in PERCENTILES:
+                lines.append(f'odifinder_refresh_stage_seconds{{stage="{stage}",quantile="{percent / 100}"}} {percentile(samples, percent):.6f}')
+            count, seconds_sum = totals[stage]
+            lines.append(f'odifinder_refresh_stage_seconds_sum{{stage="{stage}"}} {seconds_sum:.6f}')
+            lines.append(f'odifinder_refresh_stage_seconds_count{{stage="{stage}"}} {count}')
+        for name, total in sorted(value_totals.items()):
+            lines.append(f"# TYPE odifinder_{name}_total counter")
+            lines.append(f"odifinder_{name}_total {total:g}")
+        lines.append("# TYPE odifinder_refreshes_total counter")
+        lines.append(f"odifinder_refreshes_total {completed}")
+        if last_refresh_at is not None:
+            lines.append("# TYPE odifinder_last_refresh_timestamp_seconds gauge")
+            lines.append(f"odifinder_last_refresh_timestamp_seconds {last_refresh_at:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def _export(self, timings: RefreshTimings):
+        if self.jsonl_path:
+            record = {'ts': round(timings.started_at, 3),
+                      'stages_ms': {stage: round(seconds * 1000, 2) for stage, seconds in sorted(timings.durations.items())},
+                      **timings.values}
+            try:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not append refresh metrics: {e}")
+        if self.prometheus_textfile:
+            # The collector may read at any moment, so the file is replaced, never rewritten in place
+            temp_path = self.prometheus_textfile + ".tmp"
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(self.prometheus_text())
+                os.replace(temp_path, self.prometheus_textfile)
+            except OSError as e:
+                logger.warning(f"Could not write Prometheus metrics file: {e}")
+
+
+recorder = MetricsRecorder()
+
+
+def span(stage: str):
+    """Times a block as `stage` of the refresh in progress: `with metrics.span('parse'): ...`."""
+    return recorder.span(stage)
+
+
+def add(stage: str, seconds: float):
+    recorder.add(stage, seconds)
+
+
+def count(name: str, value: float):
+    recorder.count(name, value)
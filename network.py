@@ -6,102 +6,670 @@ Changelog:
 """
 
 import requests
-from bs4 import BeautifulSoup, Tag
-import re
-from datetime import datetime
-from typing import Optional, List, Dict, Any, Set
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import codecs
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, List, Dict, Any, NamedTuple, Set, Tuple, Union
+from urllib.parse import urlsplit
+import metrics
+from matcher import AVAILABLE_COUNT_PATTERN, TargetMatcher, as_matcher, fold_for_matching
+from meal_record import MealRecord, make_meal_record, scan_timestamp
+from page_cache import PageCache, body_digest
+from parsing import MenuBox, MenuBoxStream, parse_menu_boxes
 
-def login_to_odi(username, password) -> Optional[requests.Session]:
+logger = logging.getLogger(__name__)
+
+LOGIN_URL = "https://getodi.com/sign-in/"
+STUDENT_URL = "https://getodi.com/student/"
+# (connect, read) timeouts in seconds, applied to every request
+REQUEST_TIMEOUT = (5, 20)
+MAX_CONNECTIONS_PER_HOST = 16
+
+def create_session() -> requests.Session:
     """
-    Attempts to log in to getodi.com with the given username and password.
-    Returns a requests.Session object if successful, otherwise None.
+    Creates a keep-alive session whose connection pool is large enough for concurrent city fetches.
+    Idempotent requests are retried twice on connection errors.
     """
-    login_url = "https://getodi.com/sign-in/"
     session = requests.Session()
+    retries = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3, allowed_methods=frozenset({'GET', 'HEAD'}))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONNECTIONS_PER_HOST, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+# Defaults of the request limits; see configure_request_limits(). The burst covers a sweep of all
+# 81 cities plus a login and a few 304 retries, so a full sweep is never held back by the bucket
+MAX_REQUESTS_PER_SECOND = 2.0
+REQUEST_BURST = 100
+REQUEST_MAX_WAIT_SECONDS = 30.0
+LOGIN_FAILURE_THRESHOLD = 3
+LOGIN_RETRY_SECONDS = 60.0
+LOGIN_MAX_RETRY_SECONDS = 30 * 60.0
+
+class OdiError(Exception):
+    """A classified getodi.com failure; callers handle each subclass differently."""
+
+class AuthenticationError(OdiError):
+    """getodi.com rejected the username or password. Trying again with the same ones cannot help."""
+
+class SessionExpiredError(OdiError):
+    """A page answered with the sign-in form: the session was logged out and a new login may help."""
+
+class ServiceUnavailableError(OdiError):
+    """getodi.com could not be reached or answered with an error. Worth trying again later."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitOpenError(ServiceUnavailableError):
+    """The login circuit breaker is open, so no login request was sent."""
+
+class RequestThrottledError(requests.exceptions.RequestException):
+    """The request governor had no token for this request within its maximum wait; nothing was sent."""
+
+class RequestGovernor:
+    """
+    Token bucket shared by every outbound request to getodi.com: up to `burst` requests go out at
+    once, then `rate` per second. A request that finds the bucket empty reserves the next token
+    and sleeps until it is due, so waiting requests go out in order; if that would take longer
+    than max_wait seconds, it is refused with RequestThrottledError instead.
+    """
+
+    def __init__(self, rate: float = MAX_REQUESTS_PER_SECOND, burst: int = REQUEST_BURST,
+                 max_wait: float = REQUEST_MAX_WAIT_SECONDS):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._requests = self._delayed = self._refused = 0
+        self._wait_seconds = 0.0
+
+    def configure(self, rate: float, burst: int, max_wait: float = REQUEST_MAX_WAIT_SECONDS):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate, self.burst, self.max_wait = max(rate, 0.01), max(int(burst), 1), max_wait
+            self._tokens = min(self._tokens, float(self.burst))
+
+    def _refill(self, now: float):
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Blocks until the next request may go out; returns the seconds spent waiting."""
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            if wait > self.max_wait:
+                self._refused += 1
+                raise RequestThrottledError(f"Request limit of {self.rate:g}/s reached; request not sent.")
+            self._tokens -= 1
+            self._requests += 1
+            if wait:
+                self._delayed += 1
+                self._wait_seconds += wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {'rate': self.rate, 'burst': self.burst, 'tokens': round(self._tokens, 2), 'requests': self._requests,
+                    'delayed': self._delayed, 'refused': self._refused, 'wait_seconds': round(self._wait_seconds, 2)}
+
+class CircuitBreaker:
+    """
+    Stops login attempts while getodi.com is failing:
+
+    - closed: attempts go through; failure_threshold failures in a row open the breaker
+    - open: attempts are refused with CircuitOpenError until the retry delay has passed
+    - half-open: a single probe attempt goes through; if it succeeds the breaker closes,
+      if it fails the breaker opens again with the retry delay doubled (up to max_retry_seconds)
+
+    Only network and server failures count; rejected credentials mean the server is up.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold: int = LOGIN_FAILURE_THRESHOLD, retry_seconds: float = LOGIN_RETRY_SECONDS,
+                 max_retry_seconds: float = LOGIN_MAX_RETRY_SECONDS):
+        self._lock = threading.Lock()
+        self.failure_threshold = failure_threshold
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max(max_retry_seconds, retry_seconds)
+        self.state = self.CLOSED
+        self._failures = 0
+        self._current_retry_seconds = retry_seconds
+        self._opened_at = 0.0
+        self._trips = 0
+
+    def configure(self, failure_threshold: int, retry_seconds: float, max_retry_seconds: float):
+        with self._lock:
+            self.failure_threshold = max(int(failure_threshold), 1)
+            self.retry_seconds = retry_seconds
+            self.max_retry_seconds = max(max_retry_seconds, retry_seconds)
+            if self.state == self.CLOSED:
+                self._current_retry_seconds = retry_seconds
+
+    def before_call(self):
+        """Raises CircuitOpenError unless an attempt may be made now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            retry_after = self._opened_at + self._current_retry_seconds - time.monotonic()
+            if self.state == self.OPEN and retry_after <= 0:
+                self.state = self.HALF_OPEN
+                logger.info("Login circuit half-open: trying one login.")
+                return
+            # Open, or half-open with the probe still running
+            raise CircuitOpenError(f"getodi.com failed {self._failures} times in a row; not trying to log in "
+                                   f"for another {max(retry_after, 0):.0f} seconds.", max(retry_after, 0.0))
+
+    def cancel_call(self):
+        """The attempt before_call() allowed was not made (e.g. throttled); a half-open breaker lets the next one probe."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Login circuit closed again.")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._current_retry_seconds = self.retry_seconds
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN:
+                self._current_retry_seconds = min(self._current_retry_seconds * 2, self.max_retry_seconds)
+            elif self.state == self.CLOSED and self._failures < self.failure_threshold:
+                return
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._trips += 1
+            logger.warning(f"Login circuit open after {self._failures} failures; next attempt in {self._current_retry_seconds:.0f} seconds.")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self._failures, 'trips': self._trips,
+                    'retry_seconds': self._current_retry_seconds}
+
+request_governor = RequestGovernor()
+login_breaker = CircuitBreaker()
+
+def configure_request_limits(settings: Dict[str, Any]):
+    """
+    Applies the request limits from settings: "max_requests_per_second" and "request_burst" for all
+    requests, "login_failure_threshold", "login_retry_seconds" and "login_max_retry_seconds" for logins.
+    """
+    request_governor.configure(float(settings.get('max_requests_per_second', MAX_REQUESTS_PER_SECOND)),
+                               int(settings.get('request_burst', REQUEST_BURST)))
+    login_breaker.configure(int(settings.get('login_failure_threshold', LOGIN_FAILURE_THRESHOLD)),
+                            float(settings.get('login_retry_seconds', LOGIN_RETRY_SECONDS)),
+                            float(settings.get('login_max_retry_seconds', LOGIN_MAX_RETRY_SECONDS)))
+
+def get_request_stats() -> Dict[str, Any]:
+    """Request governor and login circuit state, shown in the debug console."""
+    return {'governor': request_governor.get_stats(), 'login_circuit': login_breaker.get_stats()}
+
+def _is_sign_in_page(response: requests.Response) -> bool:
+    return urlsplit(response.url).path.rstrip('/').endswith('sign-in')
+
+def authenticate(username, password, session: Optional[requests.Session] = None) -> requests.Session:
+    """
+    Logs in to getodi.com with the given username and password, on the given session (keeping its
+    pooled connections) or on a new one, and returns that session.
+    Raises AuthenticationError for rejected credentials, ServiceUnavailableError when getodi.com
+    cannot be reached or fails, and CircuitOpenError while the login circuit breaker is open.
+    """
+    session = session or create_session()
+    login_breaker.before_call()
     login_data = {
         "username": username,
         "password": password
     }
     try:
-        response = session.post(login_url, data=login_data)
-        if response.status_code == 200:
-            # Check if login was actually successful (e.g., not on login page anymore)
-            if 'wrong_credentials' in response.url or "sign-in" in response.url:
-                print("Login failed in network.py. Incorrect credentials or still on login page.")
-                return None
-            print("Login successful in network.py.")
-            return session
-        else:
-            print(f"Login failed in network.py. Status code: {response.status_code}")
-            return None
+        request_governor.acquire()
+    except RequestThrottledError as e:
+        # Nothing was sent, so this says nothing about getodi.com
+        login_breaker.cancel_call()
+        raise ServiceUnavailableError(str(e)) from e
+    try:
+        with metrics.span('login'):
+            response = session.post(LOGIN_URL, data=login_data, timeout=REQUEST_TIMEOUT)
     except requests.exceptions.RequestException as e:
-        print(f"An error occurred during login in network.py: {e}")
+        login_breaker.record_failure()
+        raise ServiceUnavailableError(f"Could not reach getodi.com: {e}") from e
+    if response.status_code != 200:
+        login_breaker.record_failure()
+        raise ServiceUnavailableError(f"getodi.com answered the login with status code {response.status_code}.")
+    # The server answered, so it is up, whatever it thought of the credentials
+    login_breaker.record_success()
+    # Check if login was actually successful (e.g., not on login page anymore)
+    if 'wrong_credentials' in response.url or "sign-in" in response.url:
+        raise AuthenticationError("Incorrect username or password.")
+    return session
+
+def login_to_odi(username, password, session: Optional[requests.Session] = None) -> Optional[requests.Session]:
+    """
+    Attempts to log in to getodi.com with the given username and password.
+    Logs in on the given session (keeping its pooled connections) or on a new one.
+    Returns a requests.Session object if successful, otherwise None; see authenticate() for the reason.
+    """
+    try:
+        session = authenticate(username, password, session)
+    except OdiError as e:
+        logger.warning(f"Login failed in network.py: {e}")
         return None
+    logger.info("Login successful in network.py.")
+    return session
 
-def check_meals(session: requests.Session, target_texts: List[str], city_id: str = "35") -> Optional[List[Dict[str, Any]]]:
+def is_session_valid(session: requests.Session) -> bool:
     """
-    Uses the session to check the meals page and search for target texts.
-    New logic: A restaurant is considered available if the text matches
-    "Bu menüyü askıdan al <N>" and N is greater than 0. If N is 0, it's not available.
-    Returns a list of found meals or None if there is an error.
+    Cheaply checks whether the session's cookies are still logged in: asks for the student page
+    without following redirects and without downloading its body.
     """
-    meals_url = f"https://getodi.com/student/?city={city_id}"
     try:
-        response = session.get(meals_url)
-        if response.ok:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            meals_data: List[Dict[str, Any]] = []
-            found_meals: Set[str] = set()
-
-            menu_boxes = soup.select('div.menu-box')
-            for menu_box in menu_boxes:
-                if not isinstance(menu_box, Tag):
-                    continue
+        request_governor.acquire()
+        response = session.get(STUDENT_URL, allow_redirects=False, stream=True, timeout=REQUEST_TIMEOUT)
+        response.close()
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Could not validate session in network.py: {e}")
+        return False
+    return response.status_code == 200
 
-                restaurant_name_tag = menu_box.select_one('div.menu-restaurant')
-                menu_title_tag = menu_box.select_one('div.menu-title')
-                menu_details_tag = menu_box.select_one('div.menu-details')
-
-                restaurant_name_text = restaurant_name_tag.get_text(strip=True) if restaurant_name_tag else ""
-                menu_title_text = menu_title_tag.get_text(strip=True) if menu_title_tag else ""
-                menu_details_text = menu_details_tag.get_text(strip=True) if menu_details_tag else ""
-
-                searchable_text_content = f"{restaurant_name_text} {menu_title_text} {menu_details_text}".lower()
-
-                for target_text in target_texts:
-                    if target_text.lower() in searchable_text_content and target_text not in found_meals:
-                        # Extract text from this menu box and search for pattern: "Bu menüyü askıdan al <N>"
-                        all_text_in_menu_box_original = menu_box.get_text(" ", strip=True)
-                        match = re.search(r"bu menüyü askıdan al\s*(\d+)", all_text_in_menu_box_original, flags=re.IGNORECASE)
-                        if not match:
-                            # If pattern not found, skip this menu box
-                            continue
-                        try:
-                            suspended_count = int(match.group(1))
-                        except ValueError:
-                            suspended_count = 0
-
-                        if suspended_count > 0:
-                            actual_restaurant_name_display = menu_title_text or restaurant_name_text or target_text
-                            actual_meal_name = restaurant_name_text or "No meal name available."
-                            actual_location = menu_details_text or "No location available."
-
-                            meal_info = {
-                                'restaurant_name': actual_restaurant_name_display,
-                                'meal_name': actual_meal_name,
-                                'location': actual_location,
-                                'available_count': suspended_count,
-                                'available': True,
-                                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            }
-                            meals_data.append(meal_info)
-                            found_meals.add(target_text)
-                            break
-            
-            return meals_data
+def prewarm_connection(session: requests.Session) -> bool:
+    """
+    Opens a keep-alive connection to getodi.com ahead of the login, so DNS and the TLS handshake
+    are already done when the user submits the login form. A HEAD response has no body, so the
+    connection goes straight back to the session's pool.
+    """
+    try:
+        request_governor.acquire()
+        session.head(LOGIN_URL, allow_redirects=False, timeout=REQUEST_TIMEOUT).close()
+    except requests.exceptions.RequestException as e:
+        logger.info(f"Could not pre-open connection in network.py: {e}")
+        return False
+    return True
+
+MEALS_URL_TEMPLATE = "https://getodi.com/student/?city={city_id}"
+MAX_FETCH_WORKERS = 32
+STREAM_CHUNK_SIZE = 16 * 1024
+# Includes br (and zstd) when urllib3 can decode them, i.e. when brotli/zstandard are installed
+STREAM_ACCEPT_ENCODING = requests.utils.DEFAULT_ACCEPT_ENCODING
+
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_host_semaphores_lock = threading.Lock()
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+_default_page_cache = PageCache()
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    """Returns the semaphore that limits concurrent connections to the host of url."""
+    host = urlsplit(url).netloc
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST)
+            _host_semaphores[host] = semaphore
+        return semaphore
+
+def _get_parse_pool(max_workers: Optional[int] = None) -> Optional[ProcessPoolExecutor]:
+    """Lazily creates the shared process pool used to parse meal pages."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            try:
+                _parse_pool = ProcessPoolExecutor(max_workers=max_workers)
+            except (OSError, NotImplementedError, ValueError) as e:
+                logger.warning(f"Could not start parse worker pool in network.py, parsing inline: {e}")
+                return None
+        return _parse_pool
+
+def shutdown_parse_pool():
+    """Stops the shared parse pool. Safe to call if it was never started."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
+
+class FetchedPage(NamedTuple):
+    """A downloaded student page. menu_boxes is set when the page cache already had them."""
+    url: str
+    html: Optional[str]
+    menu_boxes: Optional[List[MenuBox]]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    digest: Optional[bytes]
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit counters of the default page cache, shown in the debug console."""
+    return _default_page_cache.get_stats()
+
+def get_cached_menu_boxes(city_id: str, page_cache: Optional[PageCache] = None) -> Optional[List[MenuBox]]:
+    """
+    The menu boxes of the last fully read page of a city (e.g. for fanout.FanoutServer), or None.
+    Streaming fetches that stopped early leave nothing here.
+    """
+    return (page_cache or _default_page_cache).menu_boxes(MEALS_URL_TEMPLATE.format(city_id=city_id))
+
+def _fetch_meals_page(session: requests.Session, city_id: str, page_cache: PageCache) -> Optional[FetchedPage]:
+    """
+    Downloads the student page of a city while holding a per-host connection slot.
+    Sends conditional request headers when the server gave validators before, and reuses the cached
+    menu boxes when it answers 304 or returns a body identical to the last one.
+    Returns None if the server did not answer with a success status, and raises SessionExpiredError
+    if it redirected to the sign-in page.
+    """
+    meals_url = MEALS_URL_TEMPLATE.format(city_id=city_id)
+    # Waiting for the request governor is not part of the fetch time
+    request_governor.acquire()
+    with metrics.span('fetch'), _host_semaphore(meals_url):
+        response = session.get(meals_url, headers=page_cache.conditional_headers(meals_url), timeout=REQUEST_TIMEOUT)
+    if response.status_code == 304:
+        cached_menu_boxes = page_cache.lookup(meals_url, True, None)
+        if cached_menu_boxes is not None:
+            return FetchedPage(meals_url, None, cached_menu_boxes, None, None, None)
+        # Nothing cached to fall back on; ask again without validators
+        request_governor.acquire()
+        with metrics.span('fetch'), _host_semaphore(meals_url):
+            response = session.get(meals_url, timeout=REQUEST_TIMEOUT)
+    metrics.count('bytes_received', len(response.content))
+    if _is_sign_in_page(response):
+        raise SessionExpiredError(f"The meals page of city {city_id} redirected to the sign-in page.")
+    if not response.ok:
+        logger.warning(f"Failed to access the meals page in network.py. Status code: {response.status_code}")
+        return None
+    digest = body_digest(response.content)
+    cached_menu_boxes = page_cache.lookup(meals_url, False, digest)
+    html = None if cached_menu_boxes is not None else response.text
+    return FetchedPage(meals_url, html, cached_menu_boxes, response.headers.get('ETag'), response.headers.get('Last-Modified'), digest)
+
+def _store_parsed_page(page_cache: PageCache, page: FetchedPage, menu_boxes: List[MenuBox]):
+    if page.digest is not None:
+        page_cache.store(page.url, page.etag, page.last_modified, page.digest, menu_boxes)
+
+class MealCollector:
+    """
+    Matches menu boxes against the target texts one box at a time.
+    A restaurant is considered available if the text matches
+    "Bu menüyü askıdan al <N>" and N is greater than 0. If N is 0, it's not available.
+    Every target is reported at most once, for the first available menu box that contains it.
+    With a page_cache, boxes seen in an earlier poll reuse their previous match result.
+    Every record gets the same scan time (scanned_at, default: when the collector was created).
+    """
+
+    def __init__(self, target_texts: Union[TargetMatcher, List[str]], page_cache: Optional[PageCache] = None,
+                 scanned_at: Optional[int] = None):
+        self.matcher = as_matcher(target_texts)
+        self.meals_data: List[MealRecord] = []
+        self.scanned_at = scanned_at if scanned_at is not None else scan_timestamp()
+        self._page_cache = page_cache
+        self._box_matches = page_cache.box_matches_for(self.matcher) if page_cache is not None else {}
+        self._box_hits = self._box_misses = 0
+        self._found_meals: Set[str] = set()
+
+    @property
+    def all_resolved(self) -> bool:
+        """True once every target has been found, so the remaining boxes cannot add anything."""
+        return len(self._found_meals) == self.matcher.unique_target_count
+
+    def add(self, menu_box: MenuBox):
+        if self.all_resolved:
+            return
+        restaurant_name_text, menu_title_text, menu_details_text = menu_box.restaurant, menu_box.title, menu_box.details
+        box_match = self._box_matches.get(menu_box)
+        if box_match is None:
+            self._box_misses += 1
+            found_indices = self.matcher.find(fold_for_matching(f"{restaurant_name_text} {menu_title_text} {menu_details_text}"))
+            # Search the text of this menu box for pattern: "Bu menüyü askıdan al <N>"
+            match = AVAILABLE_COUNT_PATTERN.search(menu_box.full_text) if found_indices else None
+            try:
+                suspended_count = int(match.group(1)) if match else 0
+            except ValueError:
+                suspended_count = 0
+            box_match = (found_indices, suspended_count)
+            self._box_matches[menu_box] = box_match
         else:
-            print(f"Failed to access the meals page in network.py. Status code: {response.status_code}")
+            self._box_hits += 1
+        found_indices, suspended_count = box_match
+
+        if suspended_count > 0:
+            target_text = self.matcher.first_unresolved(found_indices, self._found_meals)
+            if target_text is None:
+                return
+            actual_restaurant_name_display = menu_title_text or restaurant_name_text or target_text
+            actual_meal_name = restaurant_name_text or "No meal name available."
+            actual_location = menu_details_text or "No location available."
+
+            meal_info = make_meal_record(actual_restaurant_name_display, actual_meal_name, actual_location, suspended_count,
+                                         self.scanned_at)
+            self.meals_data.append(meal_info)
+            self._found_meals.add(target_text)
+
+    def finish(self) -> List[MealRecord]:
+        if self._page_cache is not None:
+            self._page_cache.count_box_lookups(self._box_hits, self._box_misses)
+            self._box_hits = self._box_misses = 0
+        return self.meals_data
+
+def match_menu_boxes(menu_boxes: List[MenuBox], target_texts: Union[TargetMatcher, List[str]],
+                     page_cache: Optional[PageCache] = None, scanned_at: Optional[int] = None) -> List[MealRecord]:
+    """Searches parsed menu boxes for the target texts (a list or a prebuilt TargetMatcher)."""
+    with metrics.span('match'):
+        collector = MealCollector(target_texts, page_cache, scanned_at)
+        for menu_box in menu_boxes:
+            if collector.all_resolved:
+                break
+            collector.add(menu_box)
+        return collector.finish()
+
+def _parse_menu_boxes_timed(html: str, parser_backend: Optional[str]) -> Tuple[List[MenuBox], float]:
+    """Runs in a parse worker process, where the parent's metrics are out of reach; the parent records the time."""
+    started = time.perf_counter()
+    menu_boxes = parse_menu_boxes(html, parser_backend)
+    return menu_boxes, time.perf_counter() - started
+
+def _parse_menu_boxes_inline(html: str, parser_backend: Optional[str]) -> List[MenuBox]:
+    with metrics.span('parse'):
+        return parse_menu_boxes(html, parser_backend)
+
+def _stream_meals(session: requests.Session, city_id: str, collector: MealCollector, page_cache: PageCache) -> bool:
+    """
+    Reads the student page of a city in chunks, feeding every menu box to the collector as soon as it closes.
+    Stops downloading as soon as every target is resolved. Fully read pages are stored in page_cache.
+    Returns False if the server did not answer with a success status; raises SessionExpiredError as _fetch_meals_page().
+    """
+    meals_url = MEALS_URL_TEMPLATE.format(city_id=city_id)
+    headers = {'Accept-Encoding': STREAM_ACCEPT_ENCODING, **page_cache.conditional_headers(meals_url)}
+    # Downloading, parsing and matching interleave here; each chunk's parse and match time is
+    # measured separately and the rest of the wall-clock time counts as fetch
+    started = time.perf_counter()
+    parse_seconds = match_seconds = 0.0
+    bytes_received = 0
+    # Waiting for the request governor is not part of the fetch time
+    throttle_seconds = request_governor.acquire()
+    with _host_semaphore(meals_url):
+        response = session.get(meals_url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)
+        try:
+            if response.status_code == 304:
+                cached_menu_boxes = page_cache.lookup(meals_url, True, None)
+                if cached_menu_boxes is not None:
+                    match_started = time.perf_counter()
+                    for menu_box in cached_menu_boxes:
+                        collector.add(menu_box)
+                    match_seconds += time.perf_counter() - match_started
+                    return True
+                response.close()
+                throttle_seconds += request_governor.acquire()
+                response = session.get(meals_url, headers={'Accept-Encoding': STREAM_ACCEPT_ENCODING}, stream=True, timeout=REQUEST_TIMEOUT)
+            if _is_sign_in_page(response):
+                raise SessionExpiredError(f"The meals page of city {city_id} redirected to the sign-in page.")
+            if not response.ok:
+                logger.warning(f"Failed to access the meals page in network.py. Status code: {response.status_code}")
+                return False
+            decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+            stream_parser = MenuBoxStream()
+            hasher = hashlib.blake2b(digest_size=16)
+            menu_boxes: List[MenuBox] = []
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                bytes_received += len(chunk)
+                hasher.update(chunk)
+                parse_started = time.perf_counter()
+                new_menu_boxes = stream_parser.feed(decoder.decode(chunk))
+                match_started = time.perf_counter()
+                for menu_box in new_menu_boxes:
+                    menu_boxes.append(menu_box)
+                    collector.add(menu_box)
+                match_finished = time.perf_counter()
+                parse_seconds += match_started - parse_started
+                match_seconds += match_finished - match_started
+                if collector.all_resolved:
+                    logger.info(f"All targets resolved for city {city_id}; stopped reading the page early in network.py.")
+                    return True
+            parse_started = time.perf_counter()
+            new_menu_boxes = stream_parser.feed(decoder.decode(b"", final=True)) + stream_parser.close()
+            match_started = time.perf_counter()
+            for menu_box in new_menu_boxes:
+                menu_boxes.append(menu_box)
+                collector.add(menu_box)
+            parse_seconds += match_started - parse_started
+            match_seconds += time.perf_counter() - match_started
+            page_cache.store(meals_url, response.headers.get('ETag'), response.headers.get('Last-Modified'), hasher.digest(), menu_boxes)
+            return True
+        finally:
+            response.close()
+            metrics.add('fetch', time.perf_counter() - started - throttle_seconds - parse_seconds - match_seconds)
+            metrics.add('parse', parse_seconds)
+            metrics.add('match', match_seconds)
+            metrics.count('bytes_received', bytes_received)
+
+def parse_meals_page(html: str, target_texts: Union[TargetMatcher, List[str]], parser_backend: Optional[str] = None) -> List[MealRecord]:
+    """
+    Parses a downloaded student page with the chosen parsing backend and searches it for the target texts.
+    """
+    return match_menu_boxes(parse_menu_boxes(html, parser_backend), target_texts)
+
+def check_meals(session: requests.Session, target_texts: Union[TargetMatcher, List[str]], city_id: str = "35",
+                parser_backend: Optional[str] = None, page_cache: Optional[PageCache] = None,
+                stream: bool = False, scanned_at: Optional[int] = None) -> Optional[List[MealRecord]]:
+    """
+    Uses the session to check the meals page and search for target texts.
+    Unchanged pages and menu boxes are served from page_cache (the module's default cache if None).
+    With stream=True the page is parsed while it downloads and the download stops once every
+    target is found, which suits short watch lists on big city pages (parser_backend is not used then).
+    Returns the found meals (meal_record.MealRecord, all stamped with scanned_at, default: now) or
+    None if there is an error. Raises SessionExpiredError when the
+    session was logged out, since that is not a problem of one city and a new login fixes it.
+    """
+    page_cache = page_cache or _default_page_cache
+    scanned_at = scanned_at if scanned_at is not None else scan_timestamp()
+    if stream:
+        collector = MealCollector(target_texts, page_cache, scanned_at)
+        try:
+            if not _stream_meals(session, city_id, collector, page_cache):
+                return None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"An error occurred while checking meals in network.py: {e}")
             return None
+        return collector.finish()
+    try:
+        page = _fetch_meals_page(session, city_id, page_cache)
     except requests.exceptions.RequestException as e:
-        print(f"An error occurred while checking meals in network.py: {e}")
-        return None 
\ No newline at end of file
+        logger.error(f"An error occurred while checking meals in network.py: {e}")
+        return None
+    if page is None:
+        return None
+    menu_boxes = page.menu_boxes
+    if menu_boxes is None:
+        menu_boxes = _parse_menu_boxes_inline(page.html, parser_backend)
+        _store_parsed_page(page_cache, page, menu_boxes)
+    return match_menu_boxes(menu_boxes, target_texts, page_cache, scanned_at)
+
+def fetch_menu_boxes_many(session: requests.Session, city_ids: List[str], max_workers: Optional[int] = None,
+                          parse_workers: Optional[int] = None, parser_backend: Optional[str] = None,
+                          page_cache: Optional[PageCache] = None) -> Dict[str, Optional[List[MenuBox]]]:
+    """
+    Downloads and parses the pages of several cities, each once, without matching them; callers
+    that match one page against several watch lists (profiles.ProfilePoller) use this directly.
+    Pages are downloaded concurrently on a bounded thread pool (at most MAX_CONNECTIONS_PER_HOST
+    connections to getodi.com at a time). Changed pages are parsed on a shared process pool as soon
+    as they arrive; unchanged ones come from the page cache. Returns a dict mapping every requested
+    city id to its menu boxes, or None if its page could not be read. Raises SessionExpiredError
+    when the session was logged out.
+    """
+    unique_city_ids = list(dict.fromkeys(city_ids))
+    page_cache = page_cache or _default_page_cache
+    results: Dict[str, Optional[List[MenuBox]]] = {}
+    if not unique_city_ids:
+        return results
+
+    parse_pool = _get_parse_pool(parse_workers) if len(unique_city_ids) > 1 else None
+    fetch_workers = min(len(unique_city_ids), max_workers or MAX_FETCH_WORKERS)
+    parse_futures: Dict[Future, Tuple[str, FetchedPage]] = {}
+    with ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="odiFetch") as fetch_pool:
+        fetch_futures = {fetch_pool.submit(_fetch_meals_page, session, city_id, page_cache): city_id for city_id in unique_city_ids}
+        for fetch_future in as_completed(fetch_futures):
+            city_id = fetch_futures[fetch_future]
+            try:
+                page = fetch_future.result()
+            except requests.exceptions.RequestException as e:
+                logger.error(f"An error occurred while checking meals for city {city_id} in network.py: {e}")
+                results[city_id] = None
+                continue
+            if page is None:
+                results[city_id] = None
+                continue
+            if page.menu_boxes is not None:
+                results[city_id] = page.menu_boxes
+                continue
+            if parse_pool is not None:
+                try:
+                    parse_futures[parse_pool.submit(_parse_menu_boxes_timed, page.html, parser_backend)] = (city_id, page)
+                    continue
+                except (BrokenProcessPool, RuntimeError) as e:
+                    logger.warning(f"Parse worker pool unavailable in network.py, parsing inline: {e}")
+                    shutdown_parse_pool()
+                    parse_pool = None
+            menu_boxes = _parse_menu_boxes_inline(page.html, parser_backend)
+            _store_parsed_page(page_cache, page, menu_boxes)
+            results[city_id] = menu_boxes
+
+    for parse_future in as_completed(parse_futures):
+        city_id, page = parse_futures[parse_future]
+        try:
+            menu_boxes, parse_seconds = parse_future.result()
+        except BrokenProcessPool as e:
+            logger.error(f"Parse worker crashed for city {city_id} in network.py: {e}")
+            shutdown_parse_pool()
+            results[city_id] = None
+            continue
+        metrics.add('parse', parse_seconds)
+        _store_parsed_page(page_cache, page, menu_boxes)
+        results[city_id] = menu_boxes
+    return {city_id: results.get(city_id) for city_id in unique_city_ids}
+
+def check_meals_many(session: requests.Session, target_texts: Union[TargetMatcher, List[str]], city_ids: List[str],
+                     max_workers: Optional[int] = None, parse_workers: Optional[int] = None,
+                     parser_backend: Optional[str] = None, page_cache: Optional[PageCache] = None) -> Dict[str, Optional[List[MealRecord]]]:
+    """
+    Checks the meal pages of several cities at once (see fetch_menu_boxes_many()). Returns a dict
+    mapping every requested city id to its result as check_meals would; all of them share one scan time.
+    """
+    target_texts = as_matcher(target_texts)
+    page_cache = page_cache or _default_page_cache
+    scanned_at = scan_timestamp()
+    menu_boxes_by_city = fetch_menu_boxes_many(session, city_ids, max_workers, parse_workers, parser_backend, page_cache)
+    return {city_id: match_menu_boxes(menu_boxes, target_texts, page_cache, scanned_at) if menu_boxes is not None else None
+            for city_id, menu_boxes in menu_boxes_by_city.items()}
@@ -0,0 +1,306 @@
+"""
+Notifications shared by the GUI and the headless mode.
+
+A sink is anything with a send(title, message, meals) method. NOTIFICATION_SINKS maps the names
+accepted in settings ("notification_sinks") and on the headless command line to sink factories.
+Backend libraries (winotify, plyer, requests) are imported on first use.
+
+NotificationDispatcher sits between the refresh and the sinks: submit() only queues the new meals,
+and a worker thread merges everything submitted within a short window into one notification,
+drops meals that were already notified recently, and notifies each restaurant at most once per
+interval. A slow or hanging notification backend therefore never delays a refresh.
+The dispatcher takes meal_record.MealRecord tuples; sinks get them as dicts (MealRecord.to_dict()).
+"""
+
+import json
+import logging
+import os
+import platform
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from matcher import fold_for_matching
+from meal_record import MealRecord
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_TIMEOUT = (5, 10)
+NOTIFICATION_TITLE = "odiFinder: New Restaurants!"
+NOTIFICATION_MESSAGE_LIMIT = 250
+NOTIFICATION_MERGE_SECONDS = 5.0
+NOTIFICATION_RESTAURANT_INTERVAL_SECONDS = 300.0
+NOTIFICATION_DEDUPE_SECONDS = 3600.0
+
+
+class WinotifyNotificationSink:
+    """Windows toast through winotify."""
+
+    def __init__(self, icon_path: Optional[str] = None, app_id: str = "odiFinder"):
+        self.icon_path = icon_path if icon_path and os.path.exists(icon_path) else None
+        self.app_id = app_id
+
+    @staticmethod
+    def is_available() -> bool:
+        if platform.system() != "Windows":
+            return False
+        try:
+            import winotify  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def send(self, title: str, message: str, meals: Sequence[Dict[str, Any]] = ()):
+        from winotify import Notification
+        Notification(app_id=self.app_id, title=title, msg=message, duration="long", icon=self.icon_path or "").show()
+        logger.info(f"Sent Winotify notification: {message}")
+
+
+class PlyerNotificationSink:
+    """The OS notification service through plyer."""
+
+    def __init__(self, icon_path: Optional[str] = None, app_id: str = "odiFinder"):
+        self.icon_path = icon_path if icon_path and os.path.exists(icon_path) else None
+        self.app_id = app_id
+        self._plyer_notification = None
+        self._plyer_import_attempted = False
+
+    def _load_plyer_notification(self):
+        if not self._plyer_import_attempted:
+            self._plyer_import_attempted = True
+            try:
+                from plyer import notification as plyer_notify_module
+                self._plyer_notification = plyer_notify_module
+            except ImportError:
+                logger.warning("Plyer library not found for non-Windows. Notifications will be OS-dependent.")
+        return self._plyer_notification
+
+    def send(self, title: str, message: str, meals: Sequence[Dict[str, Any]] = ()):
+        plyer_notification = self._load_plyer_notification()
+        if plyer_notification is None:
+            logger.info(f"Notification ready (but no backend): {title} - {message}")
+        elif callable(plyer_notification.notify):
+            plyer_notification.notify(title=title, message=message, app_name=self.app_id, timeout=10, app_icon=self.icon_path or "")
+            logger.info(f"Sent Plyer notification: {message}")
+        else:
+            logger.warning("Plyer notification object exists but notify() is not callable")
+
+
+class DesktopNotificationSink:
+    """Windows toast through winotify, or the OS notification service through plyer elsewhere."""
+
+    def __init__(self, icon_path: Optional[str] = None, app_id: str = "odiFinder"):
+        self._backend = None
+        self._icon_path, self._app_id = icon_path, app_id
+
+    def send(self, title: str, message: str, meals: Sequence[Dict[str, Any]] = ()):
+        if self._backend is None:
+            backend_class = WinotifyNotificationSink if WinotifyNotificationSink.is_available() else PlyerNotificationSink
+            self._backend = backend_class(self._icon_path, self._app_id)
+        try:
+            self._backend.send(title, message, meals)
+        except Exception as e:
+            logger.warning(f"Failed to send notification: {e}")
+
+
+class StdoutNotificationSink:
+    """Writes each notification as one JSON line, for log collectors and shell pipelines."""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def send(self, title: str, message: str, meals: Sequence[Dict[str, Any]] = ()):
+        record = {'ts': datetime.now().isoformat(timespec='seconds'), 'event': 'notification',
+                  'title': title, 'message': message, 'meals': list(meals)}
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        stream.flush()
+
+
+class WebhookNotificationSink:
+    """POSTs {"title", "message", "meals"} as JSON to a URL (ntfy, Slack/Discord relays, home automation)."""
+
+    def __init__(self, url: str, timeout=WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, title: str, message: str, meals: Sequence[Dict[str, Any]] = ()):
+        import requests
+        try:
+            response = requests.post(self.url, json={'title': title, 'message': message, 'meals': list(meals)}, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to send webhook notification: {e}")
+
+
+def _create_webhook_sink(settings: Dict[str, Any], icon_path: Optional[str]) -> Optional[WebhookNotificationSink]:
+    url = settings.get('notification_webhook_url')
+    if not url:
+        logger.warning("Webhook notification sink needs \"notification_webhook_url\" in settings. Skipping it.")
+        return None
+    return WebhookNotificationSink(url)
+
+
+NOTIFICATION_SINKS: Dict[str, Callable[[Dict[str, Any], Optional[str]], Any]] = {
+    'desktop': lambda settings, icon_path: DesktopNotificationSink(icon_path),
+    'winotify': lambda settings, icon_path: WinotifyNotificationSink(icon_path),
+    'plyer': lambda settings, icon_path: PlyerNotificationSink(icon_path),
+    'stdout': lambda settings, icon_path: StdoutNotificationSink(),
+    'webhook': _create_webhook_sink,
+}
+
+
+def create_sinks(names: Sequence[str], settings: Dict[str, Any], icon_path: Optional[str] = None) -> List[Any]:
+    """Builds the sinks named in names; unknown names are reported and skipped."""
+    sinks = []
+    for name in names:
+        factory = NOTIFICATION_SINKS.get(name)
+        if factory is None:
+            logger.warning(f"Unknown notification sink '{name}'. Available: {', '.join(NOTIFICATION_SINKS)}.")
+            continue
+        sink = factory(settings, icon_path)
+        if sink is not None:
+            sinks.append(sink)
+    return sinks
+
+
+def send_to_all(sinks: Sequence[Any], title: str, message: str, meals: Sequence[Dict[str, Any]] = ()):
+    """A failing sink never keeps the others from being notified."""
+    for sink in sinks:
+        try:
+            sink.send(title, message, meals)
+        except Exception as e:
+            logger.warning(f"Notification sink {type(sink).__name__} failed: {e}")
+
+
+def format_restaurant_list(restaurant_names: Sequence[str], limit: int = NOTIFICATION_MESSAGE_LIMIT) -> str:
+    """"New: A, B, C" within limit characters; names that do not fit are counted ("and 4 more") instead of cut off."""
+    message = "New: "
+    for index, name in enumerate(restaurant_names):
+        remaining = len(restaurant_names) - index - 1
+        suffix = f" and {remaining} more" if remaining else ""
+        candidate = message + (", " if index else "") + name
+        if len(candidate) + len(suffix) > limit and index:
+            return f"{message} and {len(restaurant_names) - index} more"
+        message = candidate
+    return message[:limit]
+
+
+def _meal_identity(meal: MealRecord) -> Tuple[str, str, str, str]:
+    return (meal.city_id, fold_for_matching(meal.restaurant_name), meal.meal_name, meal.location)
+
+
+class NotificationDispatcher:
+    """
+    Delivers new meals to the sinks from its own thread. Everything submitted within merge_seconds
+    of the first submission becomes one notification. A meal (city, restaurant, meal, location) is
+    notified at most once per dedupe_seconds, so a menu that flickers off and on between polls does
+    not notify again, and a restaurant at most once per restaurant_interval_seconds.
+    """
+
+    _STOP = object()
+
+    def __init__(self, sinks: Sequence[Any], merge_seconds: float = NOTIFICATION_MERGE_SECONDS,
+                 restaurant_interval_seconds: float = NOTIFICATION_RESTAURANT_INTERVAL_SECONDS,
+                 dedupe_seconds: float = NOTIFICATION_DEDUPE_SECONDS, title: str = NOTIFICATION_TITLE):
+        self.sinks = list(sinks)
+        self.merge_seconds = merge_seconds
+        self.restaurant_interval_seconds = restaurant_interval_seconds
+        self.dedupe_seconds = dedupe_seconds
+        self.title = title
+        # City id -> name; when set, the meals handed to the sinks also get a 'city' field
+        self.city_names: Optional[Dict[str, str]] = None
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._notified_meals: Dict[Tuple[str, str, str, str], float] = {}
+        self._notified_restaurants: Dict[Tuple[str, str], float] = {}
+        self._stats = {'submitted_meals': 0, 'notifications': 0, 'duplicates_suppressed': 0, 'rate_limited': 0}
+
+    def submit(self, meals: Sequence[MealRecord]):
+        """Queues new meals (with city_id) for notification and returns at once."""
+        if not meals:
+            return
+        self._stats['submitted_meals'] += len(meals)
+        self._queue.put(list(meals))
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="NotificationDispatcher", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 5.0):
+        """Sends what is still waiting in the merge window right away and stops the worker."""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(self._STOP)
+        thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self._stats, 'pending': self._queue.qsize()}
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            batch = list(item)
+            deadline = time.monotonic() + self.merge_seconds
+            stopping = False
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.extend(item)
+            try:
+                self._deliver(batch)
+            except Exception as e:
+                logger.warning(f"Notification dispatch failed: {e}")
+            if stopping:
+                return
+
+    def _deliver(self, batch: List[MealRecord]):
+        now = time.monotonic()
+        self._notified_meals = {key: sent for key, sent in self._notified_meals.items() if now - sent < self.dedupe_seconds}
+        self._notified_restaurants = {key: sent for key, sent in self._notified_restaurants.items()
+                                      if now - sent < self.restaurant_interval_seconds}
+        meals, batch_restaurants = [], set()
+        for meal in batch:
+            identity = _meal_identity(meal)
+            if identity in self._notified_meals:
+                self._stats['duplicates_suppressed'] += 1
+                continue
+            restaurant = identity[:2]
+            if restaurant in self._notified_restaurants and restaurant not in batch_restaurants:
+                self._stats['rate_limited'] += 1
+                continue
+            self._notified_meals[identity] = now
+            batch_restaurants.add(restaurant)
+            meals.append(meal)
+        if not meals:
+            return
+        for restaurant in batch_restaurants:
+            self._notified_restaurants[restaurant] = now
+        restaurant_names = sorted({meal.restaurant_name for meal in meals})
+        send_to_all(self.sinks, self.title, format_restaurant_list(restaurant_names), [meal.to_dict(self.city_names) for meal in meals])
+        self._stats['notifications'] += 1
+
+
+def create_dispatcher(names: Sequence[str], settings: Dict[str, Any], icon_path: Optional[str] = None) -> NotificationDispatcher:
+    """A dispatcher for the sinks named in names, with the merge and rate-limit windows from settings."""
+    return NotificationDispatcher(
+        create_sinks(names, settings, icon_path),
+        merge_seconds=float(settings.get('notification_merge_seconds', NOTIFICATION_MERGE_SECONDS)),
+        restaurant_interval_seconds=float(settings.get('notification_restaurant_interval_seconds', NOTIFICATION_RESTAURANT_INTERVAL_SECONDS)),
+        dedupe_seconds=float(settings.get('notification_dedupe_seconds', NOTIFICATION_DEDUPE_SECONDS)))
@@ -1,88 +1,91 @@
-import requests
 from datetime import datetime
-import json
+import logging
 import os
 import locale
-from typing import Optional, List, Dict, Any, Set
-import platform
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Set
 import webbrowser
 import sys
+import threading
+import time
+from importlib.util import find_spec
 from ui import OdiFinderUI
-from network import login_to_odi, check_meals
+import multiprocessing
+import metrics
+from refresh_worker import RefreshWorker
+from matcher import TargetMatcher
+from meal_record import MealRecord
+from snapshot_diff import SnapshotDiff, SnapshotDiffer, meal_key
+from poll_scheduler import OUTCOME_CHANGED, OUTCOME_ERROR, OUTCOME_UNCHANGED, AdaptivePollScheduler
+from app_log import configure_logging
+from app_paths import get_settings_path, resource_path
+from cities import get_city_cache_path, load_city_names, refresh_city_names_in_background
+from settings_store import SettingsStore
+
+# requests/network, the notification backends (notifier.py), pystray and PIL are imported where they are first used, so the
+# login window shows without waiting for them (see benchmarks/bench_startup.py)
+if TYPE_CHECKING:
+    import pystray
+    import requests
+    from fanout import FanoutServer, FanoutSubscriber
+    from history import HistoryStore
+    from notifier import NotificationDispatcher
+    from search_index import MenuSearchIndex
+    from session_manager import SessionManager
 
-try:
-    from winotify import Notification
-    WINOTIFY_AVAILABLE = True
-except ImportError:
-    WINOTIFY_AVAILABLE = False
+logger = logging.getLogger("odiFinder")
+
+PILLOW_AVAILABLE = find_spec("PIL") is not None
+PYSTRAY_AVAILABLE = find_spec("pystray") is not None
+if not (PILLOW_AVAILABLE and PYSTRAY_AVAILABLE):
+    logger.warning("Pillow or pystray library not found. System tray icon will be default.")
 
 try:
-    import pystray
-    from PIL import Image
-    PILLOW_AVAILABLE = True
-    PYSTRAY_AVAILABLE = True
-except ImportError:
-    PILLOW_AVAILABLE = False
-    PYSTRAY_AVAILABLE = False
-    print("Pillow or pystray library not found. System tray icon will be default.")
-
-locale.setlocale(locale.LC_ALL, 'tr_TR.UTF-8')
-
-def get_settings_path():
-    if getattr(sys, 'frozen', False):  # Eğer exe'den çalışıyorsa
-        if platform.system() == "Windows":
-            appdata = os.getenv("APPDATA")
-            if appdata:
-                settings_dir = os.path.join(appdata, "odiFinder")
-            else:
-                # Fallback: use user home directory if APPDATA is not set
-                settings_dir = os.path.join(os.path.expanduser("~"), "odiFinder")
-            os.makedirs(settings_dir, exist_ok=True)
-            return os.path.join(settings_dir, "settings.json")
-        else:
-            # Diğer platformlar için fallback
-            return os.path.join(os.path.expanduser("~"), ".odiFinder_settings.json")
-    else:  # py dosyasından çalışıyorsa
-        return os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json")
-
-# PyInstaller resource path helper
-def resource_path(relative_path):
-    base_path = getattr(sys, '_MEIPASS', None)
-    if base_path:
-        return os.path.join(base_path, relative_path)
-    return os.path.join(os.path.abspath("."), relative_path)
+    locale.setlocale(locale.LC_ALL, 'tr_TR.UTF-8')
+except locale.Error:
+    logger.warning("Turkish locale not available. Using the system default locale.")
 
 class OdiFinderApp:
     APP_VERSION = "1.4.3"
 
-    def __init__(self):
-        self.session: Optional[requests.Session] = None
+    def __init__(self, settings_path: Optional[str] = None):
+        self.session: Optional["requests.Session"] = None
         self.username: str = ''
         self.password: str = ''
         self.target_texts: List[str] = [""]
+        self.target_matcher: TargetMatcher = TargetMatcher(self.target_texts)
         self.notifications_enabled: bool = True
         self.current_city_id: str = "35"
+        self.city_ids: List[str] = ["35"]
         self.city_names: Dict[str, str] = {}
-        self.previously_found_meal_names: Set[str] = set()
+        self.snapshot_differ = SnapshotDiffer()
+        self._displayed_cities: Optional[tuple] = None
+        self._status_text = ""
+        # Every menu of the last refreshed pages, searched by the filter box; only swapped on the UI thread
+        self.search_index: Optional["MenuSearchIndex"] = None
+        self._filter_query = ""
         self.periodic_refresh_id: Optional[str] = None
         self.REFRESH_INTERVAL_MS: int = 3 * 60 * 1000
-        self.system_tray_icon: Optional[pystray.Icon] = None
-        self.settings: Dict[str, Any] = {}
+        self.poll_scheduler: AdaptivePollScheduler = AdaptivePollScheduler.from_settings({})
+        self.system_tray_icon: Optional["pystray.Icon"] = None
+        self._tray_thread: Optional[threading.Thread] = None
+        self._tray_icon_wanted = False
+        self.settings: Optional[SettingsStore] = None
         self._cleanup_called_flag = False
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
         self.icon_path = resource_path('odiFinderlogo.ico')
-        self.settings_path = get_settings_path()
-        self.plyer_notification_available = False
-        self.plyer_notification = None
-        if platform.system() != "Windows":
-            try:
-                from plyer import notification as plyer_notify_module
-                self.plyer_notification = plyer_notify_module
-                self.plyer_notification_available = True
-            except ImportError:
-                print("Plyer library not found for non-Windows. Notifications will be OS-dependent.")
+        self.settings_path = settings_path or get_settings_path()
+        self.session_manager: Optional["SessionManager"] = None
+        self._warmup_thread: Optional[threading.Thread] = None
+        # Set once the warm-up built the session manager and loaded the city names (or gave up);
+        # the connection pre-open after it is never waited for
+        self._warmup_ready = threading.Event()
+        self.notification_dispatcher: Optional["NotificationDispatcher"] = None
+        self.fanout_server: Optional["FanoutServer"] = None
+        self.fanout_subscriber: Optional["FanoutSubscriber"] = None
+        self.history_store: Optional["HistoryStore"] = None
+        self._history_opened = False
         self._load_settings()
-        self._load_city_names()
+        self.refresh_worker = RefreshWorker(self._run_refresh_job, on_finished=self._on_refresh_worker_finished)
         callbacks = {
             'on_login_attempt': self.handle_login_attempt,
             'open_debug_console': self.handle_open_debug_console,
@@ -93,68 +96,150 @@ class OdiFinderApp:
             'on_toggle_theme': self.handle_toggle_theme,
             'on_save_interval': self.handle_save_interval,
             'on_refresh_now': self.handle_meal_refresh,
+            'on_filter_changed': self.handle_filter_changed,
             'on_open_getodi': self.handle_open_getodi,
             'on_quit_application': self.handle_quit_application,
-            'on_debug_console_closed_message': lambda: print("Debug console closed (via app callback).")
+            'on_debug_console_closed_message': lambda: logger.info("Debug console closed (via app callback).")
         }
         self.ui = OdiFinderUI(callbacks, self.icon_path)
 
     def _load_settings(self):
-        try:
-            with open(self.settings_path, 'r', encoding='utf-8') as f:
-                self.settings = json.load(f)
+        # Writes are atomic and debounced; edits made to the file while the app runs are applied (see settings_store.py)
+        self.settings = SettingsStore(self.settings_path, on_change=self._on_settings_file_changed)
+        configure_logging(self.settings, self.settings_path)
+        if self.settings:
             self.username = self.settings.get('username', self.username)
             self.target_texts = self.settings.get('restaurants', self.target_texts)
+            self._rebuild_target_matcher()
             self.notifications_enabled = self.settings.get('notifications_enabled', self.notifications_enabled)
             self.current_city_id = self.settings.get('city_id', self.current_city_id)
+            self.city_ids = self.settings.get('city_ids', [self.current_city_id]) or [self.current_city_id]
+            self.REFRESH_INTERVAL_MS = self.settings.get('refresh_interval', 3) * 60 * 1000
+        metrics.recorder.configure(self.settings.get('metrics_prometheus_textfile'), self.settings.get('metrics_jsonl'))
+        self.poll_scheduler = AdaptivePollScheduler.from_settings(self.settings, self.REFRESH_INTERVAL_MS / 60000)
+
+    def _on_settings_file_changed(self, changed_keys: Set[str]):
+        # Called from the settings store thread
+        ui = getattr(self, 'ui', None)
+        if ui is not None:
+            ui.post_to_main_thread(self._apply_settings_file_change, changed_keys)
+
+    def _apply_settings_file_change(self, changed_keys: Set[str]):
+        """Applies settings somebody changed in the file while the app was running."""
+        refresh = False
+        if 'restaurants' in changed_keys:
+            self.target_texts = self.settings.get('restaurants', [""])
+            self._rebuild_target_matcher()
+            refresh = True
+        if changed_keys & {'city_ids', 'city_id'}:
+            self.current_city_id = self.settings.get('city_id', self.current_city_id)
+            self.city_ids = self.settings.get('city_ids', [self.current_city_id]) or [self.current_city_id]
+            if self.fanout_subscriber is not None:
+                self.fanout_subscriber.set_city_ids(self.city_ids)
+            refresh = True
+        if 'notifications_enabled' in changed_keys:
+            self.notifications_enabled = self.settings.get('notifications_enabled', True)
+        if 'theme' in changed_keys and self.ui.app_root and self.ui.current_theme_name != self.settings.get('theme', 'dark'):
+            self.ui.apply_theme(self.settings.get('theme', 'dark'))
+        if changed_keys & {'debug_logging', 'log_buffer_lines', 'log_file', 'log_file_max_bytes', 'log_file_backups'}:
+            configure_logging(self.settings, self.settings_path)
+        if changed_keys & {'max_requests_per_second', 'request_burst', 'login_failure_threshold', 'login_retry_seconds',
+                           'login_max_retry_seconds'} and 'network' in sys.modules:
+            sys.modules['network'].configure_request_limits(self.settings)
+        if changed_keys & {'refresh_interval', 'refresh_interval_min', 'refresh_interval_max', 'poll_jitter', 'adaptive_polling'}:
             self.REFRESH_INTERVAL_MS = self.settings.get('refresh_interval', 3) * 60 * 1000
-        except (FileNotFoundError, json.JSONDecodeError):
-            print("Settings file not found or invalid. Using defaults.")
-            self.settings = {}
+            self.poll_scheduler = AdaptivePollScheduler.from_settings(self.settings, self.REFRESH_INTERVAL_MS / 60000)
+            if self.periodic_refresh_id is not None:
+                self._cancel_periodic_refresh()
+                self._schedule_next_refresh()
+        if self.ui.app_root and self.ui.app_root.winfo_exists():
+            self.ui.update_settings_display(self._get_initial_ui_settings())
+            if refresh:
+                self.handle_meal_refresh(rerun_if_busy=True)
+
+    def _rebuild_target_matcher(self):
+        """Compiles the watch list once, whenever it changes, instead of on every refresh."""
+        self.target_matcher = TargetMatcher(self.target_texts)
 
     def _save_settings(self):
-        self.settings['username'] = self.username
-        self.settings['restaurants'] = self.target_texts
-        self.settings['notifications_enabled'] = self.notifications_enabled
-        self.settings['theme'] = self.ui.current_theme_name if self.ui else 'dark'
-        self.settings['city_id'] = self.current_city_id
-        self.settings['refresh_interval'] = self.REFRESH_INTERVAL_MS // (60 * 1000)
-        try:
-            with open(self.settings_path, 'w', encoding='utf-8') as f:
-                json.dump(self.settings, f, indent=4)
-        except Exception as e:
-            print(f"Error saving settings: {e}")
+        # One update, so the store validates the values and writes them behind in one go
+        self.settings.update({
+            'username': self.username,
+            'restaurants': self.target_texts,
+            'notifications_enabled': self.notifications_enabled,
+            'theme': self.ui.current_theme_name if self.ui else 'dark',
+            'city_id': self.current_city_id,
+            'city_ids': self.city_ids,
+            'refresh_interval': self.REFRESH_INTERVAL_MS // (60 * 1000)
+        })
 
     def _load_city_names(self):
-        try:
-            import csv
-            from io import StringIO
-            city_csv_url = "https://gist.githubusercontent.com/mebaysan/7a4ba8531187fa8703ff1f22692d5fa6/raw/df4e85262ba2a4f6d6045f06f417b853fb67e78c/il.csv"
-            response = requests.get(city_csv_url)
-            if response.status_code == 200:
-                csv_reader = csv.reader(StringIO(response.text))
-                next(csv_reader)
-                for row in csv_reader:
-                    if len(row) >= 2:
-                        self.city_names[row[0].zfill(2)] = row[1]
-        except Exception as e:
-            print(f"Error loading city names: {e}")
-        if not self.city_names:
-            self.city_names = {"35": "İzmir"}
+        """Labels come from the bundled table (plus the cache file); a stale cache is refreshed in the background."""
+        city_cache_path = get_city_cache_path(self.settings_path)
+        self.city_names = load_city_names(city_cache_path)
+        if self.settings.get('refresh_city_names', True):
+            refresh_city_names_in_background(city_cache_path, on_update=self._on_city_names_refreshed)
+
+    def _on_city_names_refreshed(self, city_names: Dict[str, str]):
+        self.city_names = city_names
+        logger.info(f"City names refreshed in background ({len(city_names)} cities).")
 
     def run(self):
+        self._start_warmup()
         self.ui.display_login_window(self.username)
-        print("Exiting application run method after login window closes or fails.")
+        logger.info("Exiting application run method after login window closes or fails.")
+
+    def _start_warmup(self):
+        """
+        Prepares the network side while the login window is already on screen: imports requests and
+        the parsers, builds the pooled session, pre-opens a connection to getodi.com and loads the
+        city names.
+        """
+        self._warmup_thread = threading.Thread(target=self._warm_up, name="odiWarmup", daemon=True)
+        self._warmup_thread.start()
+
+    def _warm_up(self):
+        try:
+            from network import prewarm_connection
+            self.session_manager = self._create_session_manager()
+            self._load_city_names()
+            self._warmup_ready.set()
+            prewarm_connection(self.session_manager.session)
+        except Exception as e:
+            logger.warning(f"Startup warm-up failed, continuing without it: {e}")
+        finally:
+            self._warmup_ready.set()
+
+    def _create_session_manager(self) -> "SessionManager":
+        from network import configure_request_limits
+        from session_manager import SessionManager, get_cookie_path
+        configure_request_limits(self.settings)
+        return SessionManager(get_cookie_path(self.settings_path))
+
+    def _wait_for_warmup(self):
+        """
+        Blocks until the warm-up has a session manager, but not for the connection pre-open: offline that
+        can take the whole request timeout, and the login opens its own connection anyway. Whatever the
+        warm-up did not get to is done here instead.
+        """
+        if self._warmup_thread is not None:
+            self._warmup_ready.wait()
+        if self.session_manager is None:
+            self.session_manager = self._create_session_manager()
+        if not self.city_names:
+            self._load_city_names()
 
     def handle_login_attempt(self, username, password_attempt):
-        self.session = login_to_odi(username, password_attempt)
+        self._wait_for_warmup()
+        self.session = self.session_manager.login(username, password_attempt)
         if self.session:
             self.username = username
             self.password = password_attempt
-            self.settings['username'] = self.username
             self._save_settings()
             self.ui.close_login_window()
             self._initialize_main_app_components()
+        elif isinstance(self.session_manager.last_error, sys.modules['network'].ServiceUnavailableError):
+            self.ui.show_login_error("Connection Failed", f"Could not log in to getodi.com: {self.session_manager.last_error}")
         else:
             self.ui.show_login_error()
 
@@ -163,46 +248,76 @@ class OdiFinderApp:
             'version': self.APP_VERSION,
             'theme': self.settings.get('theme', 'dark'),
             'notifications_enabled': self.notifications_enabled,
-            'city_id': self.current_city_id,
+            'city_id': ",".join(self.city_ids),
             'refresh_interval': self.REFRESH_INTERVAL_MS // (60 * 1000)
         }
 
     def _initialize_main_app_components(self):
         initial_ui_settings = self._get_initial_ui_settings()
         self.ui.initialize_main_window(initial_ui_settings)
+        self.refresh_worker.start()
+        self._start_fanout()
+        # The next automatic refresh is scheduled when this one finishes
         self.handle_meal_refresh()
-        self._schedule_next_refresh()
         self.ui.run_ui()
 
+    def _start_fanout(self):
+        """
+        With "fanout_serve" the polled menu boxes are shared with other instances; with "fanout_subscribe"
+        this instance follows a serving one instead of scraping getodi.com (see fanout.py). Either
+        side refreshes as soon as the other has news.
+        """
+        serve, subscribe = self.settings.get('fanout_serve'), self.settings.get('fanout_subscribe')
+        if not serve and not subscribe:
+            return
+        from fanout import FanoutServer, FanoutSubscriber, parse_address
+        try:
+            if subscribe:
+                self.fanout_subscriber = FanoutSubscriber(subscribe, self.city_ids, self.settings.get('fanout_token'),
+                                                          on_update=self._on_fanout_news).start()
+            else:
+                host, port = parse_address(serve)
+                self.fanout_server = FanoutServer(host, port, self.settings.get('fanout_token'), on_new_cities=self._on_fanout_news).start()
+        except OSError as e:
+            logger.warning(f"Could not start sharing meal updates: {e}")
+
+    def _on_fanout_news(self, city_ids: Set[str]):
+        # Called from a fan-out thread
+        self.ui.post_to_main_thread(self.handle_meal_refresh, True)
+
     def handle_toggle_notifications(self):
         self.notifications_enabled = self.ui.get_notifications_enabled()
         self._save_settings()
-        print(f"Notifications {'enabled' if self.notifications_enabled else 'disabled'}")
+        logger.info(f"Notifications {'enabled' if self.notifications_enabled else 'disabled'}")
 
     def handle_edit_restaurants(self):
         self.ui.show_edit_restaurants_dialog(self.target_texts, self._save_edited_restaurants_callback)
 
     def _save_edited_restaurants_callback(self, new_restaurants: List[str]):
         self.target_texts = new_restaurants
+        self._rebuild_target_matcher()
         self._save_settings()
-        print("Restaurant list updated.")
-        self.handle_meal_refresh()
+        logger.info("Restaurant list updated.")
+        self.handle_meal_refresh(rerun_if_busy=True)
 
     def handle_save_city_id(self):
-        new_city_id = self.ui.get_city_id_entry()
-        if new_city_id.isdigit() and len(new_city_id) > 0:
-            self.current_city_id = new_city_id.zfill(2)
+        new_city_ids = [city_id.strip() for city_id in self.ui.get_city_id_entry().split(',') if city_id.strip()]
+        if new_city_ids and all(city_id.isdigit() for city_id in new_city_ids):
+            self.city_ids = list(dict.fromkeys(city_id.zfill(2) for city_id in new_city_ids))
+            self.current_city_id = self.city_ids[0]
             self._save_settings()
-            print(f"City ID updated to {self.current_city_id}")
-            self.handle_meal_refresh()
+            logger.info(f"City IDs updated to {', '.join(self.city_ids)}")
+            if self.fanout_subscriber is not None:
+                self.fanout_subscriber.set_city_ids(self.city_ids)
+            self.handle_meal_refresh(rerun_if_busy=True)
         else:
-            self.ui.show_message(type="error", title="Error", message="City ID must be a valid number (e.g., 35).")
+            self.ui.show_message(type="error", title="Error", message="City ID must be a valid number (e.g., 35) or a comma-separated list (e.g., 35,34).")
 
     def handle_toggle_theme(self):
         new_theme = "light" if self.ui.current_theme_name == "dark" else "dark"
         self.ui.apply_theme(new_theme)
         self._save_settings()
-        print(f"Theme changed to {self.ui.current_theme_name}")
+        logger.info(f"Theme changed to {self.ui.current_theme_name}")
 
     def handle_save_interval(self):
         try:
@@ -212,83 +327,282 @@ class OdiFinderApp:
                 self.ui.show_message(type="error", title="Error", message="Interval must be positive.")
                 return
             self.REFRESH_INTERVAL_MS = interval_min * 60 * 1000
+            self.poll_scheduler.set_interval(interval_min * 60)
             self._save_settings()
-            print(f"Auto-refresh interval updated to {interval_min} minutes.")
+            logger.info(f"Auto-refresh interval updated to {interval_min} minutes.")
             self._cancel_periodic_refresh()
             self._schedule_next_refresh()
         except ValueError:
             self.ui.show_message(type="error", title="Error", message="Please enter a valid number for interval.")
 
-    def handle_meal_refresh(self):
+    def handle_meal_refresh(self, rerun_if_busy: bool = False):
+        """
+        Queues a meal refresh on the background worker and returns immediately.
+        Overlapping requests are refused; rerun_if_busy queues one more refresh after the
+        running one, which is what settings changes need.
+        """
         if not self.ui.app_root or not self.ui.app_root.winfo_exists():
-            print("Meal refresh called but UI not ready.")
+            logger.warning("Meal refresh called but UI not ready.")
             return
-        if self.session is None:
-            print("No active session. Attempting re-login for meal refresh.")
-            self.ui.update_meals_display("Connection error. No session. Attempting re-login...", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            self._attempt_relogin_and_refresh()
+        if not self.refresh_worker.request_refresh(rerun_if_busy=rerun_if_busy):
+            logger.warning("Meal refresh already in progress. Skipping overlapping request.")
             return
+        self.ui.set_refresh_in_progress(True)
+
+    def _on_refresh_worker_finished(self):
+        self.ui.post_to_main_thread(lambda: self.ui.set_refresh_in_progress(self.refresh_worker.is_busy()))
+        # Manual refreshes restart the timer too, so the delay always follows the latest outcome
+        self.ui.post_to_main_thread(self._schedule_next_refresh)
+
+    def _post_meals_display(self, text_to_display: str):
+        # Shown above the table; the rows of the last successful refresh stay visible
+        self.ui.post_to_main_thread(self.ui.update_meals_display, text_to_display, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+    def _run_refresh_job(self):
+        """
+        Runs on the refresh worker thread: re-login if needed, fetch, parse and diff meals.
+        Never touches Tk directly; every UI update is posted to the UI queue.
+        """
+        timings = metrics.recorder.begin_refresh()
         try:
-            current_meals = check_meals(self.session, self.target_texts, self.current_city_id)
-            refresh_time_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            output_lines, current_meal_names_now = [], set()
-            if current_meals:
-                for meal in current_meals:
-                    output_lines.extend([f"Restaurant: {meal['restaurant_name']}", f"Meal: {meal['meal_name']}", f"Location: {meal['location']}", f"{meal.get('available_count', 0)} meals available", "-" * 40])
-                    current_meal_names_now.add(meal['restaurant_name'])
-                newly_found = current_meal_names_now - self.previously_found_meal_names
-                if newly_found and self.notifications_enabled:
-                    self._send_notification(f"New: {', '.join(sorted(list(newly_found)))}"[:250])
-            else:
-                output_lines.append(f"No meals found for specified restaurants in {self.city_names.get(self.current_city_id, f'city {self.current_city_id}')} at this time.")
-            self.previously_found_meal_names = current_meal_names_now
-            self.ui.update_meals_display("\n".join(output_lines), refresh_time_str)
-            print(f"GUI Refreshed: {refresh_time_str}. City: {self.current_city_id}. Found: {bool(current_meals)}")
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Connection error: {e}.\nAttempting re-login..."
-            print(error_msg)
-            self.ui.update_meals_display(error_msg, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            self._attempt_relogin_and_refresh()
-        except Exception as e:
-            error_msg = f"Error updating meals: {e}"
-            print(error_msg)
-            import traceback
-            traceback.print_exc()
-            self.ui.update_meals_display(error_msg, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-
-    def _attempt_relogin_and_refresh(self):
-        if not self.username or not self.password:
-            msg = "Cannot re-login: username or password not stored."
-            print(msg)
-            self.ui.update_meals_display(msg, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            return
-        new_session = login_to_odi(self.username, self.password)
-        if new_session:
-            self.session = new_session
-            self.ui.show_message(type="info", title="Re-login Successful", message="Successfully re-logged in. Meals will refresh shortly.")
-            if self.ui.app_root and self.ui.app_root.winfo_exists():
-                self.ui.app_root.after(200, self.handle_meal_refresh)
+            if not self._refresh_with_relogin(timings):
+                self.poll_scheduler.record(OUTCOME_ERROR)
+        finally:
+            metrics.recorder.end_refresh(timings)
+
+    def _refresh_with_relogin(self, timings: metrics.RefreshTimings) -> bool:
+        """
+        Returns False if the meals could not be refreshed. Only a logged-out session leads to a
+        re-login; connection errors are left to the poll scheduler's backoff, since logging in
+        again cannot fix them.
+        """
+        from requests.exceptions import RequestException
+        from network import SessionExpiredError
+        relogin_attempted = False
+        if self.session is None and self.fanout_subscriber is None:
+            logger.warning("No active session. Attempting re-login for meal refresh.")
+            self._post_meals_display("No session. Attempting re-login...")
+            relogin_attempted = True
+            if not self._attempt_relogin():
+                return False
+        while True:
+            try:
+                self._refresh_meals(timings)
+                return True
+            except SessionExpiredError as e:
+                logger.warning(f"{e} Attempting re-login...")
+                self._post_meals_display("Session expired. Attempting re-login...")
+                if relogin_attempted or not self._attempt_relogin():
+                    return False
+                relogin_attempted = True
+            except RequestException as e:
+                error_msg = f"Connection error: {e}. Will retry automatically."
+                logger.warning(error_msg)
+                self._post_meals_display(error_msg)
+                return False
+            except Exception as e:
+                error_msg = f"Error updating meals: {e}"
+                logger.exception(error_msg)
+                self._post_meals_display(error_msg)
+                return False
+
+    def _refresh_meals(self, timings: metrics.RefreshTimings):
+        from network import check_meals, check_meals_many
+        target_matcher, city_ids = self.target_matcher, self.city_ids
+        parser_backend = self.settings.get('parser_backend')
+        if self.fanout_subscriber is not None:
+            meals_by_city = self.fanout_subscriber.check_meals_many(target_matcher, city_ids)
+        elif self.fanout_server is not None:
+            from fanout import poll_and_publish
+            meals_by_city = poll_and_publish(self.fanout_server, self.session, target_matcher, city_ids, parser_backend)
+        elif len(city_ids) > 1:
+            meals_by_city = check_meals_many(self.session, target_matcher, city_ids, parser_backend=parser_backend)
         else:
-            relogin_fail_msg = "Failed to re-login. Check credentials/network. Manual refresh or restart may be needed."
-            self.ui.show_message(type="error", title="Re-login Failed", message=relogin_fail_msg)
-
-    def _send_notification(self, message_text: str):
-        title = "odiFinder: New Restaurants!"
-        icon_to_use = self.icon_path if self.icon_path and os.path.exists(self.icon_path) else None
+            meals_by_city = {city_ids[0]: check_meals(self.session, target_matcher, city_ids[0], parser_backend,
+                                                      stream=self.settings.get('streaming_fetch', False))}
+        diff_started = time.perf_counter()
+        refresh_time_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.snapshot_differ.forget_cities_except(city_ids)
+        meal_diff = self.snapshot_differ.update(meals_by_city)
+        # The table gets only the changed rows, unless the watched cities changed and it has to be refilled
+        replace = tuple(city_ids) != self._displayed_cities
+        if replace:
+            upserts = [self._meal_row(city_id, meal) for city_id in city_ids for meal in self.snapshot_differ.meals_for(city_id)]
+            removals = []
+            self._displayed_cities = tuple(city_ids)
+        else:
+            upserts = [self._meal_row(meal.city_id, meal) for meal in meal_diff.added]
+            upserts.extend(self._meal_row(change.meal.city_id, change.meal) for change in meal_diff.count_changed)
+            removals = [meal_key(meal.city_id, meal) for meal in meal_diff.removed]
+        status_text = self._format_status(city_ids, meal_diff.failed_cities)
+        timings.add('diff', time.perf_counter() - diff_started)
+        with timings.span('index'):
+            search_index = self._build_search_index(city_ids)
+        with timings.span('history'):
+            self._record_history(meals_by_city, meal_diff)
+            self._update_slot_activity(city_ids)
+        if len(meal_diff.failed_cities) == len(meals_by_city):
+            self.poll_scheduler.record(OUTCOME_ERROR)
+        else:
+            self.poll_scheduler.record(OUTCOME_CHANGED if meal_diff.has_changes else OUTCOME_UNCHANGED)
+        timings.keep_open()
+        self.ui.post_to_main_thread(self._render_meals, upserts, removals, replace, status_text, refresh_time_str, timings, search_index)
+        if meal_diff.added and self.notifications_enabled:
+            with timings.span('notify'):
+                self._send_notification(meal_diff.added)
+        logger.info(f"GUI Refreshed: {refresh_time_str}. Cities: {', '.join(meals_by_city)}. Found: {any(meals_by_city.values())}. "
+              f"Changes: +{len(meal_diff.added)} -{len(meal_diff.removed)} ~{len(meal_diff.count_changed)}")
+
+    def _build_search_index(self, city_ids: List[str]) -> "MenuSearchIndex":
+        """
+        Indexes every menu box of the last fully read page of each city, watched or not. Pages that
+        did not change since the last refresh keep their index, and unchanged boxes of changed pages
+        their words. Runs on the refresh worker thread.
+        """
+        from search_index import MenuSearchIndex
+        if self.fanout_subscriber is not None:
+            menu_boxes_of = self.fanout_subscriber.menu_boxes
+        else:
+            from network import get_cached_menu_boxes
+            menu_boxes_of = get_cached_menu_boxes
+        menu_boxes_by_city = {}
+        for city_id in city_ids:
+            menu_boxes = menu_boxes_of(city_id)
+            if menu_boxes is not None:
+                menu_boxes_by_city[city_id] = menu_boxes
+        search_index = self.search_index
+        if search_index is not None and search_index.is_built_from(menu_boxes_by_city):
+            return search_index
+        return MenuSearchIndex(menu_boxes_by_city, previous=search_index)
+
+    def _meal_row(self, city_id: str, meal: MealRecord) -> tuple:
+        values = (self.city_names.get(city_id, city_id), meal.restaurant_name, meal.meal_name, meal.location, meal.available_count)
+        return meal_key(city_id, meal), values
+
+    def _format_status(self, city_ids: List[str], failed_cities: Set[str]) -> str:
+        output_lines = []
+        for city_id in city_ids:
+            city_label = self.city_names.get(city_id, f'city {city_id}')
+            if city_id in failed_cities:
+                output_lines.append(f"Could not refresh {city_label}; showing the last results.")
+            elif not self.snapshot_differ.meal_count(city_id):
+                output_lines.append(f"No meals found for specified restaurants in {city_label} at this time.")
+        return "\n".join(output_lines)
+
+    def _get_history_store(self) -> Optional["HistoryStore"]:
+        """Opened on the first refresh, so sqlite3 is not imported before the login window shows."""
+        if not self._history_opened:
+            self._history_opened = True
+            from history import open_history_store
+            self.history_store = open_history_store(self.settings, self.settings_path)
+        return self.history_store
+
+    def _record_history(self, meals_by_city: Dict[str, Optional[List[MealRecord]]], meal_diff: SnapshotDiff):
+        history_store = self._get_history_store()
+        if history_store is None:
+            return
+        import sqlite3
+        from history import MAX_SCAN_GAP_FACTOR
+        history_store.max_scan_gap_seconds = MAX_SCAN_GAP_FACTOR * self.poll_scheduler.ceiling_seconds
+        try:
+            for city_id, current_meals in meals_by_city.items():
+                # A failed fetch says nothing about availability; only real answers are recorded
+                if current_meals is None:
+                    continue
+                if city_id in meal_diff.changed_cities or not history_store.extend_last_observation(city_id):
+                    history_store.record_scan(city_id, current_meals)
+            history_store.prune_if_due()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not record history: {e}")
+
+    def _update_slot_activity(self, city_ids: List[str]):
+        """Reloads which hours of the week usually have meals, for the poll scheduler (every few hours)."""
+        history_store = self._get_history_store()
+        if history_store is None or not self.poll_scheduler.slot_activity_is_stale():
+            return
+        import sqlite3
         try:
-            if platform.system() == "Windows" and WINOTIFY_AVAILABLE:
-                Notification(app_id="odiFinder", title=title, msg=message_text, duration="long", icon=icon_to_use or "").show()
-                print(f"Sent Winotify notification: {message_text}")
-            elif self.plyer_notification_available and self.plyer_notification is not None:
-                if callable(self.plyer_notification.notify):
-                    self.plyer_notification.notify(title=title, message=message_text, app_name="odiFinder", timeout=10, app_icon=icon_to_use or "")
-                    print(f"Sent Plyer notification: {message_text}")
+            self.poll_scheduler.set_slot_activity(history_store.slot_activity(city_ids))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read availability history for scheduling: {e}")
+
+    def _render_meals(self, upserts: List[tuple], removals: List[tuple], replace: bool, status_text: str,
+                      refresh_time_str: str, timings: metrics.RefreshTimings, search_index: "MenuSearchIndex"):
+        """Runs on the UI thread; the refresh's timings are complete once the results are on screen."""
+        self.search_index = search_index
+        self._status_text = status_text
+        try:
+            with timings.span('ui_render'):
+                if self._filter_query:
+                    # The table shows the filter's matches; the watch list comes back when the filter is cleared
+                    self.ui.update_last_refreshed(refresh_time_str)
+                    self._show_filter_results()
                 else:
-                    print("Plyer notification object exists but notify() is not callable")
-            else:
-                print(f"Notification ready (but no backend): {title} - {message_text}")
-        except Exception as e:
-            print(f"Failed to send notification: {e}")
+                    self.ui.update_meal_rows(upserts, removals, status_text, refresh_time_str, replace=replace)
+        finally:
+            metrics.recorder.end_refresh(timings)
+
+    def handle_filter_changed(self, query: str):
+        """Runs on the UI thread at every keystroke in the filter box; no request is made."""
+        query = query.strip()
+        if query == self._filter_query:
+            return
+        self._filter_query = query
+        if query:
+            self._show_filter_results()
+            return
+        # The differ is only replaced city by city on the worker, so reading it here is safe; a
+        # refresh rendered after this applies its changes on top, which is idempotent
+        rows = [self._meal_row(city_id, meal) for city_id in self._displayed_cities or ()
+                for meal in self.snapshot_differ.meals_for(city_id)]
+        self.ui.replace_meal_rows(rows, self._status_text)
+
+    def _show_filter_results(self):
+        if self.search_index is None:
+            self.ui.replace_meal_rows([], "Nothing to filter yet: wait for the first refresh to finish.")
+            return
+        started = time.perf_counter()
+        meals = self.search_index.search(self._filter_query)
+        available = sum(1 for meal in meals if meal.available_count > 0)
+        status_text = (f"{len(meals)} menus on the last refreshed pages match \"{self._filter_query}\" ({available} available). "
+                       f"Clear the filter to see your restaurant list.")
+        self.ui.replace_meal_rows([self._meal_row(meal.city_id, meal) for meal in meals], status_text)
+        logger.debug(f"Filter \"{self._filter_query}\": {len(meals)} matches in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def _attempt_relogin(self) -> bool:
+        """
+        Runs on the refresh worker thread. Returns True if a new session was obtained.
+        Rejected credentials are reported once in a message box and the password is forgotten, so
+        later refreshes do not send it again; network failures and an open login circuit only
+        update the status line, since the next refreshes retry on their own.
+        """
+        from network import AuthenticationError
+        if not self.username or not self.password:
+            msg = "Cannot re-login: username or password not stored. Restart odiFinder to log in again."
+            logger.warning(msg)
+            self._post_meals_display(msg)
+            return False
+        new_session = self.session_manager.login(self.username, self.password, reuse_cookies=False)
+        if new_session:
+            self.session = new_session
+            self.ui.post_to_main_thread(self.ui.show_message, "info", "Re-login Successful", "Successfully re-logged in. Meals will refresh shortly.")
+            return True
+        error = self.session_manager.last_error
+        if isinstance(error, AuthenticationError):
+            self.password = ''
+            relogin_fail_msg = "getodi.com rejected the saved username or password. Restart odiFinder to log in again."
+            self._post_meals_display(relogin_fail_msg)
+            self.ui.post_to_main_thread(self.ui.show_message, "error", "Re-login Failed", relogin_fail_msg)
+            return False
+        self._post_meals_display(f"Could not re-login: {error} Will retry automatically.")
+        return False
+
+    def _send_notification(self, meals: List[MealRecord]):
+        """Only queues the meals; the dispatcher's thread merges, deduplicates and sends them."""
+        if self.notification_dispatcher is None:
+            from notifier import create_dispatcher
+            self.notification_dispatcher = create_dispatcher(self.settings.get('notification_sinks', ['desktop']), self.settings, self.icon_path)
+        self.notification_dispatcher.submit(meals)
 
     def handle_open_getodi(self):
         webbrowser.open_new_tab("https://getodi.com")
@@ -296,28 +610,29 @@ class OdiFinderApp:
     def _schedule_next_refresh(self):
         self._cancel_periodic_refresh()
         if self.ui.app_root and self.ui.app_root.winfo_exists():
-            self.periodic_refresh_id = self.ui.app_root.after(self.REFRESH_INTERVAL_MS, self._scheduled_refresh_task_wrapper)
-            print(f"Scheduled next refresh in {self.REFRESH_INTERVAL_MS // 1000} seconds.")
+            delay_seconds = self.poll_scheduler.next_delay()
+            self.periodic_refresh_id = self.ui.app_root.after(int(delay_seconds * 1000), self._scheduled_refresh_task_wrapper)
+            logger.info(f"Scheduled next refresh in {delay_seconds:.0f} seconds ({self.poll_scheduler.last_reason}).")
         else:
-            print("Cannot schedule refresh: UI not ready.")
+            logger.warning("Cannot schedule refresh: UI not ready.")
 
     def _cancel_periodic_refresh(self):
         if self.periodic_refresh_id and self.ui.app_root and self.ui.app_root.winfo_exists():
             try:
                 self.ui.app_root.after_cancel(self.periodic_refresh_id)
-                print("Cancelled periodic refresh.")
+                logger.info("Cancelled periodic refresh.")
             except Exception as e:
-                print(f"Error cancelling refresh: {e}")
+                logger.warning(f"Error cancelling refresh: {e}")
             self.periodic_refresh_id = None
 
     def _scheduled_refresh_task_wrapper(self):
-        print("Auto-refresh triggered.")
+        logger.info("Auto-refresh triggered.")
+        self.periodic_refresh_id = None
+        # The refresh schedules the next one when it finishes (or the one already running does)
         self.handle_meal_refresh()
-        if self.ui.app_root and self.ui.app_root.winfo_exists():
-            self._schedule_next_refresh()
 
     def handle_quit_application(self):
-        print("Quit application requested.")
+        logger.info("Quit application requested.")
         self._cleanup()
         if self.ui:
             self.ui.quit_main_loop()
@@ -330,85 +645,119 @@ class OdiFinderApp:
             self.ui.withdraw_main_window()
             return
         if self.ui.withdraw_main_window():
-            if self.system_tray_icon and getattr(self.system_tray_icon, 'visible', False):
-                return
             try:
-                if self.system_tray_icon:
-                    self.system_tray_icon.stop()
-                image = Image.open(self.icon_path)
-                menu = pystray.Menu(
-                    pystray.MenuItem("Show", self.handle_show_window_from_tray, default=True),
-                    pystray.MenuItem("Exit", self.handle_exit_from_tray)
-                )
-                self.system_tray_icon = pystray.Icon("odiFinder", image, "odiFinder", menu)
-                import threading
-                threading.Thread(target=self.system_tray_icon.run, daemon=True).start()
-                print("System tray icon started.")
+                self._show_tray_icon()
             except Exception as e:
-                print(f"Failed to create/run system tray icon: {e}")
+                logger.warning(f"Failed to create/run system tray icon: {e}")
                 self.ui.show_message(type="error", title="Tray Error", message=f"Could not minimize to tray: {e}")
                 self.ui.deiconify_and_focus_main_window()
 
+    def _show_tray_icon(self):
+        """
+        The tray icon and its thread are created on the first minimize and live until exit; later
+        minimizes only make the icon visible again, so minimizing for days does not pile up icons
+        and threads.
+        """
+        self._tray_icon_wanted = True
+        if self.system_tray_icon is not None:
+            self.system_tray_icon.visible = True
+            logger.info("System tray icon shown.")
+            return
+        import pystray
+        from PIL import Image
+        # Menu actions run on the tray thread; Tk may only be used from the main thread
+        menu = pystray.Menu(
+            pystray.MenuItem("Show", lambda: self.ui.post_to_main_thread(self.handle_show_window_from_tray), default=True),
+            pystray.MenuItem("Exit", lambda: self.ui.post_to_main_thread(self.handle_exit_from_tray))
+        )
+        self.system_tray_icon = pystray.Icon("odiFinder", Image.open(self.icon_path), "odiFinder", menu)
+        self._tray_thread = threading.Thread(target=self.system_tray_icon.run, kwargs={'setup': self._on_tray_icon_ready},
+                                             name="odiTray", daemon=True)
+        self._tray_thread.start()
+        logger.info("System tray icon started.")
+
+    def _on_tray_icon_ready(self, icon: "pystray.Icon"):
+        # The window may have been shown again before the tray thread got here
+        icon.visible = self._tray_icon_wanted
+
+    def _stop_tray_icon(self):
+        if self.system_tray_icon is None:
+            return
+        try:
+            self.system_tray_icon.stop()
+        except Exception as e:
+            logger.warning(f"Error stopping tray icon: {e}")
+        if self._tray_thread is not None:
+            self._tray_thread.join(timeout=2)
+        self.system_tray_icon = None
+        self._tray_thread = None
+
     def handle_show_window_from_tray(self):
-        if self.system_tray_icon and getattr(self.system_tray_icon, 'visible', False):
+        self._tray_icon_wanted = False
+        if self.system_tray_icon is not None and self.system_tray_icon.visible:
             try:
-                self.system_tray_icon.stop()
+                self.system_tray_icon.visible = False
             except Exception as e:
-                print(f"Error stopping tray icon: {e}")
-        self.system_tray_icon = None
+                logger.warning(f"Error hiding tray icon: {e}")
         self.ui.deiconify_and_focus_main_window()
-        print("Application window shown from tray.")
+        logger.info("Application window shown from tray.")
 
     def handle_exit_from_tray(self):
-        print("Exit requested from tray.")
-        if self.system_tray_icon:
-            try:
-                self.system_tray_icon.stop()
-            except Exception as e:
-                print(f"Error stopping tray icon on exit: {e}")
-            self.system_tray_icon = None
+        logger.info("Exit requested from tray.")
+        self._stop_tray_icon()
         self.handle_quit_application()
 
     def handle_open_debug_console(self):
         if self.ui:
             self.ui.open_debug_console(self._get_debug_console_context)
         else:
-            print("Cannot open debug console: UI not initialized.")
+            logger.warning("Cannot open debug console: UI not initialized.")
 
     def _cleanup(self):
         if self._cleanup_called_flag:
             return
         self._cleanup_called_flag = True
-        print("Application cleanup initiated...")
+        logger.info("Application cleanup initiated...")
         self._cancel_periodic_refresh()
-        if self.system_tray_icon:
-            try:
-                if getattr(self.system_tray_icon, 'visible', False):
-                    self.system_tray_icon.stop()
-            except Exception as e:
-                print(f"Error stopping system tray icon during cleanup: {e}")
-            self.system_tray_icon = None
+        self.refresh_worker.stop()
+        if 'network' in sys.modules:
+            sys.modules['network'].shutdown_parse_pool()
+        if self.session_manager is not None:
+            self.session_manager.close()
+        if self.history_store is not None:
+            self.history_store.close()
+        if self.notification_dispatcher is not None:
+            self.notification_dispatcher.close(timeout=2)
+        if self.fanout_subscriber is not None:
+            self.fanout_subscriber.stop()
+        if self.fanout_server is not None:
+            self.fanout_server.stop()
+        # Writes a change still waiting for its debounce delay
+        self.settings.close()
+        # The icon's thread runs while the icon is hidden too
+        self._stop_tray_icon()
         if self.ui and self.ui.app_root and self.ui.app_root.winfo_exists():
-            print("Main UI window exists, attempting to destroy.")
+            logger.info("Main UI window exists, attempting to destroy.")
             try:
                 self.ui.destroy_main_window()
             except Exception as e:
-                print(f"Error destroying main UI window during cleanup: {e}")
+                logger.warning(f"Error destroying main UI window during cleanup: {e}")
         elif self.ui and self.ui.login_window and self.ui.login_window.winfo_exists():
-            print("Login UI window exists, attempting to destroy.")
+            logger.info("Login UI window exists, attempting to destroy.")
             try:
                 self.ui.close_login_window()
             except Exception as e:
-                print(f"Error destroying login UI window during cleanup: {e}")
-        print("Application cleanup finished.")
+                logger.warning(f"Error destroying login UI window during cleanup: {e}")
+        logger.info("Application cleanup finished.")
 
     def _get_debug_console_context(self) -> Dict[str, Any]:
         def _debug_target_texts_updater(new_list):
             if isinstance(new_list, list):
                 self.target_texts = [str(item).strip() for item in new_list if str(item).strip()]
+                self._rebuild_target_matcher()
                 self._save_settings()
                 print(f"DebugConsole: target_texts updated and saved: {self.target_texts}")
-                self.handle_meal_refresh()
+                self.handle_meal_refresh(rerun_if_busy=True)
             else:
                 print("DebugConsole Error: Please provide a list for set_target_texts.")
         context = {
@@ -416,32 +765,43 @@ class OdiFinderApp:
             'get_settings': lambda: self.settings,
             'set_target_texts': _debug_target_texts_updater,
             'run_refresh': self.handle_meal_refresh,
+            'history': self._get_history_store,
             'get_vars': lambda: {
                 "username": self.username,
                 "current_theme": self.ui.current_theme_name if self.ui else 'N/A',
                 "notifications": self.notifications_enabled,
                 "city_id": self.current_city_id,
+                "city_ids": self.city_ids,
                 "refresh_interval_ms": self.REFRESH_INTERVAL_MS,
-                "previously_found_meals": self.previously_found_meal_names,
+                "poll_scheduler": self.poll_scheduler.get_stats(),
+                "previously_found_meals": self.snapshot_differ.restaurant_names(),
                 "session_active": bool(self.session),
+                "refresh_in_progress": self.refresh_worker.is_busy(),
+                "page_cache": sys.modules['network'].get_cache_stats() if 'network' in sys.modules else {},
+                "search_index": self.search_index.get_stats() if self.search_index else None,
+                "requests": sys.modules['network'].get_request_stats() if 'network' in sys.modules else {},
+                "refresh_metrics": metrics.recorder.summary(),
+                "history": self.history_store.get_stats() if self.history_store else None,
+                "notifications_dispatched": self.notification_dispatcher.get_stats() if self.notification_dispatcher else None,
+                "fanout_server": self.fanout_server.get_stats() if self.fanout_server else None,
+                "fanout_subscriber": self.fanout_subscriber.get_stats() if self.fanout_subscriber else None,
                 "city_names_loaded": bool(self.city_names)
             }
         }
         return context
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = OdiFinderApp()
     try:
         app.run()
     except KeyboardInterrupt:
-        print("\nProgram terminated by user (Ctrl+C).")
+        logger.info("Program terminated by user (Ctrl+C).")
     except SystemExit:
-        print("Program exited via SystemExit.")
+        logger.info("Program exited via SystemExit.")
     except Exception as e:
-        print(f"A critical unhandled error occurred: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"A critical unhandled error occurred: {e}")
     finally:
-        print("Top-level finally: Ensuring cleanup.")
+        logger.info("Top-level finally: Ensuring cleanup.")
         app._cleanup()
-        print("odiFinder application has shut down.")
\ No newline at end of file
+        logger.info("odiFinder application has shut down.")
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Caches that let an unchanged student page skip parsing and matching.
+
+- Page level: the ETag / Last-Modified validators and a digest of the body of the last
+  response per URL are kept together with its parsed menu boxes. A 304 answer or an
+  identical body reuses those boxes without parsing.
+- Box level: the match result of every menu box is kept per TargetMatcher, so boxes that
+  did not change since the last poll are not folded and scanned again. Results of the last
+  MAX_MATCHERS matchers are kept side by side, so polling several watch lists (profiles.py)
+  against the same pages does not throw away each other's results.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from parsing import MenuBox
+
+MAX_BOX_ENTRIES = 50000
+MAX_MATCHERS = 16
+
+
+class CachedPage(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    digest: bytes
+    menu_boxes: List[MenuBox]
+
+
+def body_digest(body: bytes) -> bytes:
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+class PageCache:
+    def __init__(self, max_box_entries: int = MAX_BOX_ENTRIES):
+        self._lock = threading.Lock()
+        self._pages: Dict[str, CachedPage] = {}
+        # Matcher -> its box match results, least recently used first
+        self._box_matches: "OrderedDict[Any, Dict[MenuBox, Tuple[FrozenSet[int], int]]]" = OrderedDict()
+        self._max_box_entries = max_box_entries
+        self._stats = {'not_modified': 0, 'page_hits': 0, 'page_misses': 0, 'box_hits': 0, 'box_misses': 0}
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Returns If-None-Match / If-Modified-Since headers for url if the server sent validators before."""
+        with self._lock:
+            cached = self._pages.get(url)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+        return headers
+
+    def lookup(self, url: str, not_modified: bool, digest: Optional[bytes]) -> Optional[List[MenuBox]]:
+        """Returns the cached boxes of url if the server answered 304 or the body digest is unchanged."""
+        with self._lock:
+            cached = self._pages.get(url)
+            if cached is not None and not_modified:
+                self._stats['not_modified'] += 1
+                return cached.menu_boxes
+            if cached is not None and digest is not None and digest == cached.digest:
+                self._stats['page_hits'] += 1
+                return cached.menu_boxes
+            self._stats['page_misses'] += 1
+            return None
+
+    def menu_boxes(self, url: str) -> Optional[List[MenuBox]]:
+        """The boxes of the last stored page of url, without counting a lookup."""
+        with self._lock:
+            cached = self._pages.get(url)
+        return cached.menu_boxes if cached is not None else None
+
+    def store(self, url: str, etag: Optional[str], last_modified: Optional[str], digest: bytes, menu_boxes: List[MenuBox]):
+        with self._lock:
+            self._pages[url] = CachedPage(etag, last_modified, digest, menu_boxes)
+
+    def box_matches_for(self, matcher) -> Dict[MenuBox, Tuple[FrozenSet[int], int]]:
+        """
+        Returns the box -> (matched target indices, available count) dict for matcher.
+        The dict is reset when it grows past max_box_entries; a new watch list gets a new matcher
+        and so a new dict, and the least recently used one is dropped beyond MAX_MATCHERS.
+        """
+        with self._lock:
+            box_matches = self._box_matches.get(matcher)
+            if box_matches is None or len(box_matches) > self._max_box_entries:
+                box_matches = self._box_matches[matcher] = {}
+                while len(self._box_matches) > MAX_MATCHERS:
+                    self._box_matches.popitem(last=False)
+            self._box_matches.move_to_end(matcher)
+            return box_matches
+
+    def count_box_lookups(self, hits: int, misses: int):
+        with self._lock:
+            self._stats['box_hits'] += hits
+            self._stats['box_misses'] += misses
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._box_matches.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats['cached_pages'] = len(self._pages)
+            stats['cached_boxes'] = sum(len(box_matches) for box_matches in self._box_matches.values())
+            stats['cached_matchers'] = len(self._box_matches)
+        page_lookups = stats['not_modified'] + stats['page_hits'] + stats['page_misses']
+        box_lookups = stats['box_hits'] + stats['box_misses']
+        stats['page_hit_rate'] = round((stats['not_modified'] + stats['page_hits']) / page_lookups, 3) if page_lookups else 0.0
+        stats['box_hit_rate'] = round(stats['box_hits'] / box_lookups, 3) if box_lookups else 0.0
+        return stats
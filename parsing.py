@@ -0,0 +1,296 @@
+"""
+HTML parsing backends for the getodi student page.
+
+Every backend only extracts the div.menu-box elements of the page and returns the same
+MenuBox records, so callers can switch to whichever backend is installed:
+
+- selectolax: lexbor based, fastest (pip install selectolax)
+- lxml: C parser with XPath lookups (pip install lxml)
+- bs4-strainer: BeautifulSoup that only builds the menu-box subtrees (SoupStrainer)
+- bs4: BeautifulSoup over the whole page, the original reference implementation
+"""
+
+import logging
+from functools import lru_cache
+from html.parser import HTMLParser
+from importlib.util import find_spec
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Strings inside these tags are not part of BeautifulSoup's get_text() output
+_NON_TEXT_TAGS = ('script', 'style', 'template')
+
+
+class MenuBox(NamedTuple):
+    """Text extracted from one div.menu-box, stripped like BeautifulSoup's get_text(strip=True)."""
+    restaurant: str
+    title: str
+    details: str
+    full_text: str  # every string of the box joined with single spaces
+
+
+def _has_menu_box_class(class_value) -> bool:
+    if not class_value:
+        return False
+    classes = class_value.split() if isinstance(class_value, str) else class_value
+    return 'menu-box' in classes
+
+
+def _parse_with_bs4(html: str, strain: bool = False) -> List[MenuBox]:
+    from bs4 import BeautifulSoup, SoupStrainer, Tag
+    # The strainer sees the raw class attribute, so "card menu-box" has to be split here
+    parse_only = SoupStrainer('div', class_=_has_menu_box_class) if strain else None
+    soup = BeautifulSoup(html, 'html.parser', parse_only=parse_only)
+    menu_boxes: List[MenuBox] = []
+    for menu_box in soup.select('div.menu-box'):
+        if not isinstance(menu_box, Tag):
+            continue
+        restaurant_tag = menu_box.select_one('div.menu-restaurant')
+        title_tag = menu_box.select_one('div.menu-title')
+        details_tag = menu_box.select_one('div.menu-details')
+        menu_boxes.append(MenuBox(
+            restaurant_tag.get_text(strip=True) if restaurant_tag else "",
+            title_tag.get_text(strip=True) if title_tag else "",
+            details_tag.get_text(strip=True) if details_tag else "",
+            menu_box.get_text(" ", strip=True),
+        ))
+    return menu_boxes
+
+
+def _parse_with_bs4_strainer(html: str) -> List[MenuBox]:
+    return _parse_with_bs4(html, strain=True)
+
+
+def _lxml_class_xpath(prefix: str, class_name: str) -> str:
+    return f"{prefix}div[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+
+_lxml_xpaths: Dict[str, Callable] = {}
+
+
+def _lxml_strings(element):
+    """Yields the text nodes of an lxml subtree in document order, skipping comments and script/style."""
+    if isinstance(element.tag, str) and element.tag not in _NON_TEXT_TAGS:
+        if element.text:
+            yield element.text
+        for child in element:
+            yield from _lxml_strings(child)
+            if child.tail:
+                yield child.tail
+
+
+def _lxml_text(element, separator: str = "") -> str:
+    if element is None:
+        return ""
+    return separator.join(stripped for stripped in (text.strip() for text in _lxml_strings(element)) if stripped)
+
+
+def _compile_lxml_xpaths():
+    from lxml import etree
+    if not _lxml_xpaths:
+        _lxml_xpaths['menu-box'] = etree.XPath(_lxml_class_xpath('//', 'menu-box'))
+        for class_name in ('menu-restaurant', 'menu-title', 'menu-details'):
+            _lxml_xpaths[class_name] = etree.XPath(_lxml_class_xpath('.//', class_name))
+
+
+def _lxml_first(element, class_name):
+    found = _lxml_xpaths[class_name](element)
+    return found[0] if found else None
+
+
+def _lxml_menu_box(element) -> MenuBox:
+    return MenuBox(
+        _lxml_text(_lxml_first(element, 'menu-restaurant')),
+        _lxml_text(_lxml_first(element, 'menu-title')),
+        _lxml_text(_lxml_first(element, 'menu-details')),
+        _lxml_text(element, " "),
+    )
+
+
+def _parse_with_lxml(html: str) -> List[MenuBox]:
+    from lxml import etree, html as lxml_html
+    _compile_lxml_xpaths()
+    try:
+        root = lxml_html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        return []
+    return [_lxml_menu_box(menu_box) for menu_box in _lxml_xpaths['menu-box'](root)]
+
+
+def _parse_with_selectolax(html: str) -> List[MenuBox]:
+    from selectolax.lexbor import LexborHTMLParser
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(list(_NON_TEXT_TAGS))
+
+    def _text(node, separator=""):
+        if node is None:
+            return ""
+        # selectolax keeps empty strings between separators, so split on a marker and drop them
+        return separator.join(filter(None, node.text(deep=True, separator="\x00", strip=True).split("\x00")))
+
+    return [
+        MenuBox(
+            _text(menu_box.css_first('div.menu-restaurant')),
+            _text(menu_box.css_first('div.menu-title')),
+            _text(menu_box.css_first('div.menu-details')),
+            _text(menu_box, " "),
+        )
+        for menu_box in tree.css('div.menu-box')
+    ]
+
+
+# Backend name -> (parse function, module that must be importable), fastest first
+PARSER_BACKENDS: Dict[str, tuple] = {
+    'selectolax': (_parse_with_selectolax, 'selectolax'),
+    'lxml': (_parse_with_lxml, 'lxml'),
+    'bs4-strainer': (_parse_with_bs4_strainer, 'bs4'),
+    'bs4': (_parse_with_bs4, 'bs4'),
+}
+
+
+@lru_cache(maxsize=None)
+def available_backends() -> tuple:
+    """Returns the names of the installed backends, fastest first."""
+    return tuple(name for name, (_, module_name) in PARSER_BACKENDS.items() if find_spec(module_name) is not None)
+
+
+def get_default_backend() -> str:
+    backends = available_backends()
+    if not backends:
+        raise ImportError("No HTML parser available. Install beautifulsoup4, lxml or selectolax.")
+    return backends[0]
+
+
+def parse_menu_boxes(html: str, backend: Optional[str] = None) -> List[MenuBox]:
+    """
+    Extracts every div.menu-box of a student page.
+    backend picks a parser by name; None or an unavailable backend falls back to the fastest installed one.
+    """
+    if backend not in PARSER_BACKENDS or backend not in available_backends():
+        if backend:
+            logger.warning(f"Parser backend '{backend}' is not available. Using the default backend.")
+        backend = get_default_backend()
+    parse_function, _ = PARSER_BACKENDS[backend]
+    return parse_function(html)
+
+
+class _StdlibMenuBoxStreamParser(HTMLParser):
+    """Incremental html.parser based extractor, used when lxml is not installed."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.completed: List[MenuBox] = []
+        self._box_depth = 0  # open divs inside the current menu box, 0 when outside one
+        self._skip_depth = 0  # open script/style/template tags inside the current box
+        self._strings: List[str] = []
+        self._sections: Dict[str, List[str]] = {}
+        self._open_section: Optional[str] = None
+        self._section_depth = 0
+        # handle_data() may deliver one text node in pieces when it spans two fed chunks
+        self._pending_data: List[str] = []
+
+    def _flush_data(self):
+        if not self._pending_data:
+            return
+        stripped = "".join(self._pending_data).strip()
+        self._pending_data = []
+        if stripped:
+            self._strings.append(stripped)
+            if self._open_section is not None:
+                self._sections[self._open_section].append(stripped)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_data()
+        if tag in _NON_TEXT_TAGS:
+            if self._box_depth:
+                self._skip_depth += 1
+            return
+        if tag != 'div':
+            return
+        classes = (dict(attrs).get('class') or '').split()
+        if not self._box_depth:
+            if 'menu-box' in classes:
+                self._box_depth = 1
+                self._strings, self._sections, self._open_section = [], {}, None
+            return
+        self._box_depth += 1
+        if self._open_section is None:
+            for section in ('menu-restaurant', 'menu-title', 'menu-details'):
+                if section in classes and section not in self._sections:
+                    self._open_section, self._section_depth = section, self._box_depth
+                    self._sections[section] = []
+                    break
+
+    def handle_endtag(self, tag):
+        self._flush_data()
+        if tag in _NON_TEXT_TAGS:
+            if self._skip_depth:
+                self._skip_depth -= 1
+            return
+        if tag != 'div' or not self._box_depth:
+            return
+        if self._open_section is not None and self._box_depth == self._section_depth:
+            self._open_section = None
+        self._box_depth -= 1
+        if not self._box_depth:
+            def _section_text(name):
+                return "".join(self._sections.get(name, ()))
+            self.completed.append(MenuBox(_section_text('menu-restaurant'), _section_text('menu-title'),
+                                          _section_text('menu-details'), " ".join(self._strings)))
+
+    def handle_data(self, data):
+        if self._box_depth and not self._skip_depth:
+            self._pending_data.append(data)
+
+    def handle_comment(self, data):
+        self._flush_data()
+
+
+class _LxmlMenuBoxStreamParser:
+    """Incremental lxml based extractor; produces the same records as the lxml backend."""
+
+    def __init__(self):
+        from lxml import etree
+        _compile_lxml_xpaths()
+        self._parser = etree.HTMLPullParser(events=('end',), tag='div')
+        self.completed: List[MenuBox] = []
+
+    def feed(self, text: str):
+        self._parser.feed(text)
+        self._collect()
+
+    def close(self):
+        try:
+            self._parser.close()
+        except Exception:
+            pass  # a truncated page still yields the boxes that were complete
+        self._collect()
+
+    def _collect(self):
+        for _, element in self._parser.read_events():
+            if 'menu-box' in (element.get('class') or '').split():
+                self.completed.append(_lxml_menu_box(element))
+
+
+class MenuBoxStream:
+    """
+    Parses a student page fed in chunks and hands out every menu box as soon as its closing tag arrives.
+    Uses lxml's pull parser when installed, otherwise the standard library's html.parser.
+    """
+
+    def __init__(self):
+        self._parser = _LxmlMenuBoxStreamParser() if find_spec('lxml') is not None else _StdlibMenuBoxStreamParser()
+
+    def feed(self, text: str) -> List[MenuBox]:
+        """Feeds the next chunk of the page and returns the menu boxes completed by it."""
+        self._parser.feed(text)
+        return self._drain()
+
+    def close(self) -> List[MenuBox]:
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> List[MenuBox]:
+        completed, self._parser.completed = self._parser.completed, []
+        return completed
@@ -0,0 +1,144 @@
+"""
+Chooses the delay before the next automatic refresh.
+
+The configured refresh interval is the starting point. It is then shortened or stretched by:
+
+- the hour of the week: slots in which the history (history.HistoryStore.slot_activity) saw meals
+  on at least half of the scanned days are polled twice as often, slots that were scanned on
+  several days without ever showing a meal (e.g. at night) half as often, and a refresh is moved
+  up to the start of the next busy slot. Until a weekday/hour slot has been scanned on
+  MIN_SCANNED_DAYS days, the same hour on all weekdays together decides
+- a run of refreshes that changed nothing: after IDLE_STREAK_START identical results in a row
+  every further one stretches the delay by IDLE_BACKOFF_FACTOR
+- errors: the retry starts at the floor and doubles with every consecutive failure
+
+Every delay gets +-jitter so polls do not line up with other clients, and always stays within
+the floor and ceiling from settings ("refresh_interval_min" / "refresh_interval_max", minutes).
+With "adaptive_polling": false the plain interval is used (errors still back off), within the same bounds.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+REFRESH_FLOOR_MINUTES = 1
+REFRESH_CEILING_MINUTES = 15
+POLL_JITTER = 0.1
+BUSY_SLOT_FACTOR = 0.5
+QUIET_SLOT_FACTOR = 2.0
+BUSY_SLOT_MEAL_RATE = 0.5
+MIN_SCANNED_DAYS = 3
+IDLE_STREAK_START = 5
+IDLE_BACKOFF_FACTOR = 1.25
+SLOT_ACTIVITY_MAX_AGE_SECONDS = 6 * 60 * 60
+
+OUTCOME_CHANGED = 'changed'
+OUTCOME_UNCHANGED = 'unchanged'
+OUTCOME_ERROR = 'error'
+
+Slot = Tuple[int, int]
+
+
+class AdaptivePollScheduler:
+    """Thread-safe: refresh outcomes are recorded from the refresh worker, delays are asked for by the UI thread."""
+
+    def __init__(self, interval_seconds: float, floor_seconds: float, ceiling_seconds: float, jitter: float = POLL_JITTER,
+                 adaptive: bool = True, rng: Optional[random.Random] = None):
+        self._lock = threading.Lock()
+        self.interval_seconds = interval_seconds
+        self.floor_seconds = floor_seconds
+        self.ceiling_seconds = max(ceiling_seconds, floor_seconds)
+        self.jitter = jitter
+        self.adaptive = adaptive
+        self._rng = rng or random.Random()
+        self._slot_activity: Dict[Slot, Tuple[int, int]] = {}
+        self._hour_activity: Dict[int, Tuple[int, int]] = {}
+        self._slot_activity_loaded_at: Optional[float] = None
+        self._consecutive_errors = 0
+        self._unchanged_streak = 0
+        self.last_reason = "interval"
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], interval_minutes: Optional[float] = None) -> "AdaptivePollScheduler":
+        interval = 60 * float(interval_minutes if interval_minutes is not None else settings.get('refresh_interval', 3))
+        floor = 60 * float(settings.get('refresh_interval_min', min(REFRESH_FLOOR_MINUTES, interval / 60)))
+        ceiling = 60 * float(settings.get('refresh_interval_max', max(REFRESH_CEILING_MINUTES, 4 * interval / 60)))
+        return cls(interval, floor, ceiling, jitter=float(settings.get('poll_jitter', POLL_JITTER)),
+                   adaptive=settings.get('adaptive_polling', True))
+
+    def set_interval(self, interval_seconds: float):
+        """A new base interval from the UI; the floor and ceiling are widened to include it."""
+        with self._lock:
+            self.interval_seconds = interval_seconds
+            self.floor_seconds = min(self.floor_seconds, interval_seconds)
+            self.ceiling_seconds = max(self.ceiling_seconds, interval_seconds)
+
+    def record(self, outcome: str):
+        """Feeds back how a refresh went: OUTCOME_CHANGED, OUTCOME_UNCHANGED or OUTCOME_ERROR."""
+        with self._lock:
+            if outcome == OUTCOME_ERROR:
+                self._consecutive_errors += 1
+                return
+            self._consecutive_errors = 0
+            self._unchanged_streak = self._unchanged_streak + 1 if outcome == OUTCOME_UNCHANGED else 0
+
+    def slot_activity_is_stale(self) -> bool:
+        with self._lock:
+            loaded_at = self._slot_activity_loaded_at
+        return self.adaptive and (loaded_at is None or time.monotonic() - loaded_at > SLOT_ACTIVITY_MAX_AGE_SECONDS)
+
+    def set_slot_activity(self, slot_activity: Dict[Slot, Tuple[int, int]]):
+        """(weekday, hour) -> (days with meals, days scanned), see HistoryStore.slot_activity()."""
+        hour_activity: Dict[int, Tuple[int, int]] = {}
+        for (_, hour), (days_with_meals, days_scanned) in slot_activity.items():
+            previous = hour_activity.get(hour, (0, 0))
+            hour_activity[hour] = (previous[0] + days_with_meals, previous[1] + days_scanned)
+        with self._lock:
+            self._slot_activity = dict(slot_activity)
+            self._hour_activity = hour_activity
+            self._slot_activity_loaded_at = time.monotonic()
+
+    def _slot_factor(self, slot: Slot) -> float:
+        days_with_meals, days_scanned = self._slot_activity.get(slot, (0, 0))
+        if days_scanned < MIN_SCANNED_DAYS:
+            days_with_meals, days_scanned = self._hour_activity.get(slot[1], (0, 0))
+        if days_scanned < MIN_SCANNED_DAYS:
+            return 1.0
+        if days_with_meals == 0:
+            return QUIET_SLOT_FACTOR
+        return BUSY_SLOT_FACTOR if days_with_meals / days_scanned >= BUSY_SLOT_MEAL_RATE else 1.0
+
+    def next_delay(self, now: Optional[datetime] = None) -> float:
+        """Seconds until the next refresh; the reason is left in last_reason for logging."""
+        now = now or datetime.now()
+        with self._lock:
+            if self._consecutive_errors:
+                delay = self.floor_seconds * 2 ** (self._consecutive_errors - 1)
+                reason = f"error backoff ({self._consecutive_errors} failed)"
+            elif not self.adaptive:
+                delay, reason = self.interval_seconds, "interval"
+            else:
+                factor = self._slot_factor((now.weekday(), now.hour))
+                reason = {BUSY_SLOT_FACTOR: "busy hour", QUIET_SLOT_FACTOR: "quiet hour"}.get(factor, "interval")
+                delay = self.interval_seconds * factor
+                idle_refreshes = self._unchanged_streak - IDLE_STREAK_START
+                if idle_refreshes > 0:
+                    delay *= IDLE_BACKOFF_FACTOR ** idle_refreshes
+                    reason += f", {self._unchanged_streak} unchanged"
+                next_hour = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+                until_next_hour = (next_hour - now).total_seconds()
+                if until_next_hour < delay and self._slot_factor((next_hour.weekday(), next_hour.hour)) < factor:
+                    delay, reason = until_next_hour, "busier hour starts"
+            delay *= 1 + self._rng.uniform(-self.jitter, self.jitter)
+            self.last_reason = reason
+            return min(max(delay, self.floor_seconds), self.ceiling_seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            busy = sorted(slot for slot in ((weekday, hour) for weekday in range(7) for hour in range(24))
+                          if self._slot_factor(slot) == BUSY_SLOT_FACTOR)
+            return {'adaptive': self.adaptive, 'interval_seconds': self.interval_seconds, 'floor_seconds': self.floor_seconds,
+                    'ceiling_seconds': self.ceiling_seconds, 'consecutive_errors': self._consecutive_errors,
+                    'unchanged_streak': self._unchanged_streak, 'busy_slots': busy, 'last_reason': self.last_reason}
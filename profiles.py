@@ -0,0 +1,214 @@
+"""
+Polling profiles: several students, each with their own getodi.com account, cities and watch list,
+served by one poller (e.g. headless.py on a shared kiosk).
+
+"profiles" in settings.json:
+
+    "profiles": [
+        {"name": "ayse", "username": "ayse@example.com", "restaurants": ["Kıraathane"], "city_ids": ["35"],
+         "notification_sinks": ["webhook"], "notification_webhook_url": "https://example.com/hook"},
+        {"name": "mert", "username": "mert@example.com", "restaurants": ["Burger"], "city_ids": ["35", "34"]}
+    ]
+
+Passwords are never stored in the file: each comes from the environment variable
+ODIFINDER_PASSWORD_<NAME> (the profile name upper-cased, anything but letters and digits as _), or
+the variable named in "password_env".
+
+Every cycle downloads and parses each city page once, however many profiles watch the city, using
+the session of the first logged-in account among them (the student page lists the same menus for
+every student). Every profile's matcher then runs against those parsed boxes, so adding a profile
+adds matching only, and no request or parse unless it brings a city nobody else watches. An
+account logs in again only when its session is used and found logged out; if it cannot, the next
+account watching the same cities takes over for that cycle.
+"""
+
+import logging
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import network
+from matcher import TargetMatcher
+from meal_record import MealRecord, scan_timestamp
+from page_cache import PageCache
+from parsing import MenuBox
+from session_manager import SessionManager
+from snapshot_diff import SnapshotDiffer
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_ENV_PREFIX = "ODIFINDER_PASSWORD_"
+# Per-profile overrides of the notification settings (see notifier.create_dispatcher)
+PROFILE_NOTIFICATION_KEYS = ('notification_sinks', 'notification_webhook_url', 'notification_merge_seconds',
+                             'notification_restaurant_interval_seconds', 'notification_dedupe_seconds')
+
+
+def profile_password_env(name: str) -> str:
+    return PASSWORD_ENV_PREFIX + re.sub(r"[^A-Z0-9]", "_", name.upper())
+
+
+class Profile:
+    def __init__(self, name: str, username: str, restaurants: List[str], city_ids: List[str],
+                 notifications_enabled: bool = True, password_env: Optional[str] = None,
+                 notification_settings: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.username = username
+        self.target_matcher = TargetMatcher(restaurants or [""])
+        self.city_ids = city_ids
+        self.notifications_enabled = notifications_enabled
+        self.password_env = password_env or profile_password_env(name)
+        self.notification_settings = notification_settings or {}
+        self.snapshot_differ = SnapshotDiffer()
+        # Set by the caller when this profile notifies somewhere else than the shared dispatcher
+        self.dispatcher = None
+
+
+def load_profiles(settings: Dict[str, Any]) -> List[Profile]:
+    """The profiles of settings["profiles"]; entries without a name or username, or with a repeated name, are skipped."""
+    default_city_id = settings.get('city_id', "35")
+    default_city_ids = settings.get('city_ids', [default_city_id]) or [default_city_id]
+    profiles: List[Profile] = []
+    names: Set[str] = set()
+    for entry in settings.get('profiles') or []:
+        name, username = entry.get('name'), entry.get('username')
+        if not isinstance(name, str) or not name or not isinstance(username, str) or not username:
+            logger.warning(f"Skipping profile without a name or username: {entry!r}")
+            continue
+        if name in names:
+            logger.warning(f"Skipping second profile named {name!r}.")
+            continue
+        names.add(name)
+        city_ids = list(dict.fromkeys(str(city_id).zfill(2) for city_id in entry.get('city_ids') or default_city_ids))
+        profiles.append(Profile(name, username, list(entry.get('restaurants') or [""]), city_ids,
+                                entry.get('notifications_enabled', True), entry.get('password_env'),
+                                {key: entry[key] for key in PROFILE_NOTIFICATION_KEYS if key in entry}))
+    return profiles
+
+
+class _Account:
+    def __init__(self, username: str, password: str, session_manager: SessionManager):
+        self.username = username
+        self.password = password
+        self.session_manager = session_manager
+        self.session = None
+        self.rejected = False  # a wrong password is not tried again
+
+
+class ProfilePoller:
+    """
+    Logs in one session per account and polls the cities of all profiles together.
+    poll() runs on one thread at a time (the refresh loop); get_stats() may be called from any.
+    """
+
+    def __init__(self, profiles: List[Profile], passwords: Dict[str, str], cookie_path_for: Callable[[str], Optional[str]]):
+        """passwords maps profile names to passwords; profiles without one are left out."""
+        self.profiles = [profile for profile in profiles if passwords.get(profile.name)]
+        self._accounts: Dict[str, _Account] = {}
+        for profile in self.profiles:
+            if profile.username not in self._accounts:
+                self._accounts[profile.username] = _Account(profile.username, passwords[profile.name],
+                                                            SessionManager(cookie_path_for(profile.username)))
+        self._page_cache = PageCache()
+        self._lock = threading.Lock()
+        self._stats = {'cycles': 0, 'page_fetches': 0, 'matches': 0, 'relogins': 0}
+
+    @property
+    def usernames(self) -> List[str]:
+        return list(self._accounts)
+
+    def profile_names(self, username: str) -> List[str]:
+        return [profile.name for profile in self.profiles if profile.username == username]
+
+    def login(self, username: str, reuse_cookies: bool = True) -> Optional[network.OdiError]:
+        """Logs one account in; returns why it failed, or None."""
+        account = self._accounts[username]
+        account.session = account.session_manager.login(account.username, account.password, reuse_cookies=reuse_cookies)
+        error = account.session_manager.last_error
+        if isinstance(error, network.AuthenticationError):
+            account.rejected = True
+        return error if account.session is None else None
+
+    def login_all(self) -> Dict[str, Optional[network.OdiError]]:
+        return {username: self.login(username) for username in self._accounts}
+
+    @property
+    def all_rejected(self) -> bool:
+        return all(account.rejected for account in self._accounts.values())
+
+    def _accounts_watching(self, city_id: str) -> List[_Account]:
+        usernames = dict.fromkeys(profile.username for profile in self.profiles if city_id in profile.city_ids)
+        return [self._accounts[username] for username in usernames]
+
+    def _fetch(self, account: _Account, city_ids: List[str], parser_backend: Optional[str]) -> Optional[Dict[str, Optional[List[MenuBox]]]]:
+        """The parsed pages of city_ids via account, logging in (again) as needed; None if the account cannot be used."""
+        relogin_attempted = account.session is None
+        if account.session is None and (account.rejected or self.login(account.username, reuse_cookies=False) is not None):
+            return None
+        while True:
+            try:
+                menu_boxes_by_city = network.fetch_menu_boxes_many(account.session, city_ids, parser_backend=parser_backend,
+                                                                   page_cache=self._page_cache)
+                with self._lock:
+                    self._stats['page_fetches'] += len(city_ids)
+                return menu_boxes_by_city
+            except network.SessionExpiredError as e:
+                logger.warning(f"{e} Logging in {account.username} again.")
+                account.session = None
+                if relogin_attempted or self.login(account.username, reuse_cookies=False) is not None:
+                    return None
+                relogin_attempted = True
+                with self._lock:
+                    self._stats['relogins'] += 1
+
+    def poll(self, parser_backend: Optional[str] = None) -> Dict[str, Dict[str, Optional[List[MealRecord]]]]:
+        """
+        Returns profile name -> {city id -> found meals, or None if the city could not be read}, in the
+        form of network.check_meals_many() per profile. All results share one scan time.
+        """
+        scanned_at = scan_timestamp()
+        pending = list(dict.fromkeys(city_id for profile in self.profiles for city_id in profile.city_ids))
+        menu_boxes_by_city: Dict[str, Optional[List[MenuBox]]] = {}
+        tried: Set[str] = set()
+        while pending:
+            # Each city goes to the first account watching it that was not tried in this cycle yet
+            cities_by_account: Dict[str, List[str]] = {}
+            for city_id in pending:
+                account = next((account for account in self._accounts_watching(city_id)
+                                if account.username not in tried and not account.rejected), None)
+                if account is None:
+                    menu_boxes_by_city[city_id] = None
+                else:
+                    cities_by_account.setdefault(account.username, []).append(city_id)
+            pending = []
+            for username, city_ids in cities_by_account.items():
+                tried.add(username)
+                fetched = self._fetch(self._accounts[username], city_ids, parser_backend)
+                if fetched is None:
+                    pending.extend(city_ids)
+                else:
+                    menu_boxes_by_city.update(fetched)
+
+        results: Dict[str, Dict[str, Optional[List[MealRecord]]]] = {}
+        for profile in self.profiles:
+            results[profile.name] = {
+                city_id: network.match_menu_boxes(menu_boxes_by_city[city_id], profile.target_matcher, self._page_cache, scanned_at)
+                if menu_boxes_by_city.get(city_id) is not None else None
+                for city_id in profile.city_ids
+            }
+        with self._lock:
+            self._stats['cycles'] += 1
+            self._stats['matches'] += sum(len(city_results) for city_results in results.values())
+        return results
+
+    def close(self):
+        for account in self._accounts.values():
+            account.session_manager.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        stats['profiles'] = [profile.name for profile in self.profiles]
+        stats['accounts_logged_in'] = sum(1 for account in self._accounts.values() if account.session is not None)
+        stats['accounts_rejected'] = sum(1 for account in self._accounts.values() if account.rejected)
+        stats['page_cache'] = self._page_cache.get_stats()
+        return stats
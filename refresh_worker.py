@@ -0,0 +1,82 @@
+"""
+Background worker that runs meal refreshes off the Tk main thread.
+"""
+
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshWorker:
+    """
+    Runs a refresh job on a dedicated daemon thread, one job at a time.
+    request_refresh() never blocks. While a refresh is queued or running, further requests
+    are refused, so "Refresh now" and the auto-refresh timer can never overlap.
+    """
+
+    def __init__(self, job: Callable[[], None], on_finished: Optional[Callable[[], None]] = None, name: str = "odiRefreshWorker"):
+        self._job = job
+        self._on_finished = on_finished
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._busy = False
+        self._rerun_requested = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def is_busy(self) -> bool:
+        with self._lock:
+            return self._busy
+
+    def request_refresh(self, rerun_if_busy: bool = False) -> bool:
+        """
+        Queues a refresh. Returns False if one is already queued or running.
+        With rerun_if_busy=True a busy worker runs exactly one more refresh after the
+        current one instead (used when settings changed mid-refresh).
+        """
+        with self._lock:
+            if self._stopped:
+                return False
+            if self._busy:
+                if rerun_if_busy:
+                    self._rerun_requested = True
+                    return True
+                return False
+            self._busy = True
+        self._wake_event.set()
+        return True
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+        self._wake_event.set()
+
+    def _run(self):
+        while True:
+            self._wake_event.wait()
+            self._wake_event.clear()
+            with self._lock:
+                if self._stopped:
+                    return
+            while True:
+                try:
+                    self._job()
+                except Exception as e:
+                    logger.exception(f"Refresh worker job failed: {e}")
+                with self._lock:
+                    if self._rerun_requested and not self._stopped:
+                        self._rerun_requested = False
+                        continue
+                    self._busy = False
+                    break
+            if self._on_finished:
+                try:
+                    self._on_finished()
+                except Exception as e:
+                    logger.exception(f"Refresh worker on_finished callback failed: {e}")
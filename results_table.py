@@ -0,0 +1,253 @@
+"""
+Sortable meal results table that is updated row by row.
+
+The table keeps every row in a Python model (row id -> values) plus one list of (sort key, row id)
+kept in ascending order with bisect, so an update costs O(changed rows), not O(all rows):
+
+- up to VIRTUAL_ROW_THRESHOLD rows, each row is a Treeview item that is inserted, updated, moved
+  or deleted individually; scroll position and selection survive refreshes
+- above it, the Treeview only holds as many "slot" items as fit on screen and the scrollbar and
+  mouse wheel move a window over the model, so Tk never holds more than a screenful of rows
+
+Clicking a heading sorts by that column; clicking it again reverses the order.
+"""
+
+import bisect
+import tkinter as tk
+from tkinter import ttk
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from matcher import fold_for_matching
+
+COLUMNS = (
+    ("city", "City", 90),
+    ("restaurant", "Restaurant", 200),
+    ("meal", "Meal", 200),
+    ("location", "Location", 170),
+    ("count", "Available", 70),
+)
+COUNT_COLUMN = 4
+VIRTUAL_ROW_THRESHOLD = 500
+ROW_HEIGHT = 22
+STYLE_NAME = "Results.Treeview"
+NATIVE_THEMES = ("vista", "xpnative", "winnative", "aqua")
+
+RowValues = Tuple[Any, ...]
+
+
+def _sort_value(values: RowValues, column: int):
+    if column == COUNT_COLUMN:
+        return int(values[column] or 0)
+    return fold_for_matching(str(values[column]))
+
+
+class ResultsTable:
+    def __init__(self, master: tk.Misc):
+        self.frame = tk.Frame(master)
+        style = ttk.Style(master)
+        # The native Windows and macOS themes ignore Treeview colors, so the dark theme needs clam
+        if style.theme_use() in NATIVE_THEMES:
+            style.theme_use("clam")
+        style.configure(STYLE_NAME, rowheight=ROW_HEIGHT)
+        self.tree = ttk.Treeview(self.frame, columns=[name for name, _, _ in COLUMNS], show="headings",
+                                 style=STYLE_NAME, selectmode="browse")
+        for index, (name, title, width) in enumerate(COLUMNS):
+            self.tree.heading(name, text=title, command=lambda column=index: self.sort_by(column))
+            self.tree.column(name, width=width, minwidth=40, anchor=tk.E if index == COUNT_COLUMN else tk.W,
+                             stretch=index != COUNT_COLUMN)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self._rows: Dict[Hashable, RowValues] = {}
+        self._sort_keys: Dict[Hashable, tuple] = {}
+        self._order: List[Tuple[tuple, Hashable]] = []  # ascending by sort key, whatever the display order
+        self._iids: Dict[Hashable, str] = {}  # row id -> Treeview item, only when not virtual
+        self._next_iid = 0
+        self._sort_column = 1
+        self._descending = False
+        self._virtual = False
+        self._first_visible = 0
+        self._slots: List[str] = []
+        self._update_headings()
+        self.tree.bind("<Configure>", self._on_resize)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_mouse_wheel)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def row_ids(self) -> Sequence[Hashable]:
+        """The row ids in display order (for the debug console)."""
+        return list(self._display_order())
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def apply_theme(self, colors: Dict[str, str]):
+        style = ttk.Style(self.frame)
+        style.configure(STYLE_NAME, background=colors["TEXT_AREA_BG"], fieldbackground=colors["TEXT_AREA_BG"],
+                        foreground=colors["TEXT_AREA_FG"], rowheight=ROW_HEIGHT)
+        style.configure(f"{STYLE_NAME}.Heading", background=colors["WIDGET_BG"], foreground=colors["TEXT_FG"])
+        style.map(STYLE_NAME, background=[("selected", colors["SELECT_BG"])], foreground=[("selected", colors["TEXT_AREA_FG"])])
+        self.frame.configure(bg=colors["APP_BG"])
+
+    def replace_rows(self, rows: Iterable[Tuple[Hashable, RowValues]]):
+        """Replaces every row at once, e.g. when the watched cities change."""
+        self._rows = dict(rows)
+        self._rebuild_order()
+        self._render_all()
+
+    def apply_changes(self, upserts: Iterable[Tuple[Hashable, RowValues]] = (), removals: Iterable[Hashable] = ()):
+        """Inserts or updates the given rows and removes the given row ids; unknown removals are ignored."""
+        changed = False
+        for row_id in removals:
+            if row_id in self._rows:
+                self._remove(row_id)
+                changed = True
+        for row_id, values in upserts:
+            values = tuple(values)
+            if self._rows.get(row_id) != values:
+                self._upsert(row_id, values)
+                changed = True
+        if not changed:
+            return
+        if self._virtual != (len(self._rows) > VIRTUAL_ROW_THRESHOLD):
+            self._render_all()
+        elif self._virtual:
+            self._render_window()
+
+    def sort_by(self, column: int):
+        if column == self._sort_column:
+            self._descending = not self._descending
+        else:
+            self._sort_column, self._descending = column, False
+        self._rebuild_order()
+        self._update_headings()
+        if self._virtual:
+            self._first_visible = 0
+            self._render_window()
+        else:
+            for position, row_id in enumerate(self._display_order()):
+                self.tree.move(self._iids[row_id], "", position)
+
+    def _update_headings(self):
+        for index, (name, title, _) in enumerate(COLUMNS):
+            arrow = (" ▼" if self._descending else " ▲") if index == self._sort_column else ""
+            self.tree.heading(name, text=title + arrow)
+
+    def _key_for(self, row_id: Hashable, values: RowValues) -> tuple:
+        return (_sort_value(values, self._sort_column), str(row_id))
+
+    def _rebuild_order(self):
+        self._sort_keys = {row_id: self._key_for(row_id, values) for row_id, values in self._rows.items()}
+        self._order = sorted((key, row_id) for row_id, key in self._sort_keys.items())
+
+    def _display_order(self) -> Iterable[Hashable]:
+        entries = reversed(self._order) if self._descending else self._order
+        return (row_id for _, row_id in entries)
+
+    def _display_position(self, ascending_index: int) -> int:
+        return len(self._order) - 1 - ascending_index if self._descending else ascending_index
+
+    def _remove(self, row_id: Hashable):
+        key = self._sort_keys.pop(row_id)
+        del self._order[bisect.bisect_left(self._order, (key, row_id))]
+        del self._rows[row_id]
+        iid = self._iids.pop(row_id, None)
+        if iid is not None:
+            self.tree.delete(iid)
+
+    def _upsert(self, row_id: Hashable, values: RowValues):
+        is_new = row_id not in self._rows
+        key = self._key_for(row_id, values)
+        old_key = self._sort_keys.get(row_id)
+        if old_key != key:
+            if old_key is not None:
+                del self._order[bisect.bisect_left(self._order, (old_key, row_id))]
+            bisect.insort(self._order, (key, row_id))
+            self._sort_keys[row_id] = key
+        self._rows[row_id] = values
+        if self._virtual:
+            return
+        position = self._display_position(bisect.bisect_left(self._order, (key, row_id)))
+        if is_new:
+            self._iids[row_id] = self._new_iid()
+            self.tree.insert("", position, iid=self._iids[row_id], values=values)
+            return
+        self.tree.item(self._iids[row_id], values=values)
+        if old_key != key:
+            self.tree.move(self._iids[row_id], "", position)
+
+    def _new_iid(self) -> str:
+        self._next_iid += 1
+        return f"row{self._next_iid}"
+
+    def _render_all(self):
+        """Redraws the table from the model; only on replace_rows() and when switching between the two modes."""
+        self.tree.delete(*self.tree.get_children())
+        self._iids.clear()
+        self._slots = []
+        self._virtual = len(self._rows) > VIRTUAL_ROW_THRESHOLD
+        if self._virtual:
+            self.tree.configure(yscrollcommand="")
+            self.scrollbar.configure(command=self._on_scrollbar)
+            self._first_visible = min(self._first_visible, self._max_first_visible())
+            self._render_window()
+            return
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.configure(command=self.tree.yview)
+        for row_id in self._display_order():
+            self._iids[row_id] = self._new_iid()
+            self.tree.insert("", tk.END, iid=self._iids[row_id], values=self._rows[row_id])
+
+    # Virtual mode: a fixed set of slot items shows the rows from _first_visible on
+
+    def _visible_row_count(self) -> int:
+        # One row height goes to the heading
+        return max(1, self.tree.winfo_height() // ROW_HEIGHT - 1)
+
+    def _max_first_visible(self) -> int:
+        return max(0, len(self._rows) - self._visible_row_count())
+
+    def _render_window(self):
+        slot_count = min(self._visible_row_count(), len(self._rows))
+        while len(self._slots) < slot_count:
+            self._slots.append(self.tree.insert("", tk.END, values=()))
+        if len(self._slots) > slot_count:
+            self.tree.delete(*self._slots[slot_count:])
+            del self._slots[slot_count:]
+        self._first_visible = min(self._first_visible, self._max_first_visible())
+        for offset, slot in enumerate(self._slots):
+            ascending_index = self._display_position(self._first_visible + offset)
+            self.tree.item(slot, values=self._rows[self._order[ascending_index][1]])
+        total = len(self._rows) or 1
+        self.scrollbar.set(self._first_visible / total, (self._first_visible + slot_count) / total)
+
+    def _scroll_to(self, first_visible: int):
+        first_visible = max(0, min(first_visible, self._max_first_visible()))
+        if first_visible != self._first_visible:
+            self._first_visible = first_visible
+            self.tree.selection_remove(*self.tree.selection())
+            self._render_window()
+
+    def _on_scrollbar(self, action: str, amount: str, unit: Optional[str] = None):
+        if action == tk.MOVETO:
+            self._scroll_to(round(float(amount) * len(self._rows)))
+        elif action == tk.SCROLL:
+            step = self._visible_row_count() if unit == tk.PAGES else 1
+            self._scroll_to(self._first_visible + int(amount) * step)
+
+    def _on_mouse_wheel(self, event):
+        if not self._virtual:
+            return None
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self._scroll_to(self._first_visible - 3)
+        else:
+            self._scroll_to(self._first_visible + 3)
+        return "break"
+
+    def _on_resize(self, event=None):
+        if self._virtual:
+            self._render_window()
@@ -0,0 +1,110 @@
+"""
+In-memory search over every menu box of the last refreshed city pages, for the main window's filter box.
+
+Every box is indexed, not only the watched restaurants, so any restaurant on the page can be looked
+up without editing the watch list or fetching the page again. The words of a box (restaurant, menu
+title and location) are folded like the watch list (matcher.fold_for_matching: Turkish casing, ı
+and i merged) and each word maps to the numbers of the boxes that contain it. The sorted word list
+is bisected for the words starting with each typed word, so "kıraat" finds "KIRAATHANE" and a
+query is answered without scanning the boxes. Every typed word must match (AND).
+
+An index is built on the refresh thread and never changed afterwards; the UI thread only swaps it in
+and calls search().
+"""
+
+import re
+from bisect import bisect_left
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+from matcher import AVAILABLE_COUNT_PATTERN, fold_for_matching
+from meal_record import MealRecord, make_meal_record, scan_timestamp
+from parsing import MenuBox
+from snapshot_diff import meal_key
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Sorts after every word that starts with the prefix it is appended to
+_PREFIX_END = "\U0010ffff"
+
+
+def _available_count(menu_box: MenuBox) -> int:
+    match = AVAILABLE_COUNT_PATTERN.search(menu_box.full_text)
+    try:
+        return int(match.group(1)) if match else 0
+    except ValueError:
+        return 0
+
+
+class MenuSearchIndex:
+    def __init__(self, menu_boxes_by_city: Dict[str, Sequence[MenuBox]], previous: Optional["MenuSearchIndex"] = None):
+        """
+        Indexes the boxes of each city; the same menu listed twice in a city is kept once. Boxes
+        already indexed by previous (the index of the last refresh) reuse its record and words, so
+        a refresh that changed a few boxes of a big page only folds and splits those.
+        """
+        scanned_at = scan_timestamp()
+        known = previous._box_entries if previous is not None else {}
+        # Kept to tell whether a later refresh brought different pages (see is_built_from)
+        self._sources = dict(menu_boxes_by_city)
+        self._box_entries: Dict[Tuple[str, MenuBox], Tuple[MealRecord, FrozenSet[str]]] = {}
+        self._meals: List[MealRecord] = []
+        postings: Dict[str, List[int]] = {}
+        seen = set()
+        for city_id, menu_boxes in self._sources.items():
+            for menu_box in menu_boxes:
+                entry = known.get((city_id, menu_box))
+                if entry is None:
+                    # The same columns network.MealCollector shows for a watched restaurant
+                    meal = make_meal_record(menu_box.title or menu_box.restaurant, menu_box.restaurant or "No meal name available.",
+                                            menu_box.details or "No location available.", _available_count(menu_box), scanned_at, city_id)
+                    text = fold_for_matching(f"{menu_box.restaurant} {menu_box.title} {menu_box.details}")
+                    entry = (meal, frozenset(TOKEN_PATTERN.findall(text)))
+                self._box_entries[(city_id, menu_box)] = entry
+                meal, tokens = entry
+                key = meal_key(city_id, meal)
+                if key in seen:
+                    continue
+                seen.add(key)
+                number = len(self._meals)
+                self._meals.append(meal)
+                for token in tokens:
+                    postings.setdefault(token, []).append(number)
+        self._tokens = sorted(postings)
+        self._postings = [postings[token] for token in self._tokens]
+
+    def __len__(self) -> int:
+        return len(self._meals)
+
+    def is_built_from(self, menu_boxes_by_city: Dict[str, Sequence[MenuBox]]) -> bool:
+        """
+        True if the pages are the ones this index was built from. The page cache hands out the same
+        box list while a page is unchanged (304 or an identical body), so identity is enough.
+        """
+        return (self._sources.keys() == menu_boxes_by_city.keys()
+                and all(self._sources[city_id] is menu_boxes for city_id, menu_boxes in menu_boxes_by_city.items()))
+
+    def _prefix_matches(self, prefix: str) -> Set[int]:
+        start = bisect_left(self._tokens, prefix)
+        end = bisect_left(self._tokens, prefix + _PREFIX_END, start)
+        if end - start == 1:
+            return set(self._postings[start])
+        return set().union(*self._postings[start:end])
+
+    def search(self, query: str) -> List[MealRecord]:
+        """
+        The menus containing a word that starts with each word of query, in page order, sold out
+        ones included (available_count 0). An empty query matches nothing.
+        """
+        words = set(TOKEN_PATTERN.findall(fold_for_matching(query)))
+        matches: Optional[Set[int]] = None
+        # Longer words match fewer boxes, so the intersection shrinks fastest starting with them
+        for word in sorted(words, key=len, reverse=True):
+            numbers = self._prefix_matches(word)
+            matches = numbers if matches is None else matches & numbers
+            if not matches:
+                return []
+        if matches is None:
+            return []
+        return [self._meals[number] for number in sorted(matches)]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'menus': len(self._meals), 'words': len(self._tokens), 'cities': len(self._sources)}
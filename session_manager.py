@@ -0,0 +1,126 @@
+"""
+Keeps one pooled getodi.com session for the whole app and persists its auth cookies,
+so restarts and re-logins can skip the credential POST while the cookies are still valid.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.cookies import create_cookie
+
+from network import OdiError, authenticate, create_session, is_session_valid
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_CHECK_ITERATIONS = 100_000
+
+
+def _password_digest(password: str, salt: bytes) -> bytes:
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, PASSWORD_CHECK_ITERATIONS)
+
+
+def get_cookie_path(settings_path: str, username: Optional[str] = None) -> str:
+    """
+    The cookie file lives next to the settings file: settings.json -> settings.cookies.json, or
+    settings.<hash of the username>.cookies.json for the accounts of polling profiles (profiles.py).
+    """
+    base = os.path.splitext(settings_path)[0]
+    if username is None:
+        return base + ".cookies.json"
+    return f"{base}.{hashlib.sha256(username.encode('utf-8')).hexdigest()[:12]}.cookies.json"
+
+
+class SessionManager:
+    def __init__(self, cookie_path: Optional[str]):
+        self.cookie_path = cookie_path
+        self.session: requests.Session = create_session()
+        self._lock = threading.Lock()
+        # Why the last login() returned None: network.AuthenticationError, ServiceUnavailableError or CircuitOpenError
+        self.last_error: Optional[OdiError] = None
+
+    def login(self, username: str, password: str, reuse_cookies: bool = True) -> Optional[requests.Session]:
+        """
+        Returns a logged-in session. Saved cookies of the same user (and password) are validated
+        first and reused if still valid; otherwise a real login is made on the same pooled session.
+        Returns None if the login failed, with the reason in last_error.
+        """
+        with self._lock:
+            self.last_error = None
+            if reuse_cookies and self._load_cookies(username, password):
+                if is_session_valid(self.session):
+                    logger.info("Reusing saved session cookies.")
+                    return self.session
+                logger.warning("Saved session cookies expired. Logging in again.")
+            self.session.cookies.clear()
+            try:
+                authenticate(username, password, session=self.session)
+            except OdiError as e:
+                logger.warning(f"Login failed: {e}")
+                self.last_error = e
+                return None
+            logger.info("Login successful.")
+            self._save_cookies(username, password)
+            return self.session
+
+    def close(self):
+        self.session.close()
+
+    def _load_cookies(self, username: str, password: str) -> bool:
+        if not self.cookie_path:
+            return False
+        try:
+            with open(self.cookie_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Cookie file invalid, ignoring it: {e}")
+            return False
+        if saved.get('username') != username or not saved.get('cookies'):
+            return False
+        # The saved cookies must not let a wrong password into the account
+        try:
+            salt = bytes.fromhex(saved['password_salt'])
+            expected_digest = bytes.fromhex(saved['password_digest'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        if not hmac.compare_digest(_password_digest(password, salt), expected_digest):
+            return False
+        self.session.cookies.clear()
+        for cookie in saved['cookies']:
+            try:
+                self.session.cookies.set_cookie(create_cookie(**cookie))
+            except TypeError as e:
+                logger.warning(f"Skipping invalid saved cookie: {e}")
+        return True
+
+    def _save_cookies(self, username: str, password: str):
+        if not self.cookie_path:
+            return
+        cookies = [
+            {
+                'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path,
+                'expires': cookie.expires, 'secure': cookie.secure,
+                'rest': {'HttpOnly': cookie.get_nonstandard_attr('HttpOnly')} if cookie.has_nonstandard_attr('HttpOnly') else {}
+            }
+            for cookie in self.session.cookies
+        ]
+        try:
+            # Only the current user may read the file: it grants access to the account
+            fd = os.open(self.cookie_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                salt = os.urandom(16)
+                json.dump({
+                    'username': username,
+                    'password_salt': salt.hex(),
+                    'password_digest': _password_digest(password, salt).hex(),
+                    'cookies': cookies
+                }, f, indent=4)
+        except OSError as e:
+            logger.warning(f"Error saving session cookies: {e}")
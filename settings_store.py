@@ -0,0 +1,350 @@
+"""
+The settings file, shared by the GUI and the headless mode.
+
+SettingsStore keeps the settings in memory and behaves like a dict, so callers read it with
+settings.get(...) as before. On top of that it:
+
+- checks every value against SETTINGS_SCHEMA when it is loaded or set; a value of the wrong type
+  is dropped with a warning, so the caller's default applies instead (unknown keys are kept)
+- writes behind: changes mark the store dirty, and its thread writes the file once things have
+  been quiet for WRITE_DELAY_SECONDS (at most MAX_WRITE_DELAY_SECONDS after the first change),
+  so a burst of toggles costs one write; flush() writes at once, e.g. on exit. A failed write (e.g.
+  settings.json held open by an editor or virus scanner on Windows) keeps the changes pending and is
+  retried after WRITE_RETRY_SECONDS, doubling up to MAX_WRITE_RETRY_SECONDS, and again by flush()
+- writes atomically: a temporary file in the same directory is flushed to disk and renamed over
+  settings.json, so a crash leaves either the old or the new file, never half of one
+- keeps a file it cannot parse as settings.json.corrupt instead of silently overwriting it
+- watches the file: a change made by someone else (an editor, a deployment tool pushing watch
+  lists) is loaded without a restart and reported to on_change with the changed keys. Keys the
+  file changed win over unsaved local changes to the same keys
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, MutableMapping, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+WRITE_DELAY_SECONDS = 0.5
+MAX_WRITE_DELAY_SECONDS = 5.0
+WATCH_INTERVAL_SECONDS = 2.0
+WRITE_RETRY_SECONDS = 1.0
+MAX_WRITE_RETRY_SECONDS = 60.0
+
+_NUMBER = (int, float)
+_TEXT_OR_NONE = (str, type(None))
+
+# Expected type(s) of every known key; list values also have their item type checked
+SETTINGS_SCHEMA: Dict[str, Tuple[type, ...]] = {
+    'username': (str,),
+    'restaurants': (list,),
+    'notifications_enabled': (bool,),
+    'theme': (str,),
+    'city_id': (str,),
+    'city_ids': (list,),
+    'refresh_interval': _NUMBER,
+    'refresh_interval_min': _NUMBER,
+    'refresh_interval_max': _NUMBER,
+    'poll_jitter': _NUMBER,
+    'adaptive_polling': (bool,),
+    'parser_backend': _TEXT_OR_NONE,
+    'streaming_fetch': (bool,),
+    'refresh_city_names': (bool,),
+    'metrics_prometheus_textfile': _TEXT_OR_NONE,
+    'metrics_jsonl': _TEXT_OR_NONE,
+    'history_enabled': (bool,),
+    'history_path': _TEXT_OR_NONE,
+    'history_retention_days': _NUMBER,
+    'log_buffer_lines': (int,),
+    'log_file': (bool, str),
+    'log_file_max_bytes': (int,),
+    'log_file_backups': (int,),
+    'debug_logging': (bool,),
+    'notification_sinks': (list,),
+    'headless_notification_sinks': (list,),
+    'notification_webhook_url': _TEXT_OR_NONE,
+    'notification_merge_seconds': _NUMBER,
+    'notification_restaurant_interval_seconds': _NUMBER,
+    'notification_dedupe_seconds': _NUMBER,
+    'max_requests_per_second': _NUMBER,
+    'request_burst': (int,),
+    'login_failure_threshold': (int,),
+    'login_retry_seconds': _NUMBER,
+    'login_max_retry_seconds': _NUMBER,
+    'fanout_serve': (bool, str),
+    'fanout_subscribe': _TEXT_OR_NONE,
+    'fanout_token': _TEXT_OR_NONE,
+    'profiles': (list,),
+}
+LIST_ITEM_TYPES: Dict[str, type] = {'restaurants': str, 'city_ids': str, 'notification_sinks': str, 'headless_notification_sinks': str,
+                                   'profiles': dict}
+
+
+def _is_valid(key: str, value: Any) -> bool:
+    expected = SETTINGS_SCHEMA.get(key)
+    if expected is None:
+        return True
+    # bool is an int subclass, but true is not a number of minutes
+    if isinstance(value, bool) and bool not in expected:
+        return False
+    if not isinstance(value, expected):
+        return False
+    item_type = LIST_ITEM_TYPES.get(key)
+    return item_type is None or not isinstance(value, list) or all(isinstance(item, item_type) for item in value)
+
+
+def validate_settings(settings: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """Returns the settings without the values that do not match SETTINGS_SCHEMA, logging each one."""
+    valid = {}
+    for key, value in settings.items():
+        if _is_valid(key, value):
+            valid[key] = value
+        else:
+            logger.warning(f"Ignoring invalid setting {key}={value!r} from {source}; using the default.")
+    return valid
+
+
+class SettingsStore(MutableMapping):
+    def __init__(self, path: str, on_change: Optional[Callable[[Set[str]], None]] = None, watch: bool = True):
+        self.path = path
+        self.on_change = on_change
+        self._watch = watch
+        self._condition = threading.Condition()
+        self._data: Dict[str, Any] = {}
+        self._file_data: Dict[str, Any] = {}  # what the file held when it was last read or written
+        self._file_signature: Optional[Tuple[int, int]] = None
+        self._dirty_since: Optional[float] = None
+        self._last_change = 0.0
+        self._write_failures = 0
+        self._retry_at: Optional[float] = None  # no background write before this after a failed one
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {'writes': 0, 'reloads': 0, 'write_errors': 0}
+        self._load_initial()
+
+    # Mapping interface; reads come from memory
+
+    def __getitem__(self, key: str) -> Any:
+        with self._condition:
+            return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        with self._condition:
+            return iter(list(self._data))
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._data)
+
+    def __setitem__(self, key: str, value: Any):
+        self.update({key: value})
+
+    def __delitem__(self, key: str):
+        with self._condition:
+            del self._data[key]
+            self._mark_dirty()
+
+    def update(self, values: Any = (), **kwargs):
+        """Sets several values at once; the file is written behind. Invalid values are not stored."""
+        values = validate_settings({**dict(values), **kwargs}, "the app")
+        with self._condition:
+            changed = {key: value for key, value in values.items() if self._data.get(key, object()) != value}
+            if not changed:
+                return
+            self._data.update(changed)
+            self._mark_dirty()
+
+    def _mark_dirty(self):
+        now = time.monotonic()
+        self._last_change = now
+        if self._dirty_since is None:
+            self._dirty_since = now
+        self._ensure_thread()
+        self._condition.notify_all()
+
+    # Loading
+
+    def _read_file(self) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[int, int]]]:
+        """(parsed settings or None if unreadable, file signature); ({}, None) if there is no file."""
+        try:
+            stat = os.stat(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                settings = json.load(f)
+        except FileNotFoundError:
+            return {}, None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read settings file {self.path}: {e}")
+            return None, self._signature()
+        if not isinstance(settings, dict):
+            logger.warning(f"Settings file {self.path} does not hold a JSON object.")
+            return None, (stat.st_mtime_ns, stat.st_size)
+        return settings, (stat.st_mtime_ns, stat.st_size)
+
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_initial(self):
+        settings, signature = self._read_file()
+        if settings is None:
+            # Keep the broken file for inspection; the next save would overwrite it otherwise
+            corrupt_path = self.path + ".corrupt"
+            try:
+                os.replace(self.path, corrupt_path)
+                logger.warning(f"Settings file was invalid and has been moved to {corrupt_path}. Using defaults.")
+            except OSError as e:
+                logger.warning(f"Settings file is invalid and could not be moved aside: {e}. Using defaults.")
+            settings, signature = {}, None
+        elif signature is None:
+            logger.info("Settings file not found. Using defaults.")
+        settings = validate_settings(settings, self.path)
+        with self._condition:
+            self._data = dict(settings)
+            self._file_data = dict(settings)
+            self._file_signature = signature
+        if self._watch:
+            self._ensure_thread()
+
+    def reload_if_changed(self) -> Set[str]:
+        """Loads the file if someone else changed it; returns (and reports to on_change) the changed keys."""
+        signature = self._signature()
+        with self._condition:
+            if signature == self._file_signature:
+                return set()
+        settings, signature = self._read_file()
+        if settings is None:
+            # Possibly caught halfway through someone else's write: its next change is read again, but
+            # this version is not (nor warned about) on every check
+            with self._condition:
+                self._file_signature = signature
+            return set()
+        settings = validate_settings(settings, self.path)
+        with self._condition:
+            file_changed = {key for key in set(settings) | set(self._file_data) if settings.get(key) != self._file_data.get(key)}
+            changed = set()
+            for key in file_changed:
+                if key in settings:
+                    if self._data.get(key, object()) != settings[key]:
+                        self._data[key] = settings[key]
+                        changed.add(key)
+                elif key in self._data:
+                    del self._data[key]
+                    changed.add(key)
+            self._file_data = dict(settings)
+            self._file_signature = signature
+            self._stats['reloads'] += 1
+        if changed:
+            logger.info(f"Settings file changed; reloaded {', '.join(sorted(changed))}.")
+            if self.on_change is not None:
+                self.on_change(changed)
+        return changed
+
+    # Writing
+
+    def flush(self) -> bool:
+        """Writes pending changes now; False if they could not be written (they stay pending)."""
+        with self._condition:
+            if self._dirty_since is None:
+                return True
+        return self._write()
+
+    def _write(self) -> bool:
+        # Pick up an edit made since the last check first, so it is not overwritten
+        if self._watch:
+            self.reload_if_changed()
+        with self._condition:
+            data = dict(self._data)
+            dirty_since, self._dirty_since = self._dirty_since, None
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            temp_path = None
+        except OSError as e:
+            with self._condition:
+                self._stats['write_errors'] += 1
+                self._write_failures += 1
+                retry_seconds = min(WRITE_RETRY_SECONDS * 2 ** (self._write_failures - 1), MAX_WRITE_RETRY_SECONDS)
+                self._retry_at = time.monotonic() + retry_seconds
+                # Still pending, including whatever changed while writing
+                if dirty_since is not None and (self._dirty_since is None or dirty_since < self._dirty_since):
+                    self._dirty_since = dirty_since
+                self._condition.notify_all()
+            logger.warning(f"Error saving settings: {e}; trying again in {retry_seconds:g} s.")
+            return False
+        finally:
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+        with self._condition:
+            self._file_data = data
+            self._file_signature = self._signature()
+            self._stats['writes'] += 1
+            self._write_failures = 0
+            self._retry_at = None
+        return True
+
+    # Background thread: writes behind and watches the file
+
+    def _ensure_thread(self):
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="odiSettings", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        next_check = time.monotonic() + WATCH_INTERVAL_SECONDS
+        while True:
+            with self._condition:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                write_at = None
+                if self._dirty_since is not None:
+                    write_at = min(self._last_change + WRITE_DELAY_SECONDS, self._dirty_since + MAX_WRITE_DELAY_SECONDS)
+                    if self._retry_at is not None:
+                        write_at = max(write_at, self._retry_at)
+                wake_at = write_at
+                if self._watch:
+                    wake_at = next_check if wake_at is None else min(wake_at, next_check)
+                if wake_at is None:
+                    # Not watching and nothing to write: sleep until a change (or close) notifies
+                    self._condition.wait()
+                    continue
+                if wake_at > now:
+                    self._condition.wait(wake_at - now)
+                    continue
+            try:
+                if write_at is not None and write_at <= now:
+                    self._write()
+                if self._watch and next_check <= now:
+                    next_check = now + WATCH_INTERVAL_SECONDS
+                    self.reload_if_changed()
+            except Exception:
+                logger.exception("Settings store thread error")
+
+    def close(self):
+        """Writes pending changes and stops the thread."""
+        # A file held open for a moment (scanner, sync tool) is often free again a second later
+        if not self.flush() and not (time.sleep(WRITE_RETRY_SECONDS) or self.flush()):
+            logger.error(f"Settings could not be saved to {self.path}; the last changes are lost.")
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {**self._stats, 'pending_write': self._dirty_since is not None, 'path': self.path}
@@ -0,0 +1,96 @@
+"""
+Diffs consecutive scan results by a stable meal identity instead of by restaurant name.
+
+A meal is identified by (city, restaurant, meal, location), so a second menu at the same restaurant,
+the same restaurant in another district and a changed available count are all told apart. Each update
+is one pass over the new results with dict lookups against the previous ones (O(n)).
+
+Meals are meal_record.MealRecord tuples; those kept and returned in the deltas have city_id set.
+A failed fetch (None instead of a list) leaves that city's previous state untouched, so nothing is
+reported as removed and then as new again after a single failed poll.
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from meal_record import MealRecord
+
+MealKey = Tuple[str, str, str, str]
+
+
+def meal_key(city_id: str, meal: MealRecord) -> MealKey:
+    return (city_id, meal.restaurant_name, meal.meal_name, meal.location)
+
+
+class CountChange(NamedTuple):
+    meal: MealRecord
+    previous_count: int
+
+
+class SnapshotDiff(NamedTuple):
+    added: List[MealRecord]
+    removed: List[MealRecord]
+    count_changed: List[CountChange]
+    changed_cities: Set[str]
+    failed_cities: Set[str]
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.changed_cities)
+
+    def added_restaurant_names(self) -> List[str]:
+        return sorted({meal.restaurant_name for meal in self.added})
+
+
+class SnapshotDiffer:
+    def __init__(self):
+        self._meals_by_city: Dict[str, Dict[MealKey, MealRecord]] = {}
+
+    def update(self, meals_by_city: Dict[str, Optional[List[MealRecord]]]) -> SnapshotDiff:
+        """Replaces the state of every city with a result (None = failed fetch) and returns what changed."""
+        added: List[MealRecord] = []
+        removed: List[MealRecord] = []
+        count_changed: List[CountChange] = []
+        changed_cities: Set[str] = set()
+        failed_cities: Set[str] = set()
+        for city_id, meals in meals_by_city.items():
+            if meals is None:
+                failed_cities.add(city_id)
+                continue
+            previous = self._meals_by_city.get(city_id, {})
+            current: Dict[MealKey, MealRecord] = {}
+            for meal in meals:
+                if meal.city_id != city_id:
+                    meal = meal._replace(city_id=city_id)
+                key = meal_key(city_id, meal)
+                current[key] = meal
+                previous_meal = previous.get(key)
+                if previous_meal is None:
+                    added.append(meal)
+                    changed_cities.add(city_id)
+                elif previous_meal.available_count != meal.available_count:
+                    count_changed.append(CountChange(meal, previous_meal.available_count))
+                    changed_cities.add(city_id)
+            if len(current) != len(previous) or city_id in changed_cities:
+                for key, previous_meal in previous.items():
+                    if key not in current:
+                        removed.append(previous_meal)
+                        changed_cities.add(city_id)
+            self._meals_by_city[city_id] = current
+        return SnapshotDiff(added, removed, count_changed, changed_cities, failed_cities)
+
+    def forget_cities_except(self, city_ids: Iterable[str]):
+        """Drops the state of cities that are no longer watched."""
+        keep = set(city_ids)
+        for city_id in list(self._meals_by_city):
+            if city_id not in keep:
+                del self._meals_by_city[city_id]
+
+    def meals_for(self, city_id: str) -> List[MealRecord]:
+        """The last successfully fetched meals of a city, in page order."""
+        return list(self._meals_by_city.get(city_id, {}).values())
+
+    def meal_count(self, city_id: str) -> int:
+        return len(self._meals_by_city.get(city_id, ()))
+
+    def restaurant_names(self) -> Set[str]:
+        return {meal.restaurant_name for meals in self._meals_by_city.values() for meal in meals.values()}
@@ -1,10 +1,22 @@
 import tkinter as tk
 from tkinter import messagebox, ttk, font as tkFont
 from tkinter import messagebox, ttk, font as tkFont
+import logging
 import os
 import sys
 import code # For debug console
 import platform
+import queue
+
+from app_log import RingBufferWriter, ring_buffer
+from results_table import ResultsTable
+
+logger = logging.getLogger(__name__)
+
+UI_QUEUE_POLL_MS = 100
+# The debug console pulls new log lines from the ring buffer at this rate and keeps at most this many lines
+CONSOLE_FLUSH_MS = 100
+CONSOLE_MAX_LINES = 5000
 
 # Define Theme Colors
 DARK_THEME = {
@@ -36,6 +48,7 @@ class OdiFinderUI:
         self.login_window = None
         self.system_tray_icon = None # Managed by main app, but UI might interact
         self.tooltip = None  # Initialize tooltip attribute
+        self._ui_queue = queue.Queue()  # Callbacks posted by background threads, drained on the Tk thread
 
         self.username_entry = None
         self.password_entry = None
@@ -54,7 +67,11 @@ class OdiFinderUI:
         self.city_id_entry = None
         self.save_city_button = None
         self.theme_toggle_button = None
-        self.meals_text_area = None
+        self.results_status_label = None
+        self.results_table = None
+        self.filter_frame = None
+        self.filter_label = None
+        self.filter_entry = None
         self.controls_frame = None
         self.last_refreshed_label = None
         self.interval_frame = None
@@ -70,7 +87,8 @@ class OdiFinderUI:
             "original_stderr": None, "ps1": ">>> ", "ps2": "... ",
             "cleanup_func_registered": False, "output_text_widget": None,
             "input_entry_widget": None,
-            "debug_run_button": None # Added to store debug run button
+            "debug_run_button": None, # Added to store debug run button
+            "log_sequence": 0, "flush_after_id": None
         }
         try:
             self._debug_console_state["ps1"] = sys.ps1
@@ -90,6 +108,8 @@ class OdiFinderUI:
         # For others, a simple no-arg lambda is fine if the call site doesn't pass args or handles None.
         if callback_name == 'on_login_attempt':
             return self.callbacks.get(callback_name, lambda u, p: None)
+        if callback_name == 'on_filter_changed':
+            return self.callbacks.get(callback_name, lambda query: None)
         # Add other specific arity lambdas if needed
         # Default for no-argument callbacks or where None is handled by caller
         return self.callbacks.get(callback_name, lambda: None)
@@ -97,7 +117,7 @@ class OdiFinderUI:
     def _set_icon_for_window(self, window_instance):
         if not (self.icon_path and os.path.exists(self.icon_path)): return
         try: window_instance.iconbitmap(default=self.icon_path)
-        except Exception as e: print(f"Could not set program icon ({self.icon_path}): {e}")
+        except Exception as e: logger.warning(f"Could not set program icon ({self.icon_path}): {e}")
 
     def display_login_window(self, initial_username=""):
         self.login_window = tk.Tk()
@@ -174,7 +194,7 @@ class OdiFinderUI:
         
         self.city_id_label = tk.Label(self.settings_frame, text="City ID (Plate):")
         self.city_id_label.pack(side=tk.LEFT, padx=(10, 0))
-        self.city_id_entry = tk.Entry(self.settings_frame, width=4, relief=tk.SOLID, borderwidth=1)
+        self.city_id_entry = tk.Entry(self.settings_frame, width=8, relief=tk.SOLID, borderwidth=1)
         self.city_id_entry.pack(side=tk.LEFT, padx=(2,5))
         self.city_id_entry.insert(0, initial_settings.get('city_id', "35"))
         
@@ -203,8 +223,22 @@ class OdiFinderUI:
         # Add tooltip
         self._create_tooltip(self.reset_settings_button, "Reset all settings to default")
 
-        self.meals_text_area = tk.Text(self.app_root, wrap=tk.WORD, height=15, width=60, font=tkFont.Font(family="Arial", size=12), relief=tk.SOLID, borderwidth=1, bd=1, state=tk.DISABLED)
-        self.meals_text_area.pack(padx=10, pady=(0,10), fill=tk.BOTH, expand=True)
+        # Searches every menu of the last refreshed pages at each keystroke, without a request (see search_index.py)
+        self.filter_frame = tk.Frame(self.app_root)
+        self.filter_frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(0,5))
+        self.filter_label = tk.Label(self.filter_frame, text="Filter all menus:")
+        self.filter_label.pack(side=tk.LEFT, padx=(5, 0))
+        self.filter_entry = tk.Entry(self.filter_frame, relief=tk.SOLID, borderwidth=1)
+        self.filter_entry.pack(side=tk.LEFT, padx=(2,5), fill=tk.X, expand=True)
+        on_filter_changed = self._get_callback('on_filter_changed')
+        self.filter_entry.bind('<KeyRelease>', lambda event: on_filter_changed(self.filter_entry.get()))
+        self.filter_entry.bind('<Escape>', lambda event: self.clear_filter())
+        self._create_tooltip(self.filter_entry, "Search every restaurant on the last refreshed pages; clear it to see your list again")
+
+        # Messages (no meals, failed cities, connection errors) go above the table and never replace its rows
+        self.results_status_label = tk.Label(self.app_root, text="", anchor=tk.W, justify=tk.LEFT, wraplength=720)
+        self.results_table = ResultsTable(self.app_root)
+        self.results_table.pack(padx=10, pady=(0,10), fill=tk.BOTH, expand=True)
 
         self.controls_frame = tk.Frame(self.app_root)
         self.controls_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
@@ -235,7 +269,30 @@ class OdiFinderUI:
         self.apply_theme(self.current_theme_name)
         
         self.app_root.protocol("WM_DELETE_WINDOW", self._get_callback('on_quit_application'))
-        
+        self.app_root.after(UI_QUEUE_POLL_MS, self._poll_ui_queue)
+
+    def post_to_main_thread(self, callback, *args):
+        """Thread-safe: queues callback(*args) to run on the Tk main thread."""
+        self._ui_queue.put((callback, args))
+
+    def _poll_ui_queue(self):
+        if not (self.app_root and self.app_root.winfo_exists()): return
+        while True:
+            try:
+                callback, args = self._ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.warning(f"Error running queued UI callback: {e}")
+        if self.app_root and self.app_root.winfo_exists():
+            self.app_root.after(UI_QUEUE_POLL_MS, self._poll_ui_queue)
+
+    def set_refresh_in_progress(self, in_progress):
+        if self.refresh_button and self.refresh_button.winfo_exists():
+            self.refresh_button.config(text="Refreshing..." if in_progress else "Refresh Now", state=tk.DISABLED if in_progress else tk.NORMAL)
+
     def run_ui(self):
         if self.app_root:
             self.app_root.mainloop()
@@ -261,6 +318,7 @@ class OdiFinderUI:
         
         widgets_to_theme = [
             (self.settings_frame, "WIDGET_BG", None), (self.notifications_toggle, "WIDGET_BG", "TEXT_FG"),
+            (self.filter_frame, "WIDGET_BG", None), (self.filter_label, "WIDGET_BG", "TEXT_FG"),
             (self.edit_restaurants_button, "BUTTON_BG", "BUTTON_TEXT_FG"), (self.city_id_label, "WIDGET_BG", "TEXT_FG"),
             (self.save_city_button, "BUTTON_BG", "BUTTON_TEXT_FG"), (self.theme_toggle_button, "BUTTON_BG", "BUTTON_TEXT_FG"),
             (self.controls_frame, "WIDGET_BG", None), (self.last_refreshed_label, "WIDGET_BG", "TEXT_FG"),
@@ -283,12 +341,15 @@ class OdiFinderUI:
 
         if self.notifications_toggle and self.notifications_toggle.winfo_exists():
             self.notifications_toggle.configure(selectcolor=self.active_colors["SELECT_BG"], activebackground=self.active_colors["WIDGET_BG"], activeforeground=self.active_colors["TEXT_FG"])
-        if self.city_id_entry and self.city_id_entry.winfo_exists():
-            self.city_id_entry.configure(bg=self.active_colors["TEXT_AREA_BG"], fg=self.active_colors["TEXT_AREA_FG"], insertbackground=self.active_colors["ENTRY_INSERT_BG"])
+        for entry in (self.city_id_entry, self.filter_entry):
+            if entry and entry.winfo_exists():
+                entry.configure(bg=self.active_colors["TEXT_AREA_BG"], fg=self.active_colors["TEXT_AREA_FG"], insertbackground=self.active_colors["ENTRY_INSERT_BG"])
         if self.getodi_button and self.getodi_button.winfo_exists():
             self.getodi_button.configure(bg="#ffcf26", fg="#000000", activebackground="#ffcf26", activeforeground="#000000")
-        if self.meals_text_area and self.meals_text_area.winfo_exists():
-            self.meals_text_area.configure(bg=self.active_colors["TEXT_AREA_BG"], fg=self.active_colors["TEXT_AREA_FG"])
+        if self.results_status_label and self.results_status_label.winfo_exists():
+            self.results_status_label.configure(bg=self.active_colors["APP_BG"], fg=self.active_colors["TEXT_FG"])
+        if self.results_table:
+            self.results_table.apply_theme(self.active_colors)
         if self.interval_entry and self.interval_entry.winfo_exists():
             self.interval_entry.configure(bg=self.active_colors["TEXT_AREA_BG"], fg=self.active_colors["TEXT_AREA_FG"], insertbackground=self.active_colors["ENTRY_INSERT_BG"])
 
@@ -304,18 +365,50 @@ class OdiFinderUI:
         if self.reset_settings_button and self.reset_settings_button.winfo_exists():
             self.reset_settings_button.configure(bg=self.active_colors["BUTTON_BG"], fg=self.active_colors["BUTTON_TEXT_FG"], activebackground=self.active_colors["BUTTON_ACTIVE_BG"], activeforeground=self.active_colors["BUTTON_TEXT_FG"])
 
-    def update_meals_display(self, text_to_display, refresh_time_str):
-        if not (self.app_root and self.app_root.winfo_exists()): return
+    def update_last_refreshed(self, refresh_time_str):
         if self.last_refreshed_label and self.last_refreshed_label.winfo_exists():
             self.last_refreshed_label.config(text=f"Last Refreshed: {refresh_time_str}")
-        if self.meals_text_area and self.meals_text_area.winfo_exists():
-            self.meals_text_area.config(state=tk.NORMAL)
-            self.meals_text_area.delete(1.0, tk.END)
-            self.meals_text_area.insert(tk.END, text_to_display)
-            self.meals_text_area.config(state=tk.DISABLED)
+
+    def set_results_status(self, status_text):
+        """Shows a message above the results table; an empty text hides the line."""
+        if not (self.results_status_label and self.results_status_label.winfo_exists()): return
+        if status_text:
+            self.results_status_label.config(text=status_text)
+            self.results_status_label.pack(before=self.results_table.frame, fill=tk.X, padx=10, pady=(0,5))
+        else:
+            self.results_status_label.pack_forget()
+
+    def update_meals_display(self, text_to_display, refresh_time_str):
+        if not (self.app_root and self.app_root.winfo_exists()): return
+        self.update_last_refreshed(refresh_time_str)
+        self.set_results_status(text_to_display)
+
+    def update_meal_rows(self, upserts, removals, status_text, refresh_time_str, replace=False):
+        """
+        Applies row-level changes to the results table: upserts are (row id, values) pairs, removals row ids.
+        With replace=True, upserts are the complete new contents.
+        """
+        if not (self.app_root and self.app_root.winfo_exists()): return
+        self.update_last_refreshed(refresh_time_str)
+        self.set_results_status(status_text)
+        if replace:
+            self.results_table.replace_rows(upserts)
+        else:
+            self.results_table.apply_changes(upserts, removals)
         if self.app_root and self.app_root.winfo_exists():
             self.app_root.update_idletasks()
 
+    def replace_meal_rows(self, rows, status_text):
+        """Shows exactly rows in the results table (the filter's matches, or the watch list again)."""
+        if not (self.app_root and self.app_root.winfo_exists()): return
+        self.set_results_status(status_text)
+        self.results_table.replace_rows(rows)
+
+    def clear_filter(self):
+        if self.filter_entry and self.filter_entry.winfo_exists():
+            self.filter_entry.delete(0, tk.END)
+        self._get_callback('on_filter_changed')("")
+
     def get_city_id_entry(self):
         return self.city_id_entry.get().strip() if self.city_id_entry else ""
 
@@ -328,7 +421,7 @@ class OdiFinderUI:
     def show_message(self, type="info", title="Info", message=""):
         parent = self.app_root if self.app_root and self.app_root.winfo_exists() else self.login_window
         if not parent or not parent.winfo_exists(): # Fallback if no window is available
-            print(f"[{type.upper()}] {title}: {message}") # Print to console as last resort
+            logger.warning(f"[{type.upper()}] {title}: {message}") # Log as last resort
             return
 
         if type == "error": messagebox.showerror(title, message, parent=parent)
@@ -365,22 +458,23 @@ class OdiFinderUI:
         button_frame_edit.pack(pady=(5,10))
         tk.Button(button_frame_edit, text="Save", command=_save_action, bg=self.active_colors["BUTTON_BG"], fg=self.active_colors["BUTTON_TEXT_FG"], activebackground=self.active_colors["BUTTON_ACTIVE_BG"], activeforeground=self.active_colors["BUTTON_TEXT_FG"], relief=tk.FLAT, borderwidth=0, padx=10, pady=3).pack()
 
-    class DebugConsoleRedirector:
-        def __init__(self, text_widget):
-            self.text_widget = text_widget
-            self.buffer = ""
-        def write(self, s):
-            self.buffer += s
-            if self.text_widget.winfo_exists():
-                self.text_widget.after(0, self._update_text_widget)
-        def _update_text_widget(self):
-            if self.text_widget.winfo_exists():
-                self.text_widget.config(state=tk.NORMAL)
-                self.text_widget.insert(tk.END, self.buffer)
-                self.text_widget.see(tk.END)
-                self.text_widget.config(state=tk.DISABLED)
-                self.buffer = ""
-        def flush(self): pass
+    def _flush_debug_console(self, reschedule=True):
+        """Appends everything logged since the last flush in one insert, then trims the oldest lines."""
+        output_text = self._debug_console_state["output_text_widget"]
+        if not (output_text and output_text.winfo_exists()): return
+        entries, self._debug_console_state["log_sequence"], dropped = ring_buffer.read_since(self._debug_console_state["log_sequence"])
+        if dropped:
+            entries.insert(0, f"... {dropped} older log entries dropped ...\n")
+        if entries:
+            output_text.config(state=tk.NORMAL)
+            output_text.insert(tk.END, "".join(entries))
+            line_count = int(output_text.index("end-1c").split(".")[0])
+            if line_count > CONSOLE_MAX_LINES:
+                output_text.delete("1.0", f"{line_count - CONSOLE_MAX_LINES + 1}.0")
+            output_text.see(tk.END)
+            output_text.config(state=tk.DISABLED)
+        if reschedule:
+            self._debug_console_state["flush_after_id"] = output_text.after(CONSOLE_FLUSH_MS, self._flush_debug_console)
 
     def open_debug_console(self, console_context_provider):
         if self._debug_console_state["window"] and self._debug_console_state["window"].winfo_exists():
@@ -405,13 +499,17 @@ class OdiFinderUI:
         if not self._debug_console_state["original_stdout"]: self._debug_console_state["original_stdout"] = sys.stdout
         if not self._debug_console_state["original_stderr"]: self._debug_console_state["original_stderr"] = sys.stderr
         
-        sys.stdout = OdiFinderUI.DebugConsoleRedirector(self._debug_console_state["output_text_widget"])
+        # Console output and log records share the ring buffer, which is drawn in batches (see _flush_debug_console)
+        sys.stdout = RingBufferWriter(ring_buffer)
         sys.stderr = sys.stdout
 
         console_context = console_context_provider()
         self._debug_console_state["console_instance"] = code.InteractiveConsole(locals=console_context)
         console_context['console'] = self._debug_console_state["console_instance"]
 
+        # Starts with the log lines the ring buffer still holds from before the console was opened
+        self._debug_console_state["log_sequence"] = 0
+        self._flush_debug_console()
         output_text = self._debug_console_state["output_text_widget"]
         output_text.config(state=tk.NORMAL)
         output_text.insert(tk.END, f"Python {sys.version.split()[0]} on {sys.platform}\nodiFinder Debug Console. Type 'help(console_context)' or 'get_vars()' for app variables.\n")
@@ -424,6 +522,8 @@ class OdiFinderUI:
             if not self._debug_console_state["console_instance"]: return
 
             is_multiline = self._debug_console_state["console_instance"].push(line)
+            # The command's output has to be on screen before the next prompt
+            self._flush_debug_console(reschedule=False)
             
             current_output_widget = self._debug_console_state["output_text_widget"]
             current_output_widget.config(state=tk.NORMAL)
@@ -442,6 +542,9 @@ class OdiFinderUI:
         self._debug_console_state["input_entry_widget"].focus_set()
 
     def _on_debug_console_close_internal(self):
+        if self._debug_console_state["flush_after_id"] and self._debug_console_state["window"] and self._debug_console_state["window"].winfo_exists():
+            self._debug_console_state["window"].after_cancel(self._debug_console_state["flush_after_id"])
+        self._debug_console_state["flush_after_id"] = None
         if self._debug_console_state["original_stdout"]:
             sys.stdout = self._debug_console_state["original_stdout"]
             self._debug_console_state["original_stdout"] = None
@@ -467,14 +570,18 @@ class OdiFinderUI:
                 self.app_root.lift()
                 self.app_root.focus_force()
             except Exception as e:
-                print(f"Error showing main window: {e}")
+                logger.warning(f"Error showing main window: {e}")
 
     def withdraw_main_window(self):
         if self.app_root and self.app_root.winfo_exists():
+            # A tooltip is a separate window and would otherwise stay on screen
+            if self.tooltip is not None and self.tooltip.winfo_exists():
+                self.tooltip.withdraw()
+            self.tooltip = None
             try:
                 self.app_root.withdraw()
             except tk.TclError as e:
-                print(f"Error minimizing main window: {e}")
+                logger.warning(f"Error minimizing main window: {e}")
                 self.show_message("error", "Minimize Error", f"Could not minimize to tray: {e}")
                 return False
         return True
@@ -484,34 +591,40 @@ class OdiFinderUI:
             self.app_root.quit()
 
     def _create_tooltip(self, widget, text):
-        """Create a tooltip for a given widget"""
+        """
+        Create a tooltip for a given widget. Its Toplevel is built on the first hover and then only
+        hidden and shown again, so hovering (or a missed <Leave>, e.g. when minimizing while the
+        pointer is on the widget) never leaves extra windows behind.
+        """
+        tooltip = {"window": None}
+
         def show_tooltip(event):
-            x, y, _, _ = widget.bbox("insert")
-            x += widget.winfo_rootx() + 25
-            y += widget.winfo_rooty() + 25
-            
-            # Create a toplevel window
-            self.tooltip = tk.Toplevel(widget)
-            # Leaves only the label and removes the app window
-            self.tooltip.wm_overrideredirect(True)
-            self.tooltip.wm_geometry(f"+{x}+{y}")
-            
-            label = tk.Label(self.tooltip, text=text, justify=tk.LEFT,
-                           background="#ffffe0", relief=tk.SOLID, borderwidth=1,
-                           font=("tahoma", 8))  # Fixed font tuple
-            label.pack(ipadx=1)
-            
-        def hide_tooltip(event):
-            if self.tooltip is not None:
-                self.tooltip.destroy()
-                self.tooltip = None
-                
+            if tooltip["window"] is None or not tooltip["window"].winfo_exists():
+                tooltip["window"] = tk.Toplevel(widget)
+                # Leaves only the label and removes the app window
+                tooltip["window"].wm_overrideredirect(True)
+                tk.Label(tooltip["window"], text=text, justify=tk.LEFT,
+                         background="#ffffe0", relief=tk.SOLID, borderwidth=1,
+                         font=("tahoma", 8)).pack(ipadx=1)
+            x = widget.winfo_rootx() + 25
+            y = widget.winfo_rooty() + widget.winfo_height() + 5
+            tooltip["window"].wm_geometry(f"+{x}+{y}")
+            tooltip["window"].deiconify()
+            self.tooltip = tooltip["window"]
+
+        def hide_tooltip(event=None):
+            if tooltip["window"] is not None and tooltip["window"].winfo_exists():
+                tooltip["window"].withdraw()
+            self.tooltip = None
+
         widget.bind('<Enter>', show_tooltip)
         widget.bind('<Leave>', hide_tooltip)
+        widget.bind('<ButtonPress>', hide_tooltip, add='+')
 
     def update_settings_display(self, settings):
         """Update UI elements with new settings values"""
-        if self.username_entry:
+        # The login window (and its entry) is gone once logged in
+        if self.username_entry and 'username' in settings and self.username_entry.winfo_exists():
             self.username_entry.delete(0, tk.END)
             self.username_entry.insert(0, settings.get('username', ''))
         